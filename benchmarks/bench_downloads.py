@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""End-to-end download benchmarks against the local mock NWIS server.
+
+Runs Sites and the stat, dv, and peak download scripts against
+mock_nwis.MockNWIS and reports requests/s, MB/s, the p50/p95 server-side
+response time, and the p50/p95 client-side request time for each. The
+client-side time comes from the request metrics of the download layer
+and includes retries, backoff, rate- and concurrency-limiter waits, and
+hedging. Results can be appended to a JSON-lines file so runs can be
+compared over time.
+"""
+
+#      Author: Parker Norton (pnorton@usgs.gov)
+#        Date: 2026-10-19
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from mock_nwis import MockConfig, MockNWIS
+
+__version__ = '0.1'
+__author__ = 'Parker Norton (pnorton@usgs.gov)'
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UTILITIES_DIR = os.path.join(REPO_DIR, 'pyNWIS', 'utilities')
+
+
+def run_script(script, script_args, totals, hedge=False):
+    # Run one of the download scripts with the repository on the python path.
+    # The client-side time of each request (including retries, backoff,
+    # limiter waits and hedging) is read from the script's metrics file and
+    # appended to totals.
+    fd, metrics_file = tempfile.mkstemp(suffix='.jsonl')
+    os.close(fd)
+    script_args = script_args + ['--metrics', metrics_file]
+    if hedge:
+        script_args = script_args + ['--hedge']
+
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([REPO_DIR] + ([env['PYTHONPATH']] if 'PYTHONPATH' in env else []))
+
+    result = subprocess.run([sys.executable, os.path.join(UTILITIES_DIR, script)] + script_args,
+                            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f'{script} failed:\n{result.stderr}')
+
+    with open(metrics_file) as fhdl:
+        totals.extend(json.loads(line)['total'] for line in fhdl)
+    os.remove(metrics_file)
+
+
+def bench_sites(mock, args, workdir, totals):
+    from pyNWIS.metrics import RequestMetrics
+    from pyNWIS.sites import Sites
+
+    metrics = RequestMetrics()
+    metrics.add_hook(lambda rec: totals.append(rec['total']))
+
+    sites = Sites(base_url=mock.base_url, metrics=metrics)
+    sites.get_nwis_sites(datetime.datetime(1980, 1, 1), datetime.datetime(2019, 12, 31),
+                         regions=list(range(1, args.regions + 1)))
+
+
+def bench_stat(mock, args, workdir, totals):
+    for region in range(1, args.regions + 1):
+        run_script('nwis_download_rest.py', [os.path.join(workdir, 'stat.tab'), '-O', '-R', f'{region:02}',
+                                             '-d', '1980-01-01', '2019-12-31', '-j', str(args.jobs),
+                                             '--base-url', mock.base_url], totals, hedge=args.hedge)
+
+
+def bench_dv(mock, args, workdir, totals):
+    for region in range(1, args.regions + 1):
+        run_script('nwis_daily_rest.py', [os.path.join(workdir, 'dv.tab'), '-O', '-R', f'{region:02}',
+                                          '-d', '2000-01-01', '2019-12-31', '-j', str(args.jobs),
+                                          '--base-url', mock.base_url], totals, hedge=args.hedge)
+
+
+def bench_peak(mock, args, workdir, totals):
+    for region in range(1, args.regions + 1):
+        run_script('nwis_download_peakflows.py', [os.path.join(workdir, 'peak.tab'), '-O', '-R', f'{region:02}',
+                                                  '-j', str(args.jobs), '--base-url', mock.base_url,
+                                                  '--waterdata-url', mock.waterdata_url], totals,
+                   hedge=args.hedge)
+
+
+BENCHMARKS = {'sites': bench_sites,
+              'stat': bench_stat,
+              'dv': bench_dv,
+              'peak': bench_peak}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark NWIS downloads against a local mock server')
+    parser.add_argument('-b', '--bench', help='Benchmarks to run', nargs='+', choices=list(BENCHMARKS),
+                        default=list(BENCHMARKS))
+    parser.add_argument('--sites', help='Number of streamgages per HUC', type=int, default=50)
+    parser.add_argument('--regions', help='Number of HUC regions to download', type=int, default=1)
+    parser.add_argument('--latency', help='Median server latency (seconds)', type=float, default=0.02)
+    parser.add_argument('--latency-sigma', help='Log-normal spread of the server latency', type=float,
+                        default=0.5)
+    parser.add_argument('--error-rate', help='Fraction of requests answered with 503', type=float, default=0.0)
+    parser.add_argument('--missing-rate', help='Fraction of sites without data (404)', type=float, default=0.0)
+    parser.add_argument('-j', '--jobs', help='Maximum number of concurrent downloads', type=int, default=8)
+    parser.add_argument('--hedge', help='Run the download scripts with hedged requests', action='store_true')
+    parser.add_argument('-r', '--results', help='Append results to this JSON-lines file', default=None)
+
+    args = parser.parse_args()
+
+    # Keep the repository importable for the in-process benchmarks
+    sys.path.insert(0, REPO_DIR)
+
+    config = MockConfig(latency=args.latency, latency_sigma=args.latency_sigma, error_rate=args.error_rate,
+                        missing_rate=args.missing_rate, sites=args.sites)
+    mock = MockNWIS(config).start()
+
+    # Server-side (srv) and client-side (cli) response times
+    print(f'{"benchmark":<10s} {"requests":>9s} {"errors":>7s} {"seconds":>8s} {"req/s":>8s} {"MB/s":>8s} '
+          f'{"srv p50":>8s} {"srv p95":>8s} {"cli p50":>8s} {"cli p95":>8s}')
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in args.bench:
+            mock.reset()
+
+            totals = []
+            t0 = time.perf_counter()
+            BENCHMARKS[name](mock, args, workdir, totals)
+            elapsed = time.perf_counter() - t0
+
+            stats = mock.stats()
+            stats.update({'benchmark': name,
+                          'seconds': elapsed,
+                          'requests_per_sec': stats['requests'] / elapsed,
+                          'mb_per_sec': stats['bytes'] / elapsed / 2**20,
+                          'client_requests': len(totals),
+                          'client_p50': float(np.percentile(totals, 50)) if len(totals) > 0 else None,
+                          'client_p95': float(np.percentile(totals, 95)) if len(totals) > 0 else None})
+            results.append(stats)
+
+            print(f'{name:<10s} {stats["requests"]:9d} {stats["errors"]:7d} {elapsed:8.2f} '
+                  f'{stats["requests_per_sec"]:8.1f} {stats["mb_per_sec"]:8.2f} '
+                  f'{1000 * (stats["p50"] or 0):8.1f} {1000 * (stats["p95"] or 0):8.1f} '
+                  f'{1000 * (stats["client_p50"] or 0):8.1f} {1000 * (stats["client_p95"] or 0):8.1f}')
+
+    mock.stop()
+
+    if args.results is not None:
+        run_info = {'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+                    'host': platform.node(),
+                    'python': platform.python_version(),
+                    'config': vars(args)}
+
+        with open(args.results, 'a') as fhdl:
+            for rr in results:
+                fhdl.write(json.dumps(dict(run_info, **rr)) + '\n')
+        print(f'Results appended to {args.results}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""Micro-benchmarks for the CPU hot paths of the trend scripts.
+
+Synthetic annual statistics for N sites x M years are generated and each
+step of the Kendall workflow is timed: RDB stripping and parsing, building
+the ragged site-by-year arrays, the completeness filter, the Kendall tau
+and the first/last ten-year statistics. Each benchmark reports the best
+and median of several runs plus the peak memory allocated (tracemalloc)
+and can append its results to a JSON-lines file so runs can be compared
+over time.
+"""
+
+#      Author: Parker Norton (pnorton@usgs.gov)
+#        Date: 2026-10-19
+
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+from io import StringIO
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from pyNWIS.calendars import year_end
+from pyNWIS.completeness import CompletenessRule, completeness_report, filter_complete
+from pyNWIS.nwis import NWIS, RE_FLD_LENGTH
+from pyNWIS.obsfiles import obs_dtypes, read_obs
+from pyNWIS.ragged import RaggedSeries
+from pyNWIS.trends import kendall_trends
+from pyNWIS.windows import window_statistics
+
+__version__ = '0.1'
+__author__ = 'Parker Norton (pnorton@usgs.gov)'
+
+
+def make_annual_frame(nsites, nyears, first_year=1950, gap_rate=0.02, seed=0):
+    """Annual mean streamflow for nsites x nyears in the layout of read_obs().
+
+    About gap_rate of the years are missing at random.
+    """
+    rng = np.random.default_rng(seed)
+
+    sites = np.repeat(np.array([f'{ii:08d}' for ii in range(nsites)]), nyears)
+    years = np.tile(np.arange(first_year, first_year + nyears, dtype=np.int16), nsites)
+    base = np.repeat(rng.lognormal(4, 1.5, nsites), nyears)
+    trend = np.repeat(rng.normal(0, 0.005, nsites), nyears) * (years - first_year)
+    values = (base * (1.0 + trend) * rng.lognormal(0, 0.3, nsites * nyears)).astype(np.float32)
+
+    df = pd.DataFrame({'agency_cd': 'USGS',
+                       'site_no': pd.Categorical(sites),
+                       'parameter_cd': '00060',
+                       'ts_id': np.int32(12345),
+                       'loc_web_ds': '',
+                       'year_nu': years,
+                       'mean_va': values})
+    return df[rng.random(len(df)) >= gap_rate].reset_index(drop=True)
+
+
+def make_stat_page(df, comment_lines=30):
+    # RDB page (as returned by the stat service) for an annual dataframe
+    header = '\n'.join(['# Synthetic annual statistics'] * comment_lines)
+    fld = '\t'.join(['5s', '15s', '5s', '10n', '15s', '4s', '12s'])
+    body = df.to_csv(sep='\t', index=False, header=False, float_format='%.1f')
+    return f'{header}\n' + '\t'.join(df.columns) + f'\n{fld}\n{body}'
+
+
+def timed(func, repeat):
+    # Run func repeat times; returns (best, median) seconds
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+    return min(times), float(np.median(times))
+
+
+def peak_memory(func):
+    # Peak memory (bytes) allocated by Python while running func
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def setup(nsites, nyears, workdir):
+    # Inputs shared by the benchmarks
+    data = {}
+    data['frame'] = make_annual_frame(nsites, nyears)
+    data['page'] = make_stat_page(data['frame'])
+
+    data['obsfile'] = os.path.join(workdir, 'bench_obs.tab')
+    data['frame'].to_csv(data['obsfile'], sep='\t', index=False, float_format='%.1f')
+
+    obs = data['frame'][['site_no', 'ts_id', 'year_nu', 'mean_va']].copy()
+    obs['wyear'] = pd.to_datetime(year_end(obs['year_nu']))
+    obs['period'] = obs['year_nu']
+    data['obs'] = obs.set_index('wyear')
+
+    years = data['frame']['year_nu']
+    data['window'] = (int(years.min()), int(years.max()))
+    data['series'] = RaggedSeries.from_frame(data['obs'], 'mean_va', freq='Y')
+    return data
+
+
+def bench_strip(data):
+    page = NWIS.strip_comments(data['page'])
+    RE_FLD_LENGTH.sub('', page, 0)
+
+
+def bench_parse(data):
+    page = RE_FLD_LENGTH.sub('', NWIS.strip_comments(data['page']), 0)
+    pd.read_csv(StringIO(page), sep='\t', dtype=obs_dtypes(page.split('\n', 1)[0].split('\t')))
+
+
+def bench_read_obs(data):
+    read_obs(data['obsfile'], usecols=['site_no', 'ts_id', 'year_nu', 'mean_va'])
+
+
+def bench_ragged(data):
+    RaggedSeries.from_frame(data['obs'], 'mean_va', freq='Y')
+
+
+def bench_completeness(data):
+    first, last = data['window']
+    report = completeness_report(data['obs'], 'period', first, last)
+    filter_complete(data['obs'], report, CompletenessRule(min_count=last - first))
+
+
+def bench_kendall(data):
+    kendall_trends(data['series'], 0.05, kendall=data['kendall'])
+
+
+def bench_window_stats(data):
+    window_statistics(data['series'], 10, first_name='first_ten_yr', last_name='last_ten_yr')
+
+
+BENCHMARKS = {'strip': bench_strip,
+              'parse': bench_parse,
+              'read_obs': bench_read_obs,
+              'ragged': bench_ragged,
+              'completeness': bench_completeness,
+              'kendall': bench_kendall,
+              'window_stats': bench_window_stats}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                              text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the parsing and trend kernels')
+    parser.add_argument('-b', '--bench', help='Benchmarks to run', nargs='+', choices=list(BENCHMARKS),
+                        default=list(BENCHMARKS))
+    parser.add_argument('-n', '--sites', help='Number of sites', type=int, default=2000)
+    parser.add_argument('-m', '--years', help='Number of years per site', type=int, default=70)
+    parser.add_argument('--repeat', help='Number of timed runs for each benchmark', type=int, default=5)
+    parser.add_argument('-r', '--results', help='Append results to this JSON-lines file', default=None)
+
+    args = parser.parse_args()
+
+    benches = list(args.bench)
+    kendall = None
+    if 'kendall' in benches:
+        try:
+            import kendall_cy
+            kendall = kendall_cy.kendall_numpy
+        except ImportError:
+            print('kendall_cy is not installed; skipping the kendall benchmark')
+            benches.remove('kendall')
+
+    run_info = {'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+                'commit': git_commit(),
+                'host': platform.node(),
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'pandas': pd.__version__,
+                'sites': args.sites,
+                'years': args.years}
+
+    print(f'{args.sites} sites x {args.years} years')
+    print(f'{"benchmark":<14s} {"best ms":>10s} {"median ms":>10s} {"peak MB":>9s}')
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        data = setup(args.sites, args.years, workdir)
+        data['kendall'] = kendall
+
+        for name in benches:
+            func = BENCHMARKS[name]
+            best, median = timed(lambda: func(data), args.repeat)
+            peak = peak_memory(lambda: func(data))
+
+            results.append(dict(run_info, benchmark=name, best=best, median=median, peak_bytes=peak))
+            print(f'{name:<14s} {1000 * best:10.2f} {1000 * median:10.2f} {peak / 2**20:9.2f}')
+
+    if args.results is not None:
+        with open(args.results, 'a') as fhdl:
+            for rr in results:
+                fhdl.write(json.dumps(rr) + '\n')
+        print(f'Results appended to {args.results}')
+
+
+if __name__ == '__main__':
+    main()
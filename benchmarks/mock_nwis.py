@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+"""Local stand-in for the NWIS web services used by the download scripts.
+
+Serves synthetic RDB pages for the site, dv, iv, stat, and peak services with
+configurable latency, error rate, and page size so download throughput can
+be measured without hitting waterservices.usgs.gov. Every site number is
+derived from the HUC and the data for a site is generated from a seed based
+on its number, so repeated requests return identical pages.
+
+Run standalone:
+    python mock_nwis.py --port 8080 --sites 100 --latency 0.05
+and point the scripts at it with --base-url http://127.0.0.1:8080/nwis
+(and --waterdata-url http://127.0.0.1:8080/usa/nwis for peak flows).
+"""
+
+#      Author: Parker Norton (pnorton@usgs.gov)
+#        Date: 2026-10-19
+
+import argparse
+import datetime
+import random
+import threading
+import time
+import zlib
+import numpy as np
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+__version__ = '0.1'
+__author__ = 'Parker Norton (pnorton@usgs.gov)'
+
+SITE_COLUMNS = ['agency_cd', 'site_no', 'station_nm', 'site_tp_cd', 'lat_va', 'long_va', 'dec_lat_va',
+                'dec_long_va', 'coord_meth_cd', 'coord_acy_cd', 'coord_datum_cd', 'dec_coord_datum_cd',
+                'district_cd', 'state_cd', 'county_cd', 'country_cd', 'land_net_ds', 'map_nm', 'map_scale_fc',
+                'alt_va', 'alt_meth_cd', 'alt_acy_va', 'alt_datum_cd', 'huc_cd', 'basin_cd', 'topo_cd',
+                'instruments_cd', 'construction_dt', 'inventory_dt', 'drain_area_va', 'contrib_drain_area_va',
+                'tz_cd', 'local_time_fg', 'reliability_cd', 'gw_file_cd', 'nat_aqfr_cd', 'aqfr_cd',
+                'aqfr_type_cd', 'well_depth_va', 'hole_depth_va', 'depth_src_cd', 'project_no']
+
+# Columns returned by the site service without siteOutput=expanded
+SITE_BRIEF_COLUMNS = ['agency_cd', 'site_no', 'station_nm', 'site_tp_cd', 'dec_lat_va', 'dec_long_va',
+                      'coord_acy_cd', 'dec_coord_datum_cd', 'alt_va', 'alt_acy_va', 'alt_datum_cd', 'huc_cd']
+
+PEAK_COLUMNS = ['agency_cd', 'site_no', 'peak_dt', 'peak_tm', 'peak_va', 'peak_cd', 'gage_ht', 'gage_ht_cd',
+                'year_last_pk', 'ag_dt', 'ag_tm', 'ag_gage_ht', 'ag_gage_ht_cd']
+
+
+class MockConfig:
+    """Behavior of the mock server.
+
+    latency: median seconds before a response is sent; individual requests
+             vary log-normally around it (latency_sigma)
+    error_rate: fraction of requests answered with 503 (with Retry-After: 0)
+    missing_rate: fraction of sites whose data requests return 404
+    sites: number of streamgages in each HUC
+    first_year: first year of record for every site
+    comment_lines: number of comment lines at the top of each page
+    """
+
+    def __init__(self, latency=0.0, latency_sigma=0.5, error_rate=0.0, missing_rate=0.0, sites=50,
+                 first_year=1950, comment_lines=30, seed=0):
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.missing_rate = missing_rate
+        self.sites = sites
+        self.first_year = first_year
+        self.comment_lines = comment_lines
+        self.seed = seed
+
+
+def _site_seed(site, seed=0):
+    return zlib.crc32(f'{seed}:{site}'.encode('ascii'))
+
+
+def _param(query, name, default=None):
+    vals = query.get(name)
+    return default if vals is None else vals[0]
+
+
+def _rdb(columns, rows, comment_lines, comment='# Synthetic data from the local NWIS test server', newline='\n'):
+    # Assemble an RDB page: comments, header, field-length line, and data rows
+    lines = [comment] * comment_lines
+    lines.append('\t'.join(columns))
+    lines.append('\t'.join('5s' if cc == 'agency_cd' else ('12n' if cc.endswith('_va') else '15s')
+                           for cc in columns))
+    lines.extend('\t'.join(rr) for rr in rows)
+    return newline.join(lines) + newline
+
+
+class MockNWIS:
+    """Synthetic NWIS services running on a background thread.
+
+    Request statistics (path, status, bytes, seconds) are collected for
+    every request and summarized by stats().
+    """
+
+    def __init__(self, config=None, host='127.0.0.1', port=0):
+        self.config = MockConfig() if config is None else config
+        self.records = []
+        self._lock = threading.Lock()
+        self._rng = random.Random(self.config.seed)
+
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                mock._handle(self)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def base_url(self):
+        # Equivalent of https://waterservices.usgs.gov/nwis
+        return f'{self.url}/nwis'
+
+    @property
+    def waterdata_url(self):
+        # Equivalent of https://nwis.waterdata.usgs.gov/usa/nwis
+        return f'{self.url}/usa/nwis'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset(self):
+        with self._lock:
+            self.records = []
+
+    def stats(self):
+        """Summary of the requests served since the last reset().
+
+        Returns a dict with requests, errors (5xx), not_found (404), bytes,
+        and the p50/p95 of the server-side response time in seconds.
+        """
+        with self._lock:
+            records = list(self.records)
+
+        status = np.array([rr[1] for rr in records], dtype=np.int64)
+        seconds = np.array([rr[3] for rr in records], dtype=np.float64)
+
+        return {'requests': len(records),
+                'errors': int((status >= 500).sum()),
+                'not_found': int((status == 404).sum()),
+                'bytes': int(sum(rr[2] for rr in records)),
+                'p50': float(np.percentile(seconds, 50)) if len(records) > 0 else None,
+                'p95': float(np.percentile(seconds, 95)) if len(records) > 0 else None}
+
+    # ------------------------------------------------------------------
+    def _handle(self, req):
+        start = time.monotonic()
+        cfg = self.config
+
+        with self._lock:
+            delay = cfg.latency * self._rng.lognormvariate(0.0, cfg.latency_sigma) if cfg.latency > 0 else 0.0
+            fail = self._rng.random() < cfg.error_rate
+
+        if delay > 0:
+            time.sleep(delay)
+
+        parsed = urlparse(req.path)
+        service = parsed.path.rstrip('/').split('/')[-1]
+        query = parse_qs(parsed.query)
+
+        status = 200
+        body = b''
+        headers = {'Content-Type': 'text/plain;charset=UTF-8'}
+
+        if fail:
+            status = 503
+            headers['Retry-After'] = '0'
+        else:
+            try:
+                page = {'site': self._site_page,
+                        'dv': self._dv_page,
+                        'iv': self._iv_page,
+                        'stat': self._stat_page,
+                        'peak': self._peak_page}[service](query)
+            except KeyError:
+                page = None
+                status = 400
+
+            if page is None and status == 200:
+                status = 404
+            elif page is not None:
+                body = page.encode('utf-8')
+
+        if status != 200 and len(body) == 0:
+            body = f'# //Output-Format: RDB\n# //Response-Status: {status}\n'.encode('utf-8')
+
+        req.send_response(status)
+        for kk, vv in headers.items():
+            req.send_header(kk, vv)
+        req.send_header('Content-Length', str(len(body)))
+        req.end_headers()
+        req.wfile.write(body)
+
+        with self._lock:
+            self.records.append((service, status, len(body), time.monotonic() - start))
+
+    def _missing(self, site):
+        return random.Random(f'{self.config.seed}:{site}').random() < self.config.missing_rate
+
+    def _region_sites(self, huc):
+        return [f'{int(huc[:2]):02d}{ii:06d}' for ii in range(self.config.sites)]
+
+    def _site_row(self, site, columns):
+        rng = np.random.default_rng(_site_seed(site, self.config.seed))
+        huc = site[:2] + f'{rng.integers(0, 999999):06d}'
+        values = {'agency_cd': 'USGS',
+                  'site_no': site,
+                  'station_nm': f'SYNTHETIC CREEK NR TESTVILLE {site[-4:]}',
+                  'site_tp_cd': 'ST',
+                  'dec_lat_va': f'{rng.uniform(25, 49):.8f}',
+                  'dec_long_va': f'{rng.uniform(-124, -67):.8f}',
+                  'coord_acy_cd': 'S',
+                  'dec_coord_datum_cd': 'NAD83',
+                  'alt_va': f'{rng.uniform(0, 3000):.2f}',
+                  'alt_acy_va': '20',
+                  'alt_datum_cd': 'NGVD29',
+                  'huc_cd': huc,
+                  'drain_area_va': f'{rng.lognormal(5, 1.5):.1f}',
+                  'contrib_drain_area_va': '' if rng.random() < 0.8 else f'{rng.lognormal(5, 1.5):.1f}',
+                  'country_cd': 'US',
+                  'tz_cd': 'EST',
+                  'local_time_fg': 'Y'}
+        return [values.get(cc, '') for cc in columns]
+
+    def _site_page(self, query):
+        if 'sites' in query:
+            sites = _param(query, 'sites').split(',')
+        elif 'huc' in query:
+            sites = self._region_sites(_param(query, 'huc'))
+        else:
+            return None
+
+        columns = SITE_COLUMNS if _param(query, 'siteOutput') == 'expanded' else SITE_BRIEF_COLUMNS
+        return _rdb(columns, [self._site_row(ss, columns) for ss in sites], self.config.comment_lines)
+
+    def _daily_flows(self, site, start, end):
+        # Seasonal daily flows with noise for start thru end (datetime64[D]).
+        # The flow for a day does not depend on the requested range.
+        rng = np.random.default_rng(_site_seed(site, self.config.seed))
+        base = rng.lognormal(4, 1.5)
+
+        days = np.arange(start, end + 1, dtype='datetime64[D]')
+        doy = (days - days.astype('datetime64[Y]')).astype(np.int64)
+
+        offset = int((start - np.datetime64(f'{self.config.first_year - 1}-10-01')).astype(np.int64))
+        noise = np.random.default_rng(_site_seed(site, self.config.seed) + 1).lognormal(0, 0.4, offset + len(days))
+        noise = noise[offset:]
+        return days, base * (1.0 + 0.6 * np.sin(2.0 * np.pi * (doy - 60) / 365.25)) * noise
+
+    def _dv_page(self, query):
+        site = _param(query, 'site', _param(query, 'sites'))
+        if site is None or self._missing(site):
+            return None
+
+        first = np.datetime64(f'{self.config.first_year}-01-01')
+        start = max(np.datetime64(_param(query, 'startDT', '1900-01-01')), first)
+        end = np.datetime64(_param(query, 'endDT', str(datetime.date.today())))
+        if end < start:
+            return None
+
+        params = _param(query, 'parameterCd', '00060').split(',')
+        stats = _param(query, 'statCd', '00003').split(',')
+        ts_id = 100000 + _site_seed(site) % 900000
+
+        columns = ['agency_cd', 'site_no', 'datetime']
+        for pp in params:
+            for ss in stats:
+                columns += [f'{ts_id}_{pp}_{ss}', f'{ts_id}_{pp}_{ss}_cd']
+
+        days, flows = self._daily_flows(site, start, end)
+        provisional = days > np.datetime64(datetime.date.today()) - 120
+
+        rows = []
+        for dd, qq, prov in zip(days.astype(str), flows, provisional):
+            row = ['USGS', site, dd]
+            for _ in range(len(params) * len(stats)):
+                row += [f'{qq:.3g}', 'P' if prov else 'A']
+            rows.append(row)
+        return _rdb(columns, rows, self.config.comment_lines)
+
+    def _iv_page(self, query):
+        # 15-minute values for startDT thru endDT (whole days, local standard
+        # time) which vary smoothly around the site's daily flows
+        site = _param(query, 'site', _param(query, 'sites'))
+        if site is None or self._missing(site):
+            return None
+
+        first = np.datetime64(f'{self.config.first_year}-01-01')
+        yesterday = str(datetime.date.today() - datetime.timedelta(days=1))
+        start = max(np.datetime64(_param(query, 'startDT', yesterday)[0:10]), first)
+        end = np.datetime64(_param(query, 'endDT', str(datetime.date.today()))[0:10])
+        if end < start:
+            return None
+
+        params = _param(query, 'parameterCd', '00060').split(',')
+        ts_id = 100000 + _site_seed(site) % 900000
+
+        columns = ['agency_cd', 'site_no', 'datetime', 'tz_cd']
+        for pp in params:
+            columns += [f'{ts_id}_{pp}', f'{ts_id}_{pp}_cd']
+
+        days, flows = self._daily_flows(site, start, end)
+        times = (days[:, None].astype('datetime64[m]') + np.arange(0, 1440, 15).astype('timedelta64[m]')).ravel()
+        diurnal = 1.0 + 0.05 * np.sin(2.0 * np.pi * np.arange(96) / 96.0)
+        values = (flows[:, None] * diurnal[None, :]).ravel()
+        provisional = times > np.datetime64(datetime.date.today()) - 120
+
+        rows = []
+        for tt, qq, prov in zip(np.datetime_as_string(times, unit='m'), values, provisional):
+            row = ['USGS', site, tt.replace('T', ' '), 'EST']
+            for _ in params:
+                row += [f'{qq:.3g}', 'P' if prov else 'A']
+            rows.append(row)
+        return _rdb(columns, rows, self.config.comment_lines)
+
+    def _stat_page(self, query):
+        site = _param(query, 'site', _param(query, 'sites'))
+        if site is None or self._missing(site):
+            return None
+
+        report = _param(query, 'statReportType', 'annual')
+        wateryears = _param(query, 'statYearType') == 'water'
+        first_year = max(int(_param(query, 'startDT', '1900')[0:4]), self.config.first_year)
+        last_year = int(_param(query, 'endDT', str(datetime.date.today().year))[0:4])
+        ts_id = str(100000 + _site_seed(site) % 900000)
+
+        if report not in ['annual', 'monthly']:
+            return None
+
+        start = np.datetime64(f'{first_year - 1}-10-01' if wateryears else f'{first_year}-01-01')
+        end = np.datetime64(f'{last_year}-09-30' if wateryears else f'{last_year}-12-31')
+        days, flows = self._daily_flows(site, start, end)
+
+        months = days.astype('datetime64[M]').astype(np.int64)
+        if report == 'annual':
+            keys = (months + (3 if wateryears else 0)) // 12 + 1970
+            columns = ['agency_cd', 'site_no', 'parameter_cd', 'ts_id', 'loc_web_ds', 'year_nu', 'mean_va']
+        else:
+            keys = months
+            columns = ['agency_cd', 'site_no', 'parameter_cd', 'ts_id', 'loc_web_ds', 'year_nu', 'month_nu',
+                       'mean_va']
+
+        rows = []
+        uniq, idx = np.unique(keys, return_index=True)
+        means = np.add.reduceat(flows, idx) / np.diff(np.r_[idx, len(flows)])
+        for kk, mm in zip(uniq, means):
+            # Some periods are missing so the completeness rules have work to do
+            if random.Random(f'{self.config.seed}:{site}:{report}:{kk}').random() < 0.02:
+                continue
+            if report == 'annual':
+                rows.append(['USGS', site, '00060', ts_id, '', str(kk), f'{mm:.1f}'])
+            else:
+                rows.append(['USGS', site, '00060', ts_id, '', str(kk // 12 + 1970), str(kk % 12 + 1), f'{mm:.1f}'])
+        return _rdb(columns, rows, self.config.comment_lines)
+
+    def _peak_page(self, query):
+        site = _param(query, 'site_no')
+        if site is None or self._missing(site):
+            return None
+
+        rng = np.random.default_rng(_site_seed(site, self.config.seed) + 3)
+        base = rng.lognormal(7, 1.5)
+        last_year = datetime.date.today().year - 1
+
+        rows = []
+        for year in range(self.config.first_year, last_year + 1):
+            peak = base * rng.lognormal(0, 0.6)
+            peak_dt = f'{year}-{rng.integers(1, 13):02d}-{rng.integers(1, 29):02d}'
+            rows.append(['USGS', site, peak_dt, '', f'{peak:.0f}', '', f'{np.log(peak):.2f}', '', '', '', '', '', ''])
+
+        # The waterdata service returns DOS line endings
+        return _rdb(PEAK_COLUMNS, rows, self.config.comment_lines, newline='\r\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local synthetic NWIS web service')
+    parser.add_argument('--host', help='Address to listen on', default='127.0.0.1')
+    parser.add_argument('--port', help='Port to listen on', type=int, default=8080)
+    parser.add_argument('--sites', help='Number of streamgages per HUC', type=int, default=50)
+    parser.add_argument('--latency', help='Median response latency (seconds)', type=float, default=0.0)
+    parser.add_argument('--error-rate', help='Fraction of requests answered with 503', type=float, default=0.0)
+    parser.add_argument('--missing-rate', help='Fraction of sites without data (404)', type=float, default=0.0)
+    parser.add_argument('--first-year', help='First year of record', type=int, default=1950)
+    parser.add_argument('--comment-lines', help='Comment lines at the top of each page', type=int, default=30)
+
+    args = parser.parse_args()
+
+    config = MockConfig(latency=args.latency, error_rate=args.error_rate, missing_rate=args.missing_rate,
+                        sites=args.sites, first_year=args.first_year, comment_lines=args.comment_lines)
+    mock = MockNWIS(config, host=args.host, port=args.port)
+
+    print(f'NWIS web services: {mock.base_url}')
+    print(f'NWIS Water Data:   {mock.waterdata_url}')
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+
+import numpy as np
+import pandas as pd
+
+from pyNWIS.calendars import calendar_month, calendar_year, period_bounds, water_quarter, water_year
+
+__author__ = 'Parker Norton (pnorton@usgs.gov)'
+
+PERIODS = ['monthly', 'annual', 'wateryear', 'waterquarter']
+
+
+def aggregate_daily(df, value_col, period='monthly', missing_data=False, site_col='site_no', date_col='datetime'):
+    """Aggregate daily values to monthly, annual, water-year or water-quarter means.
+
+    Like the NWIS statistics service (missingData=off), a mean is only
+    reported for periods where every day has a value; set missing_data=True
+    to report means for partial periods as well. The values are reduced with
+    segment sums over the (site, period) sorted arrays.
+
+    Returns a dataframe with site_no, year_nu, month_nu (monthly) or qtr_nu
+    (waterquarter), mean_va and count_nu. For water years and water quarters
+    year_nu is the water year.
+    """
+    values = pd.to_numeric(df[value_col], errors='coerce').to_numpy(np.float64)
+    start, nxt = period_bounds(df[date_col].to_numpy(), period)
+    site_codes, site_names = pd.factorize(df[site_col], sort=True)
+
+    start_day = start.astype(np.int64)
+    order = np.lexsort((start_day, site_codes))
+    site_codes = site_codes[order]
+    start_day = start_day[order]
+    values = values[order]
+    nxt = nxt[order]
+
+    if len(order) == 0:
+        return pd.DataFrame(columns=['site_no', 'year_nu', 'mean_va', 'count_nu'])
+
+    # Segment boundaries for each (site, period)
+    new_seg = np.ones(len(order), dtype=bool)
+    new_seg[1:] = (site_codes[1:] != site_codes[:-1]) | (start_day[1:] != start_day[:-1])
+    seg = np.flatnonzero(new_seg)
+
+    valid = ~np.isnan(values)
+    total = np.add.reduceat(np.where(valid, values, 0.0), seg)
+    count = np.add.reduceat(valid.astype(np.int64), seg)
+
+    seg_start = start_day[seg].astype('datetime64[D]')
+    ndays = (nxt[seg] - seg_start).astype(np.int64)
+
+    keep = count > 0
+    if not missing_data:
+        keep &= count >= ndays
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+
+    seg_start = seg_start[keep]
+
+    result = pd.DataFrame({'site_no': np.asarray(site_names)[site_codes[seg][keep]]})
+
+    if period in ['wateryear', 'waterquarter']:
+        result['year_nu'] = water_year(seg_start)
+    else:
+        result['year_nu'] = calendar_year(seg_start)
+
+    if period == 'monthly':
+        result['month_nu'] = calendar_month(seg_start)
+    elif period == 'waterquarter':
+        result['qtr_nu'] = water_quarter(seg_start)
+
+    result['mean_va'] = mean[keep]
+    result['count_nu'] = count[keep]
+    return result
+
+
+def to_stat_layout(result, agency_cd='USGS', parameter_cd='00060', ts_id=0):
+    """Arrange aggregated values in the column layout of the NWIS stat service.
+
+    The daily-value files do not carry the time-series id so ts_id is filled
+    with a constant.
+    """
+    out = pd.DataFrame({'agency_cd': agency_cd,
+                        'site_no': result['site_no'],
+                        'parameter_cd': parameter_cd,
+                        'ts_id': ts_id,
+                        'loc_web_ds': ''})
+
+    for cc in ['year_nu', 'month_nu', 'qtr_nu', 'mean_va', 'count_nu']:
+        if cc in result.columns:
+            out[cc] = result[cc]
+    return out
@@ -0,0 +1,126 @@
+
+import hashlib
+import importlib
+import json
+import os
+import shutil
+
+__author__ = 'Parker Norton (pnorton@usgs.gov)'
+
+# Bump when the layout of cached entries changes
+CACHE_FORMAT = 1
+
+
+def default_cache_dir():
+    # Cache location can be overridden with the PYNWIS_CACHE environment variable
+    return os.environ.get('PYNWIS_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'pyNWIS'))
+
+
+def file_digest(filename, blocksize=2**20):
+    # SHA-256 of a file's content
+    hsh = hashlib.sha256()
+    with open(filename, 'rb') as fhdl:
+        for block in iter(lambda: fhdl.read(blocksize), b''):
+            hsh.update(block)
+    return hsh.hexdigest()
+
+
+def source_digest(modules, files=()):
+    """SHA-256 of the named modules (e.g. 'pyNWIS.trends') and other source files.
+
+    Including it in the cache parameters invalidates cached results when
+    any code that produced them changes, not only when a version is bumped.
+    Compiled extension modules are hashed from their shared library.
+    """
+    hsh = hashlib.sha256()
+    for name in sorted(modules):
+        hsh.update(name.encode('utf-8'))
+        hsh.update(file_digest(importlib.import_module(name).__file__).encode('ascii'))
+    for ff in files:
+        hsh.update(file_digest(ff).encode('ascii'))
+    return hsh.hexdigest()
+
+
+class ResultCache:
+    """On-disk cache of output files keyed by a hash of the inputs.
+
+    The key combines the content of the input files with the parameters
+    (e.g. date range, p-value and engine version), so any change to either
+    selects a different entry. Each entry stores the output files by their
+    suffix (e.g. '_kendall.tab').
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = default_cache_dir() if cache_dir is None else cache_dir
+
+    @staticmethod
+    def key(input_files, params):
+        # Cache key for the given input files and a JSON-serializable dict of parameters
+        manifest = {'format': CACHE_FORMAT,
+                    'inputs': [file_digest(ff) for ff in input_files],
+                    'params': params}
+        return hashlib.sha256(json.dumps(manifest, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def _complete(self, entry, suffixes):
+        return all(os.path.isfile(os.path.join(entry, sfx)) for sfx in suffixes)
+
+    def fetch(self, key, outputs):
+        """Copy cached files to the output paths.
+
+        outputs maps each suffix to its output path. Returns False unless
+        every output is in the cache and was copied; an entry which is
+        replaced while it is being read is treated as missing.
+        """
+        entry = self._entry_dir(key)
+        if not self._complete(entry, outputs):
+            return False
+
+        try:
+            for sfx, dst in outputs.items():
+                shutil.copyfile(os.path.join(entry, sfx), dst)
+        except OSError:
+            return False
+        return True
+
+    def store(self, key, outputs, params=None):
+        """Save the output files (suffix -> path) under the given key.
+
+        Entries only appear by renaming a complete temporary directory into
+        place, so readers never see a partial entry. The key is a hash of the
+        inputs and parameters, so an entry which is already present (e.g.
+        stored by a concurrent run) holds the same results and is kept. An
+        incomplete entry is renamed aside before the new one takes its place
+        and is deleted afterwards.
+        """
+        entry = self._entry_dir(key)
+        if self._complete(entry, outputs):
+            return
+
+        tmp_entry = f'{entry}.tmp{os.getpid()}'
+        os.makedirs(tmp_entry, exist_ok=True)
+
+        for sfx, src in outputs.items():
+            shutil.copyfile(src, os.path.join(tmp_entry, sfx))
+
+        if params is not None:
+            with open(os.path.join(tmp_entry, 'params.json'), 'w') as fhdl:
+                json.dump(params, fhdl, indent=1, sort_keys=True, default=str)
+
+        old_entry = f'{entry}.old{os.getpid()}'
+        if os.path.isdir(entry) and not self._complete(entry, outputs):
+            try:
+                os.rename(entry, old_entry)
+            except OSError:
+                # Another run moved or replaced it first
+                pass
+
+        try:
+            os.rename(tmp_entry, entry)
+        except OSError:
+            # Another run stored the same key in the meantime; its entry is
+            # for identical inputs so this copy is discarded
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+        shutil.rmtree(old_entry, ignore_errors=True)
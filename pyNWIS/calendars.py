@@ -0,0 +1,121 @@
+
+import numpy as np
+
+__author__ = 'Parker Norton (pnorton@usgs.gov)'
+
+# All functions take array-like dates (anything numpy can convert to
+# datetime64) and work with integer month and day counts since 1970, so no
+# Python date objects are created.
+
+
+def to_days(dates):
+    return np.asarray(dates, dtype='datetime64[D]')
+
+
+def _months(dates):
+    # Months since January 1970
+    return to_days(dates).astype('datetime64[M]').astype(np.int64)
+
+
+def calendar_year(dates):
+    return _months(dates) // 12 + 1970
+
+
+def calendar_month(dates):
+    return _months(dates) % 12 + 1
+
+
+def shifted_year(dates, start_month):
+    """Year that begins on the first day of start_month.
+
+    The year is labeled by the calendar year in which it ends, so with a
+    start_month of 10 this is the water year and with 4 it is the climatic
+    year used for low-flow statistics.
+    """
+    shift = (13 - start_month) % 12
+    return (_months(dates) + shift) // 12 + 1970
+
+
+def water_year(dates):
+    # Water years begin October 1 and are labeled by the year in which they end
+    return shifted_year(dates, 10)
+
+
+def water_quarter(dates):
+    # Water quarters are Oct-Dec (1), Jan-Mar (2), Apr-Jun (3), and Jul-Sep (4)
+    return (_months(dates) + 3) % 12 // 3 + 1
+
+
+def water_year_day(dates):
+    # Day of the water year; October 1 is day 1
+    days = to_days(dates)
+    start = shifted_year_start(water_year(days), 10)
+    return (days - start).astype(np.int64) + 1
+
+
+def shifted_year_start(year, start_month):
+    # First day of the year beginning in start_month and ending in the given year
+    shift = (13 - start_month) % 12
+    months = (np.asarray(year, dtype=np.int64) - 1970) * 12 - shift
+    return months.astype('datetime64[M]').astype('datetime64[D]')
+
+
+def season_id(dates, start_months):
+    """Season number (0-based) for each date.
+
+    start_months lists the first month of each season in order, e.g.
+    [12, 3, 6, 9] for DJF, MAM, JJA, SON. Each month belongs to the season
+    whose start month most recently preceded it.
+    """
+    starts = list(start_months)
+    table = np.empty(12, dtype=np.int64)
+
+    for mm in range(1, 13):
+        # Walk backwards from this month to the closest season start
+        for back in range(12):
+            prev = (mm - 1 - back) % 12 + 1
+            if prev in starts:
+                table[mm - 1] = starts.index(prev)
+                break
+
+    return table[calendar_month(dates) - 1]
+
+
+def month_end(year, month):
+    # Last day of each (year, month)
+    months = (np.asarray(year, dtype=np.int64) - 1970) * 12 + np.asarray(month, dtype=np.int64) - 1
+    return (months + 1).astype('datetime64[M]').astype('datetime64[D]') - 1
+
+
+def year_end(year, wateryears=False):
+    # Last day of each calendar year or, with wateryears, each water year (September 30)
+    if wateryears:
+        return month_end(year, 9)
+    return month_end(year, 12)
+
+
+def period_bounds(dates, period):
+    """Return (start, next_start) of the period containing each date.
+
+    period is one of 'monthly', 'annual', 'wateryear' or 'waterquarter'.
+    The returned arrays are datetime64[D].
+    """
+    months = _months(dates)
+
+    if period == 'monthly':
+        start = months
+        nxt = months + 1
+    elif period == 'annual':
+        start = months - months % 12
+        nxt = start + 12
+    elif period == 'wateryear':
+        start = (water_year(dates) - 1970) * 12 - 3
+        nxt = start + 12
+    elif period == 'waterquarter':
+        shifted = months + 3
+        start = shifted - shifted % 3 - 3
+        nxt = start + 3
+    else:
+        raise ValueError(f'Unknown aggregation period: {period}')
+
+    return start.astype('datetime64[M]').astype('datetime64[D]'), nxt.astype('datetime64[M]').astype('datetime64[D]')
@@ -0,0 +1,186 @@
+
+import numpy as np
+import pandas as pd
+
+from pyNWIS.obsfiles import DATE_COLUMNS, obs_dtypes, obs_layout, obs_periods, read_header
+from pyNWIS.qualifiers import code_column, mask_values
+from pyNWIS.ragged import RaggedSeries
+from pyNWIS.trends import kendall_trends
+
+__author__ = 'Parker Norton (pnorton@usgs.gov)'
+
+# Parsed rows are copied a few times while a chunk is processed (ragged arrays,
+# sorting, temporaries) so only a fraction of the budget is used for the chunk
+WORKING_COPIES = 4
+
+
+def rows_for_budget(obsfile, memory_budget, usecols, dtypes, sample_rows=10000):
+    # Estimate how many rows of the observation file fit in the memory budget
+    # when read with the given columns and dtypes (those used for the blocks)
+    sample = pd.read_csv(obsfile, sep='\t', usecols=usecols, dtype=dtypes, nrows=sample_rows)
+
+    if len(sample) == 0:
+        return sample_rows
+
+    row_bytes = sample.memory_usage(index=True, deep=True).sum() / len(sample)
+    return max(int(memory_budget / (row_bytes * WORKING_COPIES)), 1000)
+
+
+def site_chunks(obsfile, memory_budget=256 * 2**20, usecols=None):
+    """Stream an observation file as dataframes containing only whole sites.
+
+    The file is read in blocks sized from memory_budget (bytes). Rows for the
+    last site in a block are carried over to the next block so a site is
+    never split across chunks. Observation files are expected to be grouped by
+    site, as the NWIS download scripts write them; a single site larger than
+    the budget is still returned as one chunk.
+    """
+    columns = read_header(obsfile) if usecols is None else list(usecols)
+
+    # Categories differ from block to block so site_no is kept as a string here
+    dtypes = obs_dtypes(columns)
+    dtypes['site_no'] = str
+
+    chunksize = rows_for_budget(obsfile, memory_budget, columns, dtypes)
+
+    # Blocks (or the tail of a block) holding the last site seen; they are
+    # concatenated once, when the site is complete, so a site spanning many
+    # blocks is not copied again for every block
+    pending = []
+    for block in pd.read_csv(obsfile, sep='\t', usecols=columns, dtype=dtypes, chunksize=chunksize):
+        sites = block['site_no'].to_numpy()
+        other = np.flatnonzero(sites != sites[-1])
+
+        if len(other) == 0:
+            # The whole block belongs to one site
+            if len(pending) > 0 and pending[-1]['site_no'].iat[-1] != sites[-1]:
+                yield _join_blocks(pending)
+                pending = []
+            pending.append(block)
+            continue
+
+        split = other[-1] + 1
+        yield _join_blocks(pending + [block.iloc[:split]])
+        pending = [block.iloc[split:]]
+
+    if len(pending) > 0:
+        yield _join_blocks(pending)
+
+
+def _join_blocks(blocks):
+    if len(blocks) == 1:
+        return blocks[0]
+    return pd.concat(blocks, ignore_index=True)
+
+
+def site_aggregates(df, value_col, periods=None):
+    """Partial per-site aggregates which can be merged with merge_aggregates().
+
+    Returns a dataframe indexed by site_no with count, sum, sumsq, min and max
+    of value_col, plus first/last period when periods are given.
+    """
+    values = pd.to_numeric(df[value_col], errors='coerce').astype(np.float64)
+    work = pd.DataFrame({'site_no': df['site_no'].to_numpy(),
+                         'value': values.to_numpy(),
+                         'sq': values.to_numpy()**2})
+    if periods is not None:
+        work['period'] = periods
+
+    grp = work.groupby('site_no', sort=False)
+    part = pd.DataFrame({'count': grp['value'].count(),
+                         'sum': grp['value'].sum(),
+                         'sumsq': grp['sq'].sum(),
+                         'min': grp['value'].min(),
+                         'max': grp['value'].max()})
+
+    if periods is not None:
+        part['first_period'] = grp['period'].min()
+        part['last_period'] = grp['period'].max()
+    return part
+
+
+def merge_aggregates(parts):
+    """Merge partial aggregates and compute the mean and standard deviation.
+
+    Sites which appear in more than one part are combined.
+    """
+    allparts = pd.concat(parts)
+    how = {'count': 'sum', 'sum': 'sum', 'sumsq': 'sum', 'min': 'min', 'max': 'max',
+           'first_period': 'min', 'last_period': 'max'}
+
+    merged = allparts.groupby(level=0, sort=True).agg({kk: vv for kk, vv in how.items() if kk in allparts.columns})
+
+    nn = merged['count'].to_numpy(np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        merged['mean'] = merged['sum'] / nn
+        var = (merged['sumsq'] - nn * merged['mean']**2) / (nn - 1)
+    merged['std'] = np.sqrt(var.clip(lower=0.0))
+
+    merged.index.name = 'site_no'
+    return merged
+
+
+def chunked_statistics(obsfile, memory_budget=256 * 2**20, value_col=None, first_period=None, last_period=None,
+                       max_pval=None, kendall=None, rule=None):
+    """Compute per-site aggregates (and optionally Kendall trends) out of core.
+
+    The observation file is streamed in site-aligned chunks bounded by
+    memory_budget (bytes). Observations can be restricted to periods
+    first_period thru last_period (integer periods since 1970 in the units of
+    the file layout). When max_pval is given the Kendall tau is computed for
+    each site and the pval, tau and trend columns are added to the result.
+    Values which fail the qualification-code rule (a QualifierRule) are
+    treated as missing; the number masked is in result.attrs['masked'].
+    """
+    freq, default_col = obs_layout(obsfile)
+    if value_col is None:
+        value_col = default_col
+
+    usecols = ['site_no'] + DATE_COLUMNS[freq] + [value_col]
+    if rule is not None:
+        usecols.append(code_column(value_col))
+
+    parts = []
+    masked = 0
+    trends = []
+    seen = set()
+
+    for chunk in site_chunks(obsfile, memory_budget=memory_budget, usecols=usecols):
+        periods = obs_periods(chunk, freq)
+
+        keep = np.ones(len(chunk), dtype=bool)
+        if first_period is not None:
+            keep &= periods >= first_period
+        if last_period is not None:
+            keep &= periods <= last_period
+        chunk = chunk[keep]
+        periods = periods[keep]
+
+        if len(chunk) == 0:
+            continue
+
+        if rule is not None:
+            chunk = chunk.copy()
+            masked += mask_values(chunk, value_col, rule)
+
+        parts.append(site_aggregates(chunk, value_col, periods=periods))
+
+        if max_pval is not None:
+            chunk_sites = set(pd.unique(chunk['site_no']))
+            if not seen.isdisjoint(chunk_sites):
+                raise ValueError(f'{obsfile}: observations are not grouped by site; trends cannot be computed')
+            seen |= chunk_sites
+
+            sitedata = RaggedSeries.from_periods(chunk['site_no'].to_numpy(), periods,
+                                                 pd.to_numeric(chunk[value_col], errors='coerce').to_numpy(),
+                                                 freq=freq)
+            trends.append(kendall_trends(sitedata, max_pval, kendall=kendall))
+
+    if len(parts) == 0:
+        return pd.DataFrame()
+
+    result = merge_aggregates(parts)
+    if len(trends) > 0:
+        result = result.join(pd.concat(trends), how='left')
+    result.attrs['masked'] = masked
+    return result
@@ -0,0 +1,138 @@
+
+import numpy as np
+import pandas as pd
+
+__author__ = 'Parker Norton (pnorton@usgs.gov)'
+
+
+class CompletenessRule:
+    """Rule for deciding whether a time series has a complete enough record.
+
+    min_count: minimum number of periods with observations
+    min_pct: minimum percentage of the expected periods that have observations
+    max_gap: maximum number of consecutive missing periods; missing periods
+             at the start or end of the window are included
+    """
+
+    def __init__(self, min_count=None, min_pct=None, max_gap=None):
+        self.min_count = min_count
+        self.min_pct = min_pct
+        self.max_gap = max_gap
+
+    def __str__(self):
+        parts = []
+        if self.min_count is not None:
+            parts.append(f'count >= {self.min_count}')
+        if self.min_pct is not None:
+            parts.append(f'percent >= {self.min_pct}')
+        if self.max_gap is not None:
+            parts.append(f'gap <= {self.max_gap}')
+
+        if len(parts) == 0:
+            return 'none'
+        return ', '.join(parts)
+
+    def passes(self, report):
+        # Return a boolean series, indexed like the report, which is True for
+        # each time series that satisfies the rule
+        ok = np.ones(len(report), dtype=bool)
+
+        if self.min_count is not None:
+            ok &= report['n_obs'].to_numpy() >= self.min_count
+        if self.min_pct is not None:
+            ok &= (100.0 - report['pct_missing'].to_numpy()) >= self.min_pct
+        if self.max_gap is not None:
+            ok &= report['max_gap'].to_numpy() <= self.max_gap
+
+        return pd.Series(ok, index=report.index, name='complete')
+
+
+def completeness_report(df, period_col, first_period, last_period, keys=('site_no', 'ts_id')):
+    """Compute record completeness for each time series in a dataframe.
+
+    Periods are consecutive integers (e.g. years, or months counted from some
+    epoch) and first_period/last_period bound the window of interest. The
+    returned dataframe is indexed by keys and has one row per time series.
+    """
+    keys = list(keys)
+    periods = df[period_col].to_numpy(dtype=np.int64)
+    in_window = (periods >= first_period) & (periods <= last_period)
+
+    grp = df[in_window].groupby(keys, sort=True, observed=True)
+    gid = grp.ngroup().to_numpy(dtype=np.int64)
+    periods = periods[in_window]
+
+    valid = gid >= 0
+    gid = gid[valid]
+    periods = periods[valid]
+
+    # Sort by time series and then by period; duplicate periods only count once
+    order = np.lexsort((periods, gid))
+    gid = gid[order]
+    periods = periods[order]
+
+    uniq = np.ones(len(gid), dtype=bool)
+    uniq[1:] = (gid[1:] != gid[:-1]) | (periods[1:] != periods[:-1])
+    gid = gid[uniq]
+    periods = periods[uniq]
+
+    n_obs = np.bincount(gid, minlength=grp.ngroups)
+
+    # Index of the first and last period of each time series
+    new_grp = np.ones(len(gid), dtype=bool)
+    new_grp[1:] = gid[1:] != gid[:-1]
+    starts = np.flatnonzero(new_grp)
+    ends = np.r_[starts[1:], len(gid)] - 1
+
+    # Number of missing periods before each observation within a time series
+    gap_before = np.zeros(len(gid), dtype=np.int64)
+    gap_before[1:] = periods[1:] - periods[:-1] - 1
+    gap_before[new_grp] = 0
+
+    if len(gid) > 0:
+        max_gap = np.maximum.reduceat(gap_before, starts)
+        first_obs = periods[starts]
+        last_obs = periods[ends]
+    else:
+        max_gap = np.zeros(0, dtype=np.int64)
+        first_obs = np.zeros(0, dtype=np.int64)
+        last_obs = np.zeros(0, dtype=np.int64)
+
+    max_gap = np.maximum(max_gap, first_obs - first_period)
+    max_gap = np.maximum(max_gap, last_period - last_obs)
+
+    n_expected = last_period - first_period + 1
+
+    report = pd.DataFrame({'first_period': first_obs,
+                           'last_period': last_obs,
+                           'n_obs': n_obs,
+                           'n_expected': n_expected,
+                           'pct_missing': 100.0 * (1.0 - n_obs / n_expected),
+                           'max_gap': max_gap},
+                          index=grp.size().index)
+    return report
+
+
+def filter_complete(df, report, rule, keys=('site_no', 'ts_id')):
+    """Return the rows of df belonging to time series that pass the rule.
+
+    The report is returned with an added 'complete' column.
+    """
+    keys = list(keys)
+
+    report = report.copy()
+    report['complete'] = rule.passes(report)
+
+    keep = report.index[report['complete'].to_numpy()]
+
+    if len(keys) == 1:
+        row_keys = pd.Index(df[keys[0]])
+    else:
+        row_keys = pd.MultiIndex.from_arrays([df[kk] for kk in keys])
+
+    return df[row_keys.isin(keep)], report
+
+
+def write_report(report, filename):
+    # Write a completeness report to a tab-delimited file
+    report.to_csv(filename, sep='\t', float_format='%.2f', header=True, index=True)
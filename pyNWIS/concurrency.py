@@ -0,0 +1,118 @@
+
+import threading
+import time
+import numpy as np
+
+from collections import deque
+
+__author__ = 'Parker Norton (pnorton@usgs.gov)'
+
+# Number of recent requests needed before the error rate and latency are trusted
+MIN_SAMPLES = 10
+
+
+class AdaptiveConcurrency:
+    """Limit the number of in-flight requests using additive-increase/multiplicative-decrease.
+
+    While the recent error rate is at most max_error_rate and the recent p95
+    latency is healthy the limit grows by one request per limit completed
+    requests. When either degrades the limit is halved, at most once per
+    limit completed requests so a single burst of errors only counts once.
+    Latency is healthy when it is below max_latency (seconds) or, when that
+    is None, below latency_factor times the best p95 seen so far. Only
+    errors which indicate an overloaded server (e.g. 5xx, 429 or timeouts)
+    should be reported as failures.
+    """
+
+    def __init__(self, initial=2, min_limit=1, max_limit=16, max_error_rate=0.05, max_latency=None,
+                 latency_factor=3.0, window=50):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_error_rate = max_error_rate
+        self.max_latency = max_latency
+        self.latency_factor = latency_factor
+
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.baseline = None
+
+        self._in_flight = 0
+        self._since_decrease = 0
+        self._cond = threading.Condition()
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def available(self):
+        # Number of free request slots
+        with self._cond:
+            return max(int(self.limit) - self._in_flight, 0)
+
+    def p95(self):
+        # 95th percentile of the recent request latencies (seconds)
+        if len(self.latencies) == 0:
+            return None
+        return float(np.percentile(self.latencies, 95))
+
+    def error_rate(self):
+        if len(self.outcomes) == 0:
+            return 0.0
+        return 1.0 - sum(self.outcomes) / len(self.outcomes)
+
+    def _latency_ok(self, p95):
+        if p95 is None:
+            return True
+        if self.max_latency is not None:
+            return p95 <= self.max_latency
+        if self.baseline is None:
+            return True
+        return p95 <= self.latency_factor * self.baseline
+
+    def acquire(self):
+        # Wait for a free request slot; returns the start time for release()
+        with self._cond:
+            while self._in_flight >= int(self.limit):
+                self._cond.wait()
+            self._in_flight += 1
+        return time.monotonic()
+
+    def release(self, start, ok=True):
+        # Record the outcome of a request started at start and adjust the limit
+        elapsed = time.monotonic() - start
+
+        with self._cond:
+            self._in_flight -= 1
+            self.outcomes.append(ok)
+            if ok:
+                self.latencies.append(elapsed)
+
+            p95 = self.p95()
+            if len(self.latencies) >= MIN_SAMPLES:
+                self.baseline = p95 if self.baseline is None else min(self.baseline, p95)
+
+            self._since_decrease += 1
+
+            healthy = ok
+            if len(self.outcomes) >= MIN_SAMPLES:
+                healthy &= self.error_rate() <= self.max_error_rate
+            if len(self.latencies) >= MIN_SAMPLES:
+                healthy &= self._latency_ok(p95)
+
+            if healthy:
+                self.limit = min(self.limit + 1.0 / self.limit, float(self.max_limit))
+            elif self._since_decrease >= self.limit:
+                self.limit = max(self.limit / 2.0, float(self.min_limit))
+                self._since_decrease = 0
+
+                # Start over so the errors and latencies which caused this
+                # decrease are not counted again
+                self.outcomes.clear()
+                self.latencies.clear()
+
+            self._cond.notify_all()
+
+
+# Shared by all NWIS services so the limit reflects the total load on the server
+DEFAULT_CONCURRENCY = AdaptiveConcurrency()
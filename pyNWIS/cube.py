@@ -0,0 +1,143 @@
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from pyNWIS.obsfiles import DATE_COLUMNS, obs_layout, obs_periods, read_header
+
+__author__ = 'Parker Norton (pnorton@usgs.gov)'
+
+
+def _sidecar_name(cubefile):
+    return f'{os.path.splitext(cubefile)[0]}.json'
+
+
+def _read_chunks(obsfile, freq, value_col, chunksize, keys):
+    return pd.read_csv(obsfile, sep='\t', usecols=keys + DATE_COLUMNS[freq] + [value_col],
+                       dtype={kk: str for kk in keys}, chunksize=chunksize)
+
+
+def _series_keys(chunk, keys):
+    # Column key (site_no, or site_no and ts_id) of each row
+    return pd.MultiIndex.from_arrays([chunk[kk].to_numpy() for kk in keys])
+
+
+def build_cube(obsfile, cubefile, value_col=None, chunksize=500000):
+    """Convert an NWIS observation file to a memory-mapped (date x site) cube.
+
+    The values are written as float32 to cubefile (a .npy file) and the site
+    index and date axis are written to a JSON sidecar next to it. The
+    observation file is read twice in chunks so memory use stays bounded.
+    When the file has a ts_id column (stat files) each (site_no, ts_id)
+    series gets its own column, as in the kendall scripts, and the ts_id of
+    each column is written to the sidecar.
+    """
+    freq, default_col = obs_layout(obsfile)
+    if value_col is None:
+        value_col = default_col
+
+    keys = ['site_no', 'ts_id'] if 'ts_id' in read_header(obsfile) else ['site_no']
+
+    # First pass: sites and the overall date range
+    sites = {}
+    first = np.iinfo(np.int64).max
+    last = np.iinfo(np.int64).min
+
+    for chunk in _read_chunks(obsfile, freq, value_col, chunksize, keys):
+        for ss in _series_keys(chunk, keys).unique():
+            sites.setdefault(ss, len(sites))
+
+        periods = obs_periods(chunk, freq)
+        if len(periods) > 0:
+            first = min(first, periods.min())
+            last = max(last, periods.max())
+
+    ndates = int(max(last - first + 1, 0))
+    cube = np.lib.format.open_memmap(cubefile, mode='w+', dtype=np.float32, shape=(ndates, len(sites)))
+    cube[:] = np.nan
+
+    # Second pass: scatter the values into the cube
+    site_names = pd.MultiIndex.from_tuples(list(sites.keys()), names=keys)
+
+    for chunk in _read_chunks(obsfile, freq, value_col, chunksize, keys):
+        rows = obs_periods(chunk, freq) - first
+        cols = site_names.get_indexer(_series_keys(chunk, keys))
+        cube[rows, cols] = pd.to_numeric(chunk[value_col], errors='coerce').to_numpy(np.float32)
+
+    cube.flush()
+    del cube
+
+    sidecar = {'source': os.path.abspath(obsfile),
+               'value_col': value_col,
+               'freq': freq,
+               'start': str(np.datetime64(int(first), freq)) if ndates > 0 else None,
+               'ndates': int(ndates),
+               'sites': [kk[0] for kk in sites],
+               'ts_ids': [kk[1] for kk in sites] if 'ts_id' in keys else None}
+
+    with open(_sidecar_name(cubefile), 'w') as fhdl:
+        json.dump(sidecar, fhdl, indent=1)
+
+
+class ObsCube:
+    """Read-only view of an observation cube written by build_cube().
+
+    values is a memory-mapped (date x site) float32 array, dates is the
+    datetime64 date axis and sites is the array of site numbers. For cubes
+    built from files with a ts_id column, ts_ids gives the series of each
+    column (a site can then have more than one column); otherwise it is None.
+    """
+
+    def __init__(self, cubefile):
+        with open(_sidecar_name(cubefile), 'r') as fhdl:
+            meta = json.load(fhdl)
+
+        self.freq = meta['freq']
+        self.value_col = meta['value_col']
+        self.source = meta['source']
+        self.sites = np.array(meta['sites'], dtype=str)
+        self.ts_ids = np.array(meta['ts_ids'], dtype=str) if meta.get('ts_ids') is not None else None
+        self.values = np.load(cubefile, mmap_mode='r')
+
+        if meta['start'] is None:
+            self.dates = np.array([], dtype=f'datetime64[{self.freq}]')
+        else:
+            self.dates = np.datetime64(meta['start'], self.freq) + np.arange(meta['ndates'])
+
+        self._site_idx = {}
+        for ii, ss in enumerate(meta['sites']):
+            self._site_idx.setdefault(ss, []).append(ii)
+
+    def __len__(self):
+        return len(self.sites)
+
+    def site(self, site_no, ts_id=None):
+        # View of the values for a single site; ts_id selects the series
+        # when the site has more than one
+        cols = self._site_idx[site_no]
+        if ts_id is not None:
+            cols = [ii for ii in cols if self.ts_ids[ii] == str(ts_id)]
+            if len(cols) == 0:
+                raise KeyError(f'{site_no}: no series with ts_id {ts_id}')
+        elif len(cols) > 1:
+            raise KeyError(f'{site_no}: has {len(cols)} series; select one with ts_id '
+                           f'({", ".join(self.ts_ids[cols])})')
+        return self.values[:, cols[0]]
+
+    def window(self, start, end):
+        # View of the rows for dates from start thru end (inclusive)
+        lo = np.searchsorted(self.dates, np.datetime64(start, self.freq), side='left')
+        hi = np.searchsorted(self.dates, np.datetime64(end, self.freq), side='right')
+        return self.dates[lo:hi], self.values[lo:hi, :]
+
+    def to_frame(self):
+        # Return the cube as a (date x site) dataframe; this copies the data
+        return pd.DataFrame(np.asarray(self.values), index=pd.DatetimeIndex(self.dates.astype('datetime64[ns]')),
+                            columns=self._columns())
+
+    def _columns(self):
+        if self.ts_ids is None:
+            return pd.Index(self.sites, name='site_no')
+        return pd.MultiIndex.from_arrays([self.sites, self.ts_ids], names=['site_no', 'ts_id'])
@@ -0,0 +1,145 @@
+
+import numpy as np
+import pandas as pd
+
+from pyNWIS.obsfiles import RE_DV_CODE, obs_layout, obs_periods
+from pyNWIS.qualifiers import QUALIFIER_BITS, parse_codes
+
+__author__ = 'Parker Norton (pnorton@usgs.gov)'
+
+# Columns which, with the date columns, identify an observation
+SERIES_COLUMNS = ['site_no', 'parameter_cd', 'ts_id']
+
+# Rules for choosing between rows for the same observation
+#   latest:   rows from later pulls (and later in a pull) win
+#   approved: approved rows win over provisional ones
+PRECEDENCE = ['approved', 'latest']
+
+# Handling of sites with more than one time series (ts_id)
+#   keep:    keep every series
+#   longest: keep only the series with the most observations
+#   merge:   combine the series into the longest one; observations for the
+#            same date are resolved by the precedence rules
+TS_POLICIES = ['keep', 'longest', 'merge']
+
+
+def read_pulls(obsfiles):
+    """Read observation files from one or more pulls, oldest first.
+
+    The values are read as text so they are written back unchanged. All
+    files must have the same layout. Returns (freq, list of dataframes).
+    """
+    freqs = {obs_layout(ff)[0] for ff in obsfiles}
+    if len(freqs) != 1:
+        raise ValueError('The observation files do not have the same layout')
+
+    frames = [pd.read_csv(ff, sep='\t', dtype=str, keep_default_na=False) for ff in obsfiles]
+    return freqs.pop(), frames
+
+
+def provisional_mask(df):
+    # True for rows with a provisional (P) qualification code in any code column
+    mask = np.zeros(len(df), dtype=bool)
+    for cc in df.columns:
+        if RE_DV_CODE.match(cc):
+            mask |= (parse_codes(df[cc]) & QUALIFIER_BITS['P']) != 0
+    return mask
+
+
+def series_summary(df, freq):
+    """Observation count and first/last period of each (site_no, ts_id) series.
+
+    Periods repeated in overlapping pulls are counted once. Only sites with
+    more than one series are returned.
+    """
+    if 'ts_id' not in df.columns or len(df) == 0:
+        return pd.DataFrame(columns=['site_no', 'ts_id', 'count_nu', 'first_period', 'last_period'])
+
+    tmp = pd.DataFrame({'site_no': df['site_no'].to_numpy(),
+                        'ts_id': df['ts_id'].to_numpy(),
+                        'period': obs_periods(df, freq)})
+    summary = tmp.groupby(['site_no', 'ts_id'], sort=True)['period'].agg(['nunique', 'min', 'max']).reset_index()
+    summary.columns = ['site_no', 'ts_id', 'count_nu', 'first_period', 'last_period']
+
+    for cc in ['first_period', 'last_period']:
+        summary[cc] = summary[cc].to_numpy().astype(f'datetime64[{freq}]').astype(str)
+
+    nseries = summary.groupby('site_no')['ts_id'].transform('size')
+    return summary[nseries > 1].reset_index(drop=True)
+
+
+def _primary_series(df, periods):
+    # ts_id with the most observations for each site (ties go to the most recent series)
+    tmp = pd.DataFrame({'site_no': df['site_no'].to_numpy(),
+                        'ts_id': df['ts_id'].to_numpy(),
+                        'period': periods})
+    counts = tmp.groupby(['site_no', 'ts_id'], sort=False)['period'].agg(['nunique', 'max']).reset_index()
+    counts.sort_values(['site_no', 'nunique', 'max', 'ts_id'], inplace=True, kind='stable')
+    return counts.drop_duplicates('site_no', keep='last').set_index('site_no')['ts_id']
+
+
+def dedup_obs(frames, freq, precedence=PRECEDENCE, ts_policy='keep'):
+    """Combine observations from one or more pulls, keeping one row per observation.
+
+    frames are ordered from oldest to newest pull. Rows are matched on the
+    series (site_no and, when present, parameter_cd and ts_id) and date
+    columns; of the matching rows the one preferred by the precedence rules,
+    in order, is kept. The row order within the pulls breaks any remaining
+    ties, so by default the latest row wins. Sites with more than one ts_id
+    are handled according to ts_policy.
+
+    Returns (df, counts) where df is sorted by series and date and counts
+    has the number of rows read, kept, and dropped by the ts_id policy.
+    """
+    for pp in precedence:
+        if pp not in PRECEDENCE:
+            raise ValueError(f'precedence must be from {PRECEDENCE}')
+    if ts_policy not in TS_POLICIES:
+        raise ValueError(f'ts_policy must be one of {TS_POLICIES}')
+
+    df = pd.concat(frames, ignore_index=True)
+    pull = np.repeat(np.arange(len(frames)), [len(ff) for ff in frames])
+    periods = obs_periods(df, freq)
+    counts = {'rows': len(df), 'ts_dropped': 0}
+
+    if ts_policy != 'keep' and 'ts_id' in df.columns and len(df) > 0:
+        primary = _primary_series(df, periods)
+        is_primary = df['ts_id'].to_numpy() == primary.reindex(df['site_no']).to_numpy()
+
+        if ts_policy == 'longest':
+            counts['ts_dropped'] = int((~is_primary).sum())
+            df = df[is_primary].reset_index(drop=True)
+            pull = pull[is_primary]
+            periods = periods[is_primary]
+        else:
+            df['ts_id'] = primary.reindex(df['site_no']).to_numpy()
+
+    # Sort so the preferred row for each observation comes last
+    ranks = {'latest': pull, 'approved': ~provisional_mask(df)}
+    order = np.lexsort([np.arange(len(df))] + [ranks[pp] for pp in reversed(precedence)])
+
+    keys = [cc for cc in SERIES_COLUMNS if cc in df.columns]
+    df = df.iloc[order].reset_index(drop=True)
+    periods = periods[order]
+
+    dups = pd.DataFrame({cc: df[cc].to_numpy() for cc in keys}).assign(_period=periods).duplicated(keep='last')
+    df = df[~dups.to_numpy()]
+    periods = periods[~dups.to_numpy()]
+
+    order = np.lexsort([periods] + [pd.factorize(df[cc], sort=True)[0] for cc in reversed(keys)])
+    df = df.iloc[order].reset_index(drop=True)
+
+    if any(len(ff.columns) != len(df.columns) for ff in frames):
+        # Columns missing from some of the pulls
+        df.fillna('', inplace=True)
+
+    counts['kept'] = len(df)
+    return df, counts
+
+
+def dedup_files(obsfiles, outfile, precedence=PRECEDENCE, ts_policy='keep'):
+    # Deduplicate the observation files (oldest pull first) into outfile; returns the counts
+    freq, frames = read_pulls(obsfiles)
+    df, counts = dedup_obs(frames, freq, precedence=precedence, ts_policy=ts_policy)
+    df.to_csv(outfile, sep='\t', index=False)
+    return counts
@@ -0,0 +1,173 @@
+
+import threading
+import time
+import numpy as np
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+__author__ = 'Parker Norton (pnorton@usgs.gov)'
+
+# Number of times to first byte needed before requests are hedged
+MIN_SAMPLES = 20
+
+
+class RequestProgress:
+    """Progress of one copy of a hedged request.
+
+    The request function calls sent() when the request goes out (after any
+    rate-limiter and concurrency-limiter waits) and responded() when the
+    response headers arrive; ttfb is the time between the two (seconds).
+    """
+
+    def __init__(self):
+        self.sent_at = None
+        self.ttfb = None
+        self._sent = threading.Event()
+        self._responded = threading.Event()
+
+    def sent(self):
+        self.sent_at = time.monotonic()
+        self._sent.set()
+
+    def responded(self):
+        if self.sent_at is not None:
+            self.ttfb = time.monotonic() - self.sent_at
+        self._responded.set()
+
+    def _finished(self):
+        # Wake any waiters when the request function returns or raises
+        self._sent.set()
+        self._responded.set()
+
+    def wait_sent(self):
+        self._sent.wait()
+
+    def wait_response(self, timeout):
+        # Wait until timeout seconds after the request was sent; returns True
+        # when the response started (or the request finished) by then
+        if self.sent_at is None:
+            return self._responded.wait(timeout)
+        return self._responded.wait(max(self.sent_at + timeout - time.monotonic(), 0.0))
+
+
+class HedgePolicy:
+    """Send a duplicate of a slow request and use whichever copy finishes first.
+
+    A hedge is sent when a request has been sent but its response has not
+    started within the p95 of the last window times to first byte (never
+    sooner than min_delay seconds). The clock starts when the request goes
+    out, so time spent waiting for the rate limiter, the concurrency
+    limiter, or a worker thread does not trigger a hedge, nor does a long
+    transfer once the response has started. Hedges are limited to a budget
+    fraction of all requests: each request earns budget tokens, a hedge
+    spends one, and at most max_tokens can be saved up for a burst of slow
+    responses. The copy that loses is left to finish in the background and
+    its result is discarded.
+
+    The request function passed to call() takes a RequestProgress as its
+    first argument and reports on it when the request is sent and when the
+    response starts.
+
+    A hedge is an ordinary request: it waits for a rate-limiter token and
+    takes a concurrency slot like any other. When can_hedge is passed to
+    call() it is checked before a hedge is sent (e.g. whether a concurrency
+    slot is free) so that a hedge does not queue behind, or delay, requests
+    which have not started yet; hedges skipped this way spend no budget.
+
+    The counters requests, hedged, hedge_wins (the hedge finished first),
+    and skipped can be reported with summary().
+    """
+
+    def __init__(self, budget=0.05, min_delay=0.5, max_tokens=10.0, window=500, max_workers=64):
+        self.budget = budget
+        self.min_delay = min_delay
+        self.max_tokens = max_tokens
+        self.latencies = deque(maxlen=window)
+
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.skipped = 0
+
+        self._tokens = 0.0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hedge')
+
+    def _spend(self):
+        # Take a hedge token if one is available
+        with self._lock:
+            if self._tokens < 1.0:
+                return False
+            self._tokens -= 1.0
+            self.hedged += 1
+            return True
+
+    def p95(self):
+        # 95th percentile of the recent times to first byte (seconds)
+        with self._lock:
+            if len(self.latencies) < MIN_SAMPLES:
+                return None
+            return float(np.percentile(self.latencies, 95))
+
+    def _record(self, progress):
+        # Keep the time to first byte of each first attempt, including slow
+        # ones which were hedged
+        if progress.ttfb is not None:
+            with self._lock:
+                self.latencies.append(progress.ttfb)
+
+    def _submit(self, func, *args, **kwargs):
+        progress = RequestProgress()
+        fut = self._pool.submit(func, progress, *args, **kwargs)
+        fut.add_done_callback(lambda ff: progress._finished())
+        return fut, progress
+
+    def call(self, func, *args, can_hedge=None, **kwargs):
+        # Call func(progress, *args, **kwargs), hedging with a second call when
+        # its response has not started within the p95 time to first byte
+        # can_hedge: optional callable; no hedge is sent when it returns False
+        p95 = self.p95()
+
+        with self._lock:
+            self.requests += 1
+            self._tokens = min(self._tokens + self.budget, self.max_tokens)
+
+        primary, progress = self._submit(func, *args, **kwargs)
+        primary.add_done_callback(lambda fut: self._record(progress))
+
+        if p95 is None:
+            return primary.result()
+
+        progress.wait_sent()
+        if progress.wait_response(max(p95, self.min_delay)):
+            return primary.result()
+
+        if can_hedge is not None and not can_hedge():
+            with self._lock:
+                self.skipped += 1
+            return primary.result()
+
+        if not self._spend():
+            return primary.result()
+
+        hedge, _ = self._submit(func, *args, **kwargs)
+        pending = {primary, hedge}
+
+        while len(pending) > 0:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+            # Use the first copy that succeeded; an error is only raised
+            # when both copies failed
+            for fut in [ff for ff in (primary, hedge) if ff in done]:
+                if fut.exception() is None:
+                    if fut is hedge:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return fut.result()
+
+        return primary.result()
+
+    def summary(self):
+        return f'Hedged requests: {self.hedged} of {self.requests} (hedge finished first: {self.hedge_wins}, ' \
+            f'skipped without a free slot: {self.skipped})'
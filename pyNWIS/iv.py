@@ -0,0 +1,270 @@
+
+import os
+import re
+
+from collections import OrderedDict
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+
+from pyNWIS.nwis import NWIS
+from pyNWIS.pipeline import stream_sites
+from pyNWIS.qualifiers import parse_codes
+
+__author__ = 'Parker Norton (pnorton@usgs.gov)'
+
+# Value and code columns of NWIS iv RDB pages: <ts_id>_<parameter>[_cd]
+RE_IV_HEADER = re.compile(r'^(?:(\d+)_)?(\d{5})(_cd)?$')
+
+# UTC offsets (hours) of the time zone codes in the tz_cd column of iv pages
+TZ_OFFSETS = {'UTC': 0, 'GMT': 0,
+              'AST': -4, 'ADT': -3,
+              'EST': -5, 'EDT': -4,
+              'CST': -6, 'CDT': -5,
+              'MST': -7, 'MDT': -6,
+              'PST': -8, 'PDT': -7,
+              'AKST': -9, 'AKDT': -8,
+              'HST': -10, 'HDT': -9,
+              'SST': -11, 'ChST': 10, 'GST': 10}
+
+
+def month_chunks(stdate, endate, months=1):
+    """Split stdate thru endate (YYYY-MM-DD) into chunks of whole calendar months.
+
+    The first and last chunks are clipped to the date range. Returns a list of
+    (start, end) date strings; end is the last day of the chunk.
+    """
+    st = np.datetime64(stdate, 'D')
+    en = np.datetime64(endate, 'D')
+
+    chunks = []
+    mm = st.astype('datetime64[M]')
+    while mm <= en.astype('datetime64[M]'):
+        nxt = mm + months
+        chunks.append((str(max(st, mm.astype('datetime64[D]'))),
+                       str(min(en, nxt.astype('datetime64[D]') - 1))))
+        mm = nxt
+    return chunks
+
+
+def utc_times(datetimes, tz_codes):
+    # Convert local date/times (YYYY-MM-DD HH:MM) and their time zone codes
+    # to UTC datetime64[s]. There are only a few distinct time zone codes so
+    # the offsets are looked up once per code.
+    local = pd.to_datetime(datetimes, format='%Y-%m-%d %H:%M').to_numpy().astype('datetime64[s]')
+
+    labels, uniq = pd.factorize(pd.Series(tz_codes))
+    for tz in uniq:
+        if tz not in TZ_OFFSETS:
+            raise ValueError(f'Unknown time zone code: {tz}')
+    offsets = np.array([TZ_OFFSETS[tz] * 3600 for tz in uniq] + [0], dtype=np.int64)
+
+    return local - offsets[labels].astype('timedelta64[s]')
+
+
+def parse_iv(page, parameters):
+    """Parse an NWIS iv RDB page into arrays for storage.
+
+    Returns an OrderedDict with time (UTC datetime64[s]), month (the local
+    calendar month of each value) and, for each parameter, the values
+    (float32) and <parameter>_cd qualification-code flags (see
+    pyNWIS.qualifiers). Non-numeric values (e.g. Ice or Eqp) are stored as
+    NaN with their code added to the flags. When a site has more than one
+    TS_ID for a parameter only the first is used. Returns None when the page
+    has no data.
+    """
+    if len(page.strip()) == 0:
+        return None
+
+    header = page.split('\n', 1)[0].rstrip('\r').split('\t')
+
+    # First value and code column for each parameter
+    usecols = {}
+    for name in header:
+        mm = RE_IV_HEADER.match(name)
+        if mm is not None and mm.group(2) in parameters:
+            usecols.setdefault(f'{mm.group(2)}{mm.group(3) or ""}', name)
+
+    df = pd.read_csv(StringIO(page), sep='\t', usecols=['datetime', 'tz_cd'] + list(usecols.values()),
+                     dtype=str, keep_default_na=False)
+
+    arrays = OrderedDict()
+    arrays['time'] = utc_times(df['datetime'], df['tz_cd'])
+    arrays['month'] = df['datetime'].str.slice(0, 7).to_numpy(dtype='U7')
+
+    for pp in parameters:
+        if pp not in usecols:
+            arrays[pp] = np.full(len(df), np.nan, dtype=np.float32)
+            arrays[f'{pp}_cd'] = np.zeros(len(df), dtype=np.uint32)
+            continue
+
+        raw = df[usecols[pp]]
+        values = pd.to_numeric(raw, errors='coerce')
+        if f'{pp}_cd' in usecols:
+            flags = parse_codes(df[usecols[f'{pp}_cd']])
+        else:
+            flags = np.zeros(len(df), dtype=np.uint32)
+
+        # Codes given in place of a value
+        text = raw.where(values.isna(), '')
+        if (text != '').any():
+            flags |= parse_codes(text)
+
+        arrays[pp] = values.to_numpy(np.float32)
+        arrays[f'{pp}_cd'] = flags
+    return arrays
+
+
+class IVStore:
+    """Compressed columnar store of instantaneous values.
+
+    Values are partitioned by site and local calendar month; each partition
+    is a compressed numpy archive (root/<site_no>/<YYYY-MM>.npz) with the
+    UTC times, the values and qualification-code flags of each parameter,
+    and the last day requested for the partition. Partitions are replaced
+    atomically so an interrupted download leaves no partial files.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, site, month):
+        return os.path.join(self.root, site, f'{month}.npz')
+
+    def sites(self):
+        return sorted(dd for dd in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, dd)))
+
+    def months(self, site):
+        sitedir = os.path.join(self.root, site)
+        if not os.path.isdir(sitedir):
+            return []
+        return sorted(ff[:-4] for ff in os.listdir(sitedir) if ff.endswith('.npz'))
+
+    def covered(self, site, start, end):
+        # True when every month of start thru end (YYYY-MM-DD) is stored
+        # through at least end
+        for mm in np.arange(np.datetime64(start, 'M'), np.datetime64(end, 'M') + 1):
+            month_end = min(np.datetime64(end, 'D'), (mm + 1).astype('datetime64[D]') - 1)
+            path = self.path(site, str(mm))
+            if not os.path.isfile(path):
+                return False
+            with np.load(path) as part:
+                if part['end'] < month_end.astype(np.int64):
+                    return False
+        return True
+
+    def write_chunk(self, site, arrays, start, end):
+        """Write the values of one downloaded chunk (from parse_iv) to the store.
+
+        Every month of start thru end gets a partition, which is empty when
+        there were no values for the month. When arrays is None (nothing was
+        returned) existing partitions are left alone. Returns the number of
+        values stored.
+        """
+        os.makedirs(os.path.join(self.root, site), exist_ok=True)
+
+        nrows = 0
+        for mm in np.arange(np.datetime64(start, 'M'), np.datetime64(end, 'M') + 1):
+            month = str(mm)
+            month_end = min(np.datetime64(end, 'D'), (mm + 1).astype('datetime64[D]') - 1)
+
+            path = self.path(site, month)
+
+            part = OrderedDict()
+            if arrays is None:
+                if os.path.isfile(path):
+                    continue
+                part['time'] = np.array([], dtype='datetime64[s]')
+            else:
+                sel = arrays['month'] == month
+                for kk, vv in arrays.items():
+                    if kk != 'month':
+                        part[kk] = vv[sel]
+            part['end'] = month_end.astype(np.int64)
+            nrows += len(part['time'])
+
+            with open(f'{path}.tmp', 'wb') as fhdl:
+                np.savez_compressed(fhdl, **part)
+            os.replace(f'{path}.tmp', path)
+        return nrows
+
+    def read(self, site, start=None, end=None):
+        """Read the stored values for a site into a dataframe.
+
+        start and end (YYYY-MM-DD) limit the local calendar months which are
+        read. The dataframe has a UTC datetime column followed by the value
+        and flag columns of each parameter.
+        """
+        parts = []
+        for month in self.months(site):
+            if start is not None and month < start[0:7]:
+                continue
+            if end is not None and month > end[0:7]:
+                continue
+
+            with np.load(self.path(site, month)) as part:
+                parts.append(pd.DataFrame({kk: part[kk] for kk in part.files if kk != 'end'}))
+
+        if len(parts) == 0:
+            return pd.DataFrame(columns=['datetime'])
+
+        return pd.concat(parts, ignore_index=True).rename(columns={'time': 'datetime'})
+
+
+class InstantaneousValues(NWIS):
+    """Download instantaneous (e.g. 15-minute) values from the NWIS iv service.
+
+    Each site's date range is split into chunks of whole calendar months
+    which are requested in parallel. Every chunk is parsed and written to an
+    IVStore as soon as it arrives, so memory use is bounded by the number of
+    chunks in flight rather than the length of the record. Other keyword
+    arguments are passed to NWIS.
+    """
+
+    def __init__(self, parameters=('00060',), months=1, show_restricted=False, **kwargs):
+        super().__init__(**kwargs)
+        self.parameters = list(parameters)
+        self.months = months
+        self.show_restricted = show_restricted
+
+    def chunk_url(self, site, start, end):
+        url_pieces = OrderedDict()
+        url_pieces['format'] = 'rdb'
+        url_pieces['sites'] = site
+        url_pieces['startDT'] = start
+        url_pieces['endDT'] = end
+        url_pieces['parameterCd'] = ','.join(self.parameters)
+        if self.show_restricted:
+            url_pieces['access'] = 3
+
+        url_final = '&'.join([f'{kk}={vv}' for kk, vv in url_pieces.items()])
+        return f'{self.base_url}/iv/?{url_final}'
+
+    def get_chunk(self, site, start, end):
+        # Download and parse the values for one site and chunk
+        return parse_iv(self.get_rdb_page(self.chunk_url(site, start, end)), self.parameters)
+
+    def download(self, sites, stdate, endate, store, max_workers=None, resume=False):
+        """Download the values for sites from stdate thru endate into store.
+
+        Yields (site, start, end, nrows) as each chunk is stored; nrows is
+        None for chunks skipped because they are already in the store (when
+        resume is True). Chunks which NWIS reports as not found have no values.
+        """
+        chunks = month_chunks(stdate, endate, self.months)
+
+        tasks = []
+        for site in sites:
+            for start, end in chunks:
+                if resume and store.covered(site, start, end):
+                    yield site, start, end, None
+                    continue
+                tasks.append((site, start, end))
+
+        for (site, start, end), arrays in stream_sites(tasks, lambda task: self.get_chunk(*task),
+                                                        max_workers=max_workers):
+            # Chunks without values (or not found) still get empty partitions
+            # so a resumed download does not request them again
+            yield site, start, end, store.write_chunk(site, arrays, start, end)
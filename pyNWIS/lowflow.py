@@ -0,0 +1,175 @@
+
+import numpy as np
+import pandas as pd
+
+from pyNWIS.calendars import shifted_year, shifted_year_start
+from pyNWIS.ragged import RaggedSeries
+from pyNWIS.windows import rolling_mean
+
+__author__ = 'Parker Norton (pnorton@usgs.gov)'
+
+# Exceedance probabilities (percent) reported for flow-duration curves
+DURATION_PCTS = [1, 5, 10, 20, 25, 30, 40, 50, 60, 70, 75, 80, 90, 95, 99]
+
+
+def annual_minimums(series, values, year_start_month=4, min_days=None):
+    """Annual minimum of values (aligned with series.values) for every site.
+
+    Years begin on the first day of year_start_month; the default of April
+    gives the climatic year used for low-flow statistics. A year is only
+    used when at least min_days values are present (default: all days in
+    the year). Returns a dataframe with site_no, year_nu and min_va where
+    year_nu is the calendar year in which the climatic year ends.
+    """
+    sid = series.segment_ids()
+    days = (series.start[sid] + np.arange(len(values)) - series.offsets[:-1][sid]).astype('datetime64[D]')
+    year = shifted_year(days, year_start_month)
+
+    year_start = shifted_year_start(year, year_start_month)
+    year_days = (shifted_year_start(year + 1, year_start_month) - year_start).astype(np.int64)
+
+    # Values are already sorted by site and day so segments are contiguous
+    new_seg = np.ones(len(values), dtype=bool)
+    new_seg[1:] = (sid[1:] != sid[:-1]) | (year[1:] != year[:-1])
+    seg = np.flatnonzero(new_seg)
+
+    if len(seg) == 0:
+        return pd.DataFrame(columns=['site_no', 'year_nu', 'min_va'])
+
+    valid = ~np.isnan(values)
+    minval = np.fmin.reduceat(values, seg)
+    count = np.add.reduceat(valid.astype(np.int64), seg)
+
+    needed = year_days[seg] if min_days is None else min_days
+    keep = count >= needed
+
+    return pd.DataFrame({'site_no': series.sites[sid[seg][keep]],
+                         'year_nu': year[seg][keep],
+                         'min_va': minval[keep]})
+
+
+def lp3_quantile(annual_min, nonexceedance):
+    """Log-Pearson type III quantile of each site's annual minimum series.
+
+    annual_min is a dataframe from annual_minimums(). The frequency factor
+    uses the Wilson-Hilferty approximation; sites with zero flows or fewer
+    than 10 years return NaN.
+    """
+    z = _norm_ppf(nonexceedance)
+
+    df = annual_min[['site_no', 'min_va']].copy()
+    df['logq'] = np.log10(df['min_va'].where(df['min_va'] > 0))
+    grp = df.groupby('site_no', sort=True)
+
+    nn = grp['logq'].count()
+    mean = grp['logq'].mean()
+    std = grp['logq'].std()
+    skew = grp['logq'].skew().fillna(0.0)
+    has_zero = grp['min_va'].min() <= 0
+
+    gg = skew.to_numpy()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        kk = np.where(np.abs(gg) < 1e-6, z,
+                      (2.0 / gg) * ((1.0 + gg * z / 6.0 - gg**2 / 36.0)**3 - 1.0))
+
+    qq = 10.0**(mean + kk * std)
+    qq[(nn < 10) | has_zero] = np.nan
+    return qq
+
+
+def _norm_ppf(prob):
+    # Inverse of the standard normal CDF (Acklam's rational approximation)
+    aa = [-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02,
+          1.383577518672690e+02, -3.066479806614716e+01, 2.506628277459239e+00]
+    bb = [-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02,
+          6.680131188771972e+01, -1.328068155288572e+01]
+    cc = [-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00,
+          -2.549732539343734e+00, 4.374664141464968e+00, 2.938163982698783e+00]
+    dd = [7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00,
+          3.754408661907416e+00]
+
+    if prob < 0.02425:
+        qq = np.sqrt(-2.0 * np.log(prob))
+        return (((((cc[0]*qq + cc[1])*qq + cc[2])*qq + cc[3])*qq + cc[4])*qq + cc[5]) / \
+               ((((dd[0]*qq + dd[1])*qq + dd[2])*qq + dd[3])*qq + 1.0)
+    if prob > 1.0 - 0.02425:
+        return -_norm_ppf(1.0 - prob)
+
+    qq = prob - 0.5
+    rr = qq * qq
+    return (((((aa[0]*rr + aa[1])*rr + aa[2])*rr + aa[3])*rr + aa[4])*rr + aa[5])*qq / \
+           (((((bb[0]*rr + bb[1])*rr + bb[2])*rr + bb[3])*rr + bb[4])*rr + 1.0)
+
+
+def flow_duration(series, pcts=DURATION_PCTS):
+    """Flow-duration percentiles for every site of a RaggedSeries.
+
+    pcts are exceedance probabilities in percent; the flow exceeded pct
+    percent of the time is the (100 - pct) percentile of the site's values.
+    All sites are sorted together in one pass. Returns a dataframe indexed
+    by site_no with one column per exceedance probability (e.g. 'Q95').
+    """
+    values = series.values
+    sid = series.segment_ids()
+    valid = ~np.isnan(values)
+
+    sid = sid[valid]
+    values = values[valid]
+
+    # Sort by site and then value
+    order = np.lexsort((values, sid))
+    values = values[order]
+
+    nn = np.bincount(sid, minlength=len(series))
+    offsets = np.zeros(len(series) + 1, dtype=np.int64)
+    np.cumsum(nn, out=offsets[1:])
+
+    result = {}
+    for pp in pcts:
+        # Linear interpolation between order statistics (numpy default)
+        pos = (nn - 1) * (100.0 - pp) / 100.0
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.minimum(lo + 1, np.maximum(nn - 1, 0))
+        frac = pos - lo
+
+        has_data = nn > 0
+        qq = np.full(len(series), np.nan)
+        base = offsets[:-1][has_data]
+        qq[has_data] = values[base + lo[has_data]] * (1.0 - frac[has_data]) + \
+            values[base + hi[has_data]] * frac[has_data]
+        result[f'Q{pp}'] = qq
+
+    return pd.DataFrame(result, index=pd.Index(series.sites, name='site_no'))
+
+
+def lowflow_statistics(series, ndays=7, recurrence=10, year_start_month=4, pcts=DURATION_PCTS):
+    """Low-flow and flow-duration statistics for every site of a daily RaggedSeries.
+
+    Returns a dataframe indexed by site_no with the number of complete
+    climatic years, the minimum and mean annual ndays-day low flow, the
+    ndays-day, recurrence-year low flow (e.g. 7Q10) and the flow-duration
+    percentiles.
+    """
+    # N-day means need a value for every day in the window
+    nday = rolling_mean(series, ndays)
+
+    # Only climatic years with an N-day mean for every day are used
+    annual = annual_minimums(series, nday, year_start_month=year_start_month)
+
+    grp = annual.groupby('site_no', sort=True)
+    label = f'{ndays}Q{recurrence}'
+
+    stats = pd.DataFrame({'n_years': grp['min_va'].count(),
+                          f'min_{ndays}day': grp['min_va'].min(),
+                          f'mean_{ndays}day': grp['min_va'].mean()})
+    stats[label] = lp3_quantile(annual, 1.0 / recurrence)
+
+    stats = stats.reindex(pd.Index(series.sites, name='site_no'))
+    stats['n_years'] = stats['n_years'].fillna(0).astype(np.int64)
+
+    return stats.join(flow_duration(series, pcts=pcts))
+
+
+def daily_series(df, value_col, site_col='site_no', date_col='datetime'):
+    # Build a daily RaggedSeries from a dataframe of daily values
+    return RaggedSeries.from_frame(df, value_col, site_col=site_col, date_col=date_col, freq='D')
@@ -0,0 +1,209 @@
+
+import bisect
+import json
+import logging
+import socket
+import threading
+import time
+
+from collections import Counter
+from http.client import HTTPConnection, HTTPSConnection
+from urllib.request import HTTPHandler, HTTPSHandler, build_opener
+
+__author__ = 'Parker Norton (pnorton@usgs.gov)'
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float('inf')]
+
+# Request phases with latency histograms
+PHASES = ['dns', 'connect', 'ttfb', 'transfer', 'total']
+
+logger = logging.getLogger(__name__)
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Connections which time each phase of a request. The timings are attached to
+# the response as response.timing: dns (name lookup), connect (TCP connect
+# plus TLS handshake) and ttfb (request sent until the response headers
+# arrived), all in seconds. Reused connections have no dns/connect times.
+class _TimedConnection:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timing = {}
+        self._create_connection = self._timed_create_connection
+
+    def _timed_create_connection(self, address, timeout=None, source_address=None):
+        host, port = address
+
+        t0 = time.perf_counter()
+        addrinfo = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        self.timing['dns'] = time.perf_counter() - t0
+
+        err = None
+        for family, socktype, proto, _, sockaddr in addrinfo:
+            try:
+                return socket.create_connection(sockaddr[:2], timeout, source_address)
+            except OSError as exc:
+                err = exc
+        raise err if err is not None else OSError(f'getaddrinfo returned no addresses for {host}')
+
+    def connect(self):
+        t0 = time.perf_counter()
+        super().connect()
+        self.timing['connect'] = time.perf_counter() - t0 - self.timing.get('dns', 0.0)
+
+    def request(self, *args, **kwargs):
+        self._request_start = time.perf_counter()
+        super().request(*args, **kwargs)
+
+    def getresponse(self):
+        response = super().getresponse()
+        self.timing['ttfb'] = time.perf_counter() - self._request_start - self.timing.get('connect', 0.0) - \
+            self.timing.get('dns', 0.0)
+        response.timing = self.timing
+        return response
+
+
+class TimedHTTPConnection(_TimedConnection, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(_TimedConnection, HTTPSConnection):
+    pass
+
+
+class TimedHTTPHandler(HTTPHandler):
+    def do_open(self, http_class, req, **http_conn_args):
+        return super().do_open(TimedHTTPConnection, req, **http_conn_args)
+
+
+class TimedHTTPSHandler(HTTPSHandler):
+    def do_open(self, http_class, req, **http_conn_args):
+        return super().do_open(TimedHTTPSConnection, req, **http_conn_args)
+
+
+def timed_opener():
+    # URL opener whose responses carry per-phase timings
+    return build_opener(TimedHTTPHandler, TimedHTTPSHandler)
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+class Histogram:
+    """Fixed-bucket histogram of latencies (seconds)."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = list(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, qq):
+        # Upper bound of the bucket containing the qq quantile
+        if self.count == 0:
+            return None
+
+        target = qq * self.count
+        total = 0
+        for bound, cnt in zip(self.buckets, self.counts):
+            total += cnt
+            if total >= target:
+                return bound
+        return self.buckets[-1]
+
+    def to_dict(self):
+        return {'buckets': [str(bb) for bb in self.buckets],
+                'counts': list(self.counts),
+                'count': self.count,
+                'sum': self.sum}
+
+
+class RequestMetrics:
+    """Collect per-request records from the NWIS request layer.
+
+    Each record is a dict with url, service, status, bytes, attempts,
+    retries, cache ('hit' when the request joined an identical request
+    already in flight, otherwise 'miss'), the dns, connect, ttfb, transfer
+    and total times (seconds; total includes retries and waits), and error
+    for failed requests. Records update the counters and phase histograms
+    and are passed to every hook, e.g. json_lines_hook(); exceptions raised
+    by a hook are logged and otherwise ignored.
+    """
+
+    def __init__(self):
+        self.counters = Counter()
+        self.histograms = {pp: Histogram() for pp in PHASES}
+        self.hooks = []
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook):
+        # hook(record) is called for every request
+        self.hooks.append(hook)
+
+    def record(self, rec):
+        with self._lock:
+            self.counters['requests'] += 1
+            self.counters[f'status_{rec["status"]}'] += 1
+            self.counters['bytes'] += rec.get('bytes') or 0
+            self.counters['retries'] += rec.get('retries') or 0
+            self.counters[f'cache_{rec.get("cache", "miss")}'] += 1
+            self.counters[f'service_{rec.get("service")}'] += 1
+
+            for pp in PHASES:
+                if rec.get(pp) is not None:
+                    self.histograms[pp].observe(rec[pp])
+
+        # A failing hook (e.g. a closed metrics file) must not fail the request
+        for hook in self.hooks:
+            try:
+                hook(rec)
+            except Exception:
+                logger.exception(f'Request metrics hook {hook!r} failed')
+
+    def to_dict(self):
+        with self._lock:
+            return {'counters': dict(self.counters),
+                    'histograms': {pp: hh.to_dict() for pp, hh in self.histograms.items()}}
+
+    def summary(self):
+        # Lines summarizing the requests for a log file
+        with self._lock:
+            cnt = self.counters
+            lines = [f'Requests: {cnt["requests"]} (retries: {cnt["retries"]}, '
+                     f'shared in-flight: {cnt["cache_hit"]}), {cnt["bytes"] / 2**20:.2f} MB',
+                     'Status: ' + ', '.join(f'{kk[7:]}={vv}' for kk, vv in sorted(cnt.items())
+                                            if kk.startswith('status_'))]
+
+            for pp in PHASES:
+                hh = self.histograms[pp]
+                if hh.count > 0:
+                    lines.append(f'{pp:>8s}: n={hh.count} mean={hh.sum / hh.count:.3f} s '
+                                 f'p50<={hh.quantile(0.5)} s p95<={hh.quantile(0.95)} s')
+        return lines
+
+
+def json_lines_hook(fhdl):
+    # Hook which writes each request record as a JSON line to an open file
+    lock = threading.Lock()
+
+    def hook(rec):
+        line = json.dumps(rec, default=str)
+        with lock:
+            fhdl.write(line + '\n')
+            fhdl.flush()
+    return hook
+
+
+def logging_hook(logger, level=20):
+    # Hook which logs each request record as JSON (default level INFO)
+    def hook(rec):
+        logger.log(level, json.dumps(rec, default=str))
+    return hook
+
+
+# Shared by all NWIS services
+DEFAULT_METRICS = RequestMetrics()
@@ -1,21 +1,132 @@
 
+import asyncio
+import logging
+import random
 import re
+import time
+import pandas as pd
 
-from urllib.request import urlopen, Request
-from urllib.error import HTTPError
+from email.utils import parsedate_to_datetime
+from http.client import IncompleteRead
+from io import StringIO
+from urllib.parse import urlsplit
+from urllib.error import HTTPError, URLError
+
+from pyNWIS.concurrency import DEFAULT_CONCURRENCY
+from pyNWIS.metrics import DEFAULT_METRICS, timed_opener
+from pyNWIS.obsfiles import obs_dtypes
+from pyNWIS.ratelimit import DEFAULT_RATE_LIMITER
+from pyNWIS.singleflight import ASYNC_EXECUTOR, DEFAULT_SINGLE_FLIGHT
 
 __author__ = 'Parker Norton (pnorton@usgs.gov)'
 
 # URLs can be generated/tested at: http://waterservices.usgs.gov/rest/Site-Test-Tool.html
-BASE_URL = 'http://waterservices.usgs.gov/nwis'
+BASE_URL = 'https://waterservices.usgs.gov/nwis'
 
 RE_COMMENTS = re.compile('^#.*$\n?', re.MULTILINE)   # remove comment lines
 RE_FLD_LENGTH = re.compile('^5s.*$\n?', re.MULTILINE)  # remove field length lines
 
+# HTTP status codes which indicate a transient problem on the server side
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+logger = logging.getLogger(__name__)
+
+
+class RetryPolicy:
+    """Retry transient request failures with capped exponential backoff.
+
+    Server errors (5xx), throttling (429), connection resets and timeouts
+    are retried until max_attempts requests have been made. Before each
+    retry the policy sleeps a random time between zero and
+    min(max_delay, base_delay * 2**n) so concurrent downloads do not retry
+    in lock step; a Retry-After header from the server takes precedence,
+    but is also capped at max_delay.
+    Other errors, including 404 (no sites match the request), are raised
+    immediately.
+    """
+
+    def __init__(self, max_attempts=5, base_delay=1.0, max_delay=60.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @staticmethod
+    def retryable(err):
+        # True if the error is transient and the request should be retried
+        if isinstance(err, HTTPError):
+            return err.code in RETRY_STATUS or err.code >= 500
+        if isinstance(err, URLError):
+            return isinstance(err.reason, (TimeoutError, ConnectionError))
+        return isinstance(err, (TimeoutError, ConnectionError, IncompleteRead))
+
+    @staticmethod
+    def retry_after(err):
+        # Seconds to wait as requested by the server's Retry-After header (or None)
+        if not isinstance(err, HTTPError) or err.headers is None:
+            return None
+
+        value = err.headers.get('Retry-After')
+        if value is None:
+            return None
+
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            pass
+
+        try:
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+        except (TypeError, ValueError):
+            return None
+
+    def delay(self, attempt, err=None):
+        # Seconds to sleep before retry number attempt (starting at 0)
+        requested = self.retry_after(err)
+        if requested is not None:
+            return min(requested, self.max_delay)
+        return random.uniform(0.0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def call(self, func, *args, info=None, **kwargs):
+        # Call func, retrying on transient errors
+        # info: optional dict; info['retries'] is set to the number of retries made
+        attempt = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as err:
+                if attempt + 1 >= self.max_attempts or not self.retryable(err):
+                    raise
+
+                wait = self.delay(attempt, err)
+                logger.warning(f'{err}; retrying in {wait:.1f} s ({attempt + 1} of {self.max_attempts - 1})')
+                time.sleep(wait)
+                attempt += 1
+                if info is not None:
+                    info['retries'] = attempt
+
 
 class NWIS:
-    def __init__(self):
-        pass
+    def __init__(self, retry=None, timeout=60, concurrency=None, rate_limiter=None, hedge=None, base_url=None,
+                 metrics=None):
+        # base_url: root of the NWIS services (e.g. a local test server); default is BASE_URL
+        self.base_url = BASE_URL if base_url is None else base_url.rstrip('/')
+
+        # retry: RetryPolicy used for all requests; timeout: socket timeout in seconds
+        # concurrency: AdaptiveConcurrency limiting in-flight requests (shared by default)
+        # rate_limiter: RateLimiter for requests and bytes per second (configured
+        #               from the PYNWIS_MAX_RPS/PYNWIS_MAX_BPS environment by default)
+        self.retry = RetryPolicy() if retry is None else retry
+        self.timeout = timeout
+        self.concurrency = DEFAULT_CONCURRENCY if concurrency is None else concurrency
+        self.rate_limiter = DEFAULT_RATE_LIMITER if rate_limiter is None else rate_limiter
+        # hedge: optional HedgePolicy for duplicating requests whose response has not
+        #        started within the p95 time to first byte
+        self.hedge = hedge
+        # Identical requests in flight at the same time share one download
+        self.flight = DEFAULT_SINGLE_FLIGHT
+        # metrics: RequestMetrics receiving a record for every request (shared by default)
+        self.metrics = DEFAULT_METRICS if metrics is None else metrics
+        self.opener = timed_opener()
 
     @staticmethod
     def strip_comments(txt):
@@ -29,12 +140,65 @@ class NWIS:
 
     def get_page(self, url, comments=True, fld_lengths=True):
         # Get a response from NWIS for the given url.
-        # By default the returned page is stripped of comments and field-length lines
+        # By default the returned page is stripped of comments and field-length lines.
+        # Transient errors are retried according to the retry policy and
+        # identical requests already in flight are joined rather than repeated.
+        start = time.perf_counter()
+        info = {}
+        try:
+            returned_page = self.flight.do(url, self._retry_request, url, info)
+        except Exception as err:
+            self._record(url, start, info, err=err)
+            raise
+
+        self._record(url, start, info, returned_page)
+        return self._strip_page(returned_page, comments, fld_lengths)
+
+    async def get_page_async(self, url, comments=True, fld_lengths=True):
+        # Asyncio version of get_page; the request is made on a worker thread
+        # and coalesced with identical requests from threads or other tasks.
+        start = time.perf_counter()
+        info = {}
+        fut = self.flight.submit(url, ASYNC_EXECUTOR, self._retry_request, url, info)
+        try:
+            returned_page = await asyncio.wrap_future(fut)
+        except Exception as err:
+            self._record(url, start, info, err=err)
+            raise
+
+        self._record(url, start, info, returned_page)
+        return self._strip_page(returned_page, comments, fld_lengths)
+
+    def _retry_request(self, url, info):
+        # Only the caller that makes the request fills in info; callers that
+        # joined an identical request in flight are recorded as cache hits.
+        info['cache'] = 'miss'
+        return self.retry.call(self._request, url, info, info=info)
 
-        response = urlopen(url)
-        encoding = response.info().get_param('charset', failobj='utf8')
-        returned_page = response.read().decode(encoding)
+    def _record(self, url, start, info, returned_page=None, err=None):
+        # Pass a record of the request to the metrics collector
+        rec = {'time': time.time(),
+               'url': url,
+               'service': urlsplit(url).path.rstrip('/').rsplit('/', 1)[-1],
+               'cache': info.get('cache', 'hit'),
+               'attempts': info.get('attempts', 0),
+               'retries': info.get('retries', 0),
+               'total': time.perf_counter() - start}
 
+        if err is None:
+            rec['status'] = info.get('status', 200)
+            rec['bytes'] = info.get('bytes', len(returned_page))
+        else:
+            rec['status'] = err.code if isinstance(err, HTTPError) else type(err).__name__
+            rec['bytes'] = info.get('bytes', 0)
+            rec['error'] = str(err)
+
+        if rec['cache'] == 'miss':
+            for kk in ['dns', 'connect', 'ttfb', 'transfer']:
+                rec[kk] = info.get(kk)
+        self.metrics.record(rec)
+
+    def _strip_page(self, returned_page, comments, fld_lengths):
         if comments:
             # Strip the comment lines and field length lines from the result
             returned_page = self.strip_comments(returned_page)
@@ -43,3 +207,83 @@ class NWIS:
             returned_page = self.strip_fld_lengths(returned_page)
 
         return returned_page
+
+    def _request(self, url, info):
+        # Fetch the url, hedging slow requests when a hedge policy is set
+        if self.hedge is None:
+            return self._fetch(url, info)
+
+        # Each copy of a hedged request fills in its own dict (a losing copy
+        # may still be running); info gets the response details of the copy
+        # whose result or error is used, and every copy counts as an attempt.
+        copies = []
+
+        def fetch_copy(progress):
+            copy_info = {}
+            copies.append(copy_info)
+            try:
+                return self._fetch(url, copy_info, progress=progress), copy_info
+            except Exception as err:
+                copy_info['error'] = err
+                raise
+
+        used = {}
+        try:
+            content, used = self.hedge.call(fetch_copy, can_hedge=lambda: self.concurrency.available() > 0)
+        except Exception as err:
+            used = next((cc for cc in copies if cc.get('error') is err), {})
+            raise
+        finally:
+            attempts = info.get('attempts', 0) + len(copies)
+            info.update({kk: vv for kk, vv in used.items() if kk != 'error'}, attempts=attempts)
+        return content
+
+    def _fetch(self, url, info, progress=None):
+        # Make a single request and decode the response. The request waits for
+        # the rate limiter and then for a slot from the concurrency limiter;
+        # transient errors are reported back to the latter as signs of an
+        # overloaded server.
+        # info is updated with the attempt count and the status, size and
+        # phase timings of the latest response.
+        # progress: optional hedging.RequestProgress told when the request is
+        # sent (after the limiter waits) and when the response starts.
+        self.rate_limiter.acquire()
+
+        start = self.concurrency.acquire()
+        info['attempts'] = info.get('attempts', 0) + 1
+        ok = True
+        if progress is not None:
+            progress.sent()
+        try:
+            with self.opener.open(url, timeout=self.timeout) as response:
+                if progress is not None:
+                    progress.responded()
+                t0 = time.perf_counter()
+                encoding = response.info().get_param('charset', failobj='utf8')
+                content = response.read()
+                info.update(getattr(response, 'timing', {}), status=response.status, bytes=len(content),
+                            transfer=time.perf_counter() - t0)
+            self.rate_limiter.consume(len(content))
+            return content.decode(encoding)
+        except Exception as err:
+            if isinstance(err, HTTPError):
+                info.update(getattr(err.fp, 'timing', {}), status=err.code)
+            ok = not self.retry.retryable(err)
+            raise
+        finally:
+            self.concurrency.release(start, ok=ok)
+
+    def get_rdb_page(self, url):
+        # Get an RDB-formatted response with the comment and field-length lines removed
+        return RE_FLD_LENGTH.sub('', self.get_page(url, fld_lengths=False), 0)
+
+    def get_rdb(self, url):
+        # Get an RDB-formatted response from NWIS for the given url and read
+        # it into a dataframe using compact dtypes.
+        returned_page = self.get_rdb_page(url)
+
+        if len(returned_page.strip()) == 0:
+            return pd.DataFrame()
+
+        header = returned_page.split('\n', 1)[0].rstrip('\r').split('\t')
+        return pd.read_csv(StringIO(returned_page), sep='\t', dtype=obs_dtypes(header))
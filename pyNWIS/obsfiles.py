@@ -0,0 +1,226 @@
+
+import re
+
+from collections import OrderedDict
+from operator import itemgetter
+
+import numpy as np
+import pandas as pd
+
+__author__ = 'Parker Norton (pnorton@usgs.gov)'
+
+RE_DV_VALUE = re.compile(r'^(?:\d+_)?\d{5}_\d{5}$')   # daily value columns, e.g. 00060_00003
+RE_DV_CODE = re.compile(r'^(?:\d+_)?\d{5}_\d{5}_cd$')   # daily value qualification codes
+
+# Value and code columns of NWIS dv RDB pages: <ts_id>_<parameter>_<statistic>[_cd]
+RE_DV_HEADER = re.compile(r'^(?:(\d+)_)?(\d{5})_(\d{5})(_cd)?$')
+
+# Default streamgage information columns used by the trend scripts
+STN_COLUMNS = ['site_no', 'station_nm', 'dec_lat_va', 'dec_long_va',
+               'drain_area_va', 'contrib_drain_area_va']
+
+# Compact dtypes for the columns found in NWIS site, dv, and stat files
+OBS_DTYPES = {'agency_cd': 'category',
+              'site_no': 'category',
+              'parameter_cd': 'category',
+              'ts_id': np.int32,
+              'loc_web_ds': 'category',
+              'year_nu': np.int16,
+              'month_nu': np.int16,
+              'day_nu': np.int16,
+              'mean_va': np.float32}
+
+# Columns which define the date of an observation for each file layout
+DATE_COLUMNS = {'D': ['datetime'], 'M': ['year_nu', 'month_nu'], 'Y': ['year_nu']}
+
+
+def read_header(filename):
+    # Return the list of column names from the first line of a tab-delimited file
+    with open(filename, 'r') as fhdl:
+        return fhdl.readline().rstrip('\r\n').split('\t')
+
+
+def obs_layout(obsfile):
+    """Return (freq, value_col) for an NWIS observation file.
+
+    Daily-value files (datetime column) are 'D', stat files with month_nu are
+    'M', and stat files with only year_nu are 'Y'.
+    """
+    header = read_header(obsfile)
+
+    if 'datetime' in header:
+        value_cols = [cc for cc in header if RE_DV_VALUE.match(cc)]
+        if len(value_cols) == 0:
+            raise ValueError(f'{obsfile}: no daily value columns found')
+        return 'D', value_cols[0]
+    if 'month_nu' in header:
+        return 'M', 'mean_va'
+    if 'year_nu' in header:
+        return 'Y', 'mean_va'
+    raise ValueError(f'{obsfile}: unrecognized observation file layout')
+
+
+def obs_periods(df, freq):
+    # Integer periods since 1970 (numpy datetime64 units) for each observation
+    if freq == 'D':
+        return pd.to_datetime(df['datetime']).to_numpy().astype('datetime64[D]').astype(np.int64)
+    if freq == 'M':
+        return (df['year_nu'].to_numpy(np.int64) - 1970) * 12 + df['month_nu'].to_numpy(np.int64) - 1
+    return df['year_nu'].to_numpy(np.int64) - 1970
+
+
+def obs_dtypes(columns):
+    # Compact dtype for each of the given observation file columns
+    dtypes = {}
+    for cc in columns:
+        if cc in OBS_DTYPES:
+            dtypes[cc] = OBS_DTYPES[cc]
+        elif RE_DV_VALUE.match(cc):
+            dtypes[cc] = np.float32
+        elif RE_DV_CODE.match(cc):
+            dtypes[cc] = 'category'
+        else:
+            dtypes[cc] = str
+    return dtypes
+
+
+def read_obs(obsfile, usecols=None, **kwargs):
+    """Read an NWIS observation (_obs) file using compact dtypes.
+
+    site_no and the code columns are categorical, year/month/day are int16
+    and values are float32. For daily-value files the datetime column is
+    parsed to datetime64. Additional keyword arguments are passed to read_csv.
+    """
+    columns = read_header(obsfile) if usecols is None else list(usecols)
+
+    df = pd.read_csv(obsfile, sep='\t', usecols=columns, dtype=obs_dtypes(columns), **kwargs)
+
+    if 'datetime' in df.columns:
+        df['datetime'] = pd.to_datetime(df['datetime'], format='%Y-%m-%d')
+    return df
+
+
+def read_stn(stnfile, usecols=None):
+    """Read an NWIS streamgage information (_stn) file.
+
+    Columns ending in _va are converted to float32 in one vectorized step
+    (blank or malformed entries become NaN) and _cd columns are categorical.
+    """
+    columns = STN_COLUMNS if usecols is None else list(usecols)
+
+    df = pd.read_csv(stnfile, sep='\t', usecols=columns, dtype=str)
+    return stn_types(df)
+
+
+def stn_types(df):
+    # Convert the _va columns of streamgage information to float32 and the _cd
+    # columns to categorical
+    num_cols = [cc for cc in df.columns if cc.endswith('_va')]
+    if len(num_cols) > 0:
+        block = df[num_cols].to_numpy().ravel()
+        values = pd.to_numeric(block, errors='coerce').astype(np.float32)
+        df[num_cols] = values.reshape(len(df), len(num_cols))
+
+    for cc in df.columns:
+        if cc.endswith('_cd'):
+            df[cc] = df[cc].astype('category')
+
+    return df
+
+
+def dv_columns(parameters, statistics):
+    # Column layout of a daily-value observation file for the requested
+    # parameters and statistics (TS_ID prefixes removed)
+    columns = ['agency_cd', 'site_no', 'datetime']
+    for pp in parameters:
+        for ss in statistics:
+            columns.extend([f'{pp}_{ss}', f'{pp}_{ss}_cd'])
+    return columns
+
+
+class DVColumnMap:
+    """Remap the rows of NWIS dv RDB pages onto a fixed set of columns.
+
+    Each site's page has its own header and the value columns are prefixed
+    with the TS_ID (e.g. 12345_00060_00003), so sites can return different
+    column sets. The header of a page is parsed once into a field selector
+    which moves every row onto columns; columns the page lacks are left
+    blank. When a site has more than one TS_ID for a parameter and
+    statistic (e.g. a historical and a current series side by side) each
+    row takes the value, and its code, from the first TS_ID with a value on
+    that date.
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self._index = {cc: ii for ii, cc in enumerate(self.columns)}
+        self._cache = {}
+
+    def header(self):
+        return '\t'.join(self.columns)
+
+    def mapper(self, header):
+        """Return (remap, dropped) for a page header line.
+
+        remap converts a data line of the page to a line in the output
+        column order; dropped lists the page columns which have no place in
+        the output columns.
+        """
+        if header not in self._cache:
+            self._cache[header] = self._compile(header)
+        return self._cache[header]
+
+    def _compile(self, header):
+        fields = header.split('\t')
+        blank = len(fields)    # index of the padding field used for missing columns
+        width = blank + 1
+        dropped = []
+
+        # Source fields of each output column, by TS_ID in page order
+        sources = [OrderedDict() for _ in self.columns]
+
+        for ii, name in enumerate(fields):
+            ts_id = None
+            mm = RE_DV_HEADER.match(name)
+            if mm is not None:
+                ts_id = mm.group(1)
+                name = f'{mm.group(2)}_{mm.group(3)}{mm.group(4) or ""}'
+
+            jj = self._index.get(name)
+            if jj is None:
+                dropped.append(fields[ii])
+                continue
+            sources[jj].setdefault(ts_id, ii)
+
+        getter = itemgetter(*[next(iter(ss.values()), blank) for ss in sources])
+
+        # Output columns fed by more than one TS_ID; the code column follows
+        # the TS_ID chosen for the value column
+        multi = []
+        for jj, ss in enumerate(sources):
+            if len(ss) < 2 or self.columns[jj].endswith('_cd'):
+                continue
+            cj = self._index.get(f'{self.columns[jj]}_cd')
+            codes = sources[cj] if cj is not None else {}
+            multi.append((jj, cj, [(vi, codes.get(ts, blank)) for ts, vi in ss.items()]))
+
+        def remap(line):
+            row = line.split('\t')
+            if len(row) < width:
+                row.extend([''] * (width - len(row)))
+            if len(multi) == 0:
+                return '\t'.join(getter(row))
+
+            out = list(getter(row))
+            for jj, cj, pairs in multi:
+                if out[jj] != '':
+                    continue
+                for vi, ci in pairs[1:]:
+                    if row[vi] != '':
+                        out[jj] = row[vi]
+                        if cj is not None:
+                            out[cj] = row[ci]
+                        break
+            return '\t'.join(out)
+
+        return remap, dropped
@@ -0,0 +1,132 @@
+
+import itertools
+import numpy as np
+import pandas as pd
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+
+from pyNWIS.calendars import year_end
+from pyNWIS.completeness import completeness_report, filter_complete
+from pyNWIS.concurrency import DEFAULT_CONCURRENCY
+from pyNWIS.ragged import RaggedSeries
+from pyNWIS.trends import kendall_trends
+from pyNWIS.windows import window_statistics
+
+__author__ = 'Parker Norton (pnorton@usgs.gov)'
+
+# Sites downloaded ahead of the consumer, as a multiple of the worker count
+REORDER_WINDOW = 4
+
+
+def stream_sites(sites, fetch, max_workers=None):
+    """Yield (site_no, result) for each site, in the order of sites.
+
+    result is the return value of fetch(site_no), which is called from a pool
+    of max_workers threads (by default the maximum limit of the shared
+    adaptive concurrency limiter, which then decides how many requests are
+    actually in flight). Downloads run ahead of the consumer by at most a
+    few times max_workers sites; results which finish early wait in this
+    bounded reorder buffer, so output is written in the same order on every
+    run while the remaining sites are still downloading. Sites which NWIS
+    reports as not found (HTTP 404) yield None.
+    """
+    if max_workers is None:
+        max_workers = DEFAULT_CONCURRENCY.max_limit
+
+    site_iter = iter(sites)
+    queue = deque()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for site in itertools.islice(site_iter, REORDER_WINDOW * max_workers):
+            queue.append((site, pool.submit(fetch, site)))
+
+        while len(queue) > 0:
+            site, fut = queue.popleft()
+
+            try:
+                result = fut.result()
+            except HTTPError as err:
+                if err.code != 404:
+                    raise
+                result = None
+
+            # Keep the pool busy while the caller works on this site
+            for nxt in itertools.islice(site_iter, 1):
+                queue.append((nxt, pool.submit(fetch, nxt)))
+
+            yield site, result
+
+
+def annual_window(stdate, endate, wateryears=False):
+    # Years whose last day (calendar or water year) falls within stdate thru endate
+    st = np.datetime64(stdate, 'D')
+    en = np.datetime64(endate, 'D')
+
+    years = np.arange(st.astype('datetime64[Y]').astype(np.int64) + 1970,
+                      en.astype('datetime64[Y]').astype(np.int64) + 1971)
+    ends = year_end(years, wateryears=wateryears)
+    return years[(ends >= st) & (ends <= en)]
+
+
+def site_trend(df, win_years, rule, max_pval, wateryears=False, kendall=None):
+    """Kendall trend for a single site's annual statistics.
+
+    df holds the stat service rows for one site. Time series which fail the
+    completeness rule over win_years are dropped. Returns (obs, report,
+    result) where obs are the annual values used, report is the completeness
+    report, and result is the trend and first/last ten-year statistics
+    indexed by site_no (empty when no time series is complete).
+    """
+    obs = df[['site_no', 'ts_id', 'year_nu', 'mean_va']].copy()
+    obs['site_no'] = obs['site_no'].astype(str)
+    obs = obs[(obs['year_nu'] >= win_years.min()) & (obs['year_nu'] <= win_years.max())]
+
+    obs['wyear'] = pd.to_datetime(year_end(obs['year_nu'], wateryears=wateryears))
+    obs['period'] = obs['year_nu']
+
+    report = completeness_report(obs, 'period', win_years.min(), win_years.max())
+    obs, report = filter_complete(obs, report, rule)
+
+    if len(obs) == 0:
+        return obs, report, pd.DataFrame()
+
+    sitedata = RaggedSeries.from_frame(obs, 'mean_va', date_col='wyear', freq='Y')
+
+    result = kendall_trends(sitedata, max_pval, kendall=kendall)
+    result = result.join(window_statistics(sitedata, 10, first_name='first_ten_yr', last_name='last_ten_yr'))
+    return obs, report, result
+
+
+def trend_pipeline(sites, fetch, win_years, rule, max_pval, wateryears=False, max_workers=None, kendall=None,
+                   obs_hdl=None):
+    """Download annual statistics and compute Kendall trends site by site.
+
+    Each site's statistics are passed to the trend engine as soon as they
+    are available (in the order of sites) so computation overlaps with the
+    remaining downloads.
+    When obs_hdl is given the raw stat service rows are also written to it in
+    the layout of the NWIS observation files. Returns (results, report).
+    """
+    results = []
+    reports = []
+    header_written = False
+
+    for site, df in stream_sites(sites, fetch, max_workers=max_workers):
+        if df is None or len(df) == 0:
+            continue
+
+        if obs_hdl is not None:
+            df.to_csv(obs_hdl, sep='\t', index=False, header=not header_written)
+            header_written = True
+
+        _, report, result = site_trend(df, win_years, rule, max_pval, wateryears=wateryears, kendall=kendall)
+        reports.append(report)
+
+        if len(result) > 0:
+            results.append(result)
+
+    results = pd.concat(results).sort_index() if len(results) > 0 else pd.DataFrame()
+    report = pd.concat(reports).sort_index() if len(reports) > 0 else pd.DataFrame()
+    return results, report
@@ -0,0 +1,111 @@
+
+import cProfile
+import pstats
+import time
+import tracemalloc
+
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+__author__ = 'Parker Norton (pnorton@usgs.gov)'
+
+PROFILERS = ['cprofile', 'pyinstrument']
+
+
+class StageTimer:
+    """Wall-clock time (and optionally peak memory) of the named stages of a run.
+
+    Stages are timed with the stage() context manager. When memory is True
+    tracemalloc is started and the peak memory allocated by Python during
+    each stage is recorded too. Repeated stages accumulate their times.
+    """
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.times = OrderedDict()
+        self.peaks = OrderedDict()
+
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name):
+        if self.memory:
+            tracemalloc.reset_peak()
+
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[name] = self.times.get(name, 0.0) + time.perf_counter() - t0
+
+            if self.memory:
+                self.peaks[name] = max(self.peaks.get(name, 0), tracemalloc.get_traced_memory()[1])
+
+    def summary(self):
+        # Lines for the run log
+        total = sum(self.times.values())
+        width = max([len(nn) for nn in self.times] + [5])
+
+        lines = ['Stage timings:']
+        for name, secs in self.times.items():
+            line = f'  {name:<{width}s} {secs:9.3f} s {100 * secs / total if total > 0 else 0:5.1f}%'
+            if name in self.peaks:
+                line += f'  peak {self.peaks[name] / 2**20:9.1f} MB'
+            lines.append(line)
+        lines.append(f'  {"total":<{width}s} {total:9.3f} s')
+        return lines
+
+
+class RunProfiler:
+    """Profile a whole run with cProfile or pyinstrument.
+
+    cProfile statistics are written to filename in pstats format (view with
+    snakeviz or python -m pstats); pyinstrument writes an HTML report when
+    filename ends with .html, otherwise text.
+    """
+
+    def __init__(self, filename, profiler='cprofile'):
+        if profiler not in PROFILERS:
+            raise ValueError(f'profiler must be one of {PROFILERS}')
+        if profiler == 'pyinstrument' and pyinstrument is None:
+            raise ImportError('pyinstrument is not installed')
+
+        self.filename = filename
+        self.profiler = profiler
+        self._prof = None
+
+    def start(self):
+        if self.profiler == 'cprofile':
+            self._prof = cProfile.Profile()
+            self._prof.enable()
+        else:
+            self._prof = pyinstrument.Profiler()
+            self._prof.start()
+        return self
+
+    def stop(self):
+        if self.profiler == 'cprofile':
+            self._prof.disable()
+            self._prof.dump_stats(self.filename)
+        else:
+            self._prof.stop()
+            with open(self.filename, 'w') as fhdl:
+                if self.filename.endswith('.html'):
+                    fhdl.write(self._prof.output_html())
+                else:
+                    fhdl.write(self._prof.output_text())
+
+    def summary(self, limit=15):
+        # Lines listing the functions with the most cumulative time (cProfile only)
+        lines = [f'Profile written to {self.filename}']
+        if self.profiler == 'cprofile':
+            stats = pstats.Stats(self._prof)
+            for func, (_, ncalls, _, cumtime, _) in sorted(stats.stats.items(), key=lambda kv: -kv[1][3])[:limit]:
+                lines.append(f'  {cumtime:9.3f} s {ncalls:9d}  {pstats.func_std_string(func)}')
+        return lines
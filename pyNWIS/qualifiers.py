@@ -0,0 +1,149 @@
+
+import re
+
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+__author__ = 'Parker Norton (pnorton@usgs.gov)'
+
+# NWIS daily-value qualification codes. An observation can have several
+# codes separated by ':' or spaces (e.g. 'A:e' or 'P Ice'); each code is
+# given one bit so the codes of an observation fit in a single integer.
+QUALIFIER_CODES = OrderedDict([('A', 'Approved for publication'),
+                               ('P', 'Provisional, subject to revision'),
+                               ('e', 'Estimated'),
+                               ('<', 'Actual value is known to be less than the value shown'),
+                               ('>', 'Actual value is known to be greater than the value shown'),
+                               ('&', 'Computed from unit values with differing qualifiers'),
+                               ('R', 'Revised'),
+                               ('Ice', 'Ice affected'),
+                               ('Bkw', 'Backwater'),
+                               ('Dis', 'Discontinued'),
+                               ('Dry', 'Dry'),
+                               ('Eqp', 'Equipment malfunction'),
+                               ('Fld', 'Flood damage'),
+                               ('Mnt', 'Maintenance'),
+                               ('Pr', 'Partial record'),
+                               ('Rat', 'Rating being developed'),
+                               ('Ssn', 'Monitored seasonally'),
+                               ('Tst', 'Affected by an artificial test'),
+                               ('ZFl', 'Zero flow'),
+                               ('***', 'Temporarily unavailable')])
+
+QUALIFIER_BITS = OrderedDict((cc, np.uint32(1 << ii)) for ii, cc in enumerate(QUALIFIER_CODES))
+
+# Bit set for codes which are not in QUALIFIER_CODES
+UNKNOWN_BIT = np.uint32(1 << len(QUALIFIER_CODES))
+
+# Separators between codes; bracketed remarks (e.g. 'A [4]') are ignored
+RE_CODE_SEP = re.compile(r'[:\s]+')
+RE_REMARK = re.compile(r'\[[^\]]*\]')
+
+
+def code_bits(codes):
+    # Combined bit flags for a list of qualification codes
+    bits = np.uint32(0)
+    for cc in codes:
+        if cc not in QUALIFIER_BITS:
+            raise ValueError(f'Unknown qualification code: {cc}')
+        bits |= QUALIFIER_BITS[cc]
+    return bits
+
+
+def parse_code(text):
+    # Bit flags for a single code string; blank strings have no flags
+    bits = np.uint32(0)
+    for cc in RE_CODE_SEP.split(RE_REMARK.sub(' ', str(text)).strip()):
+        if cc == '':
+            continue
+        bits |= QUALIFIER_BITS.get(cc, UNKNOWN_BIT)
+    return bits
+
+
+def parse_codes(codes):
+    """Bit flags (uint32 array) for an array or series of code strings.
+
+    A code column has only a few distinct values so each one is parsed once
+    and the flags are broadcast back to the rows. Missing codes have no flags.
+    """
+    labels, uniq = pd.factorize(pd.Series(codes))
+
+    # The extra trailing entry is used for missing codes (label -1)
+    flags = np.zeros(len(uniq) + 1, dtype=np.uint32)
+    for ii, uu in enumerate(uniq):
+        flags[ii] = parse_code(uu)
+    return flags[labels]
+
+
+def code_column(value_col):
+    # Name of the qualification code column for a daily value column (e.g. 00060_00003_cd)
+    return f'{value_col}_cd'
+
+
+class QualifierRule:
+    """Rule for deciding which observations to use from their qualification codes.
+
+    include: an observation must have at least one of these codes
+    exclude: an observation must not have any of these codes
+    include_unknown: when False, observations with codes not in
+                     QUALIFIER_CODES are excluded as well
+    """
+
+    def __init__(self, include=None, exclude=None, include_unknown=True):
+        self.include = list(include) if include is not None else None
+        self.exclude = list(exclude) if exclude is not None else None
+        self.include_unknown = include_unknown
+
+        self._include_bits = code_bits(self.include) if self.include is not None else None
+        self._exclude_bits = code_bits(self.exclude) if self.exclude is not None else np.uint32(0)
+        if not self.include_unknown:
+            self._exclude_bits |= UNKNOWN_BIT
+
+    def __str__(self):
+        parts = []
+        if self.include is not None:
+            parts.append(f'include {", ".join(self.include)}')
+        if self.exclude is not None:
+            parts.append(f'exclude {", ".join(self.exclude)}')
+        if not self.include_unknown:
+            parts.append('exclude unknown codes')
+
+        if len(parts) == 0:
+            return 'none'
+        return '; '.join(parts)
+
+    def active(self):
+        # True when the rule can exclude any observations
+        return self._include_bits is not None or self._exclude_bits != 0
+
+    def passes(self, flags):
+        # Return a boolean array which is True for each observation (given
+        # its bit flags from parse_codes) that satisfies the rule
+        ok = (flags & self._exclude_bits) == 0
+        if self._include_bits is not None:
+            ok &= (flags & self._include_bits) != 0
+        return ok
+
+
+def mask_values(df, value_col, rule, code_col=None):
+    """Set the values of observations which fail the rule to NaN.
+
+    The flags are parsed from code_col (by default the value column's _cd
+    column). Masked observations are treated like missing days by the
+    aggregation and trend code. The dataframe is modified in place; returns
+    the number of values which were masked.
+    """
+    if code_col is None:
+        code_col = code_column(value_col)
+
+    fail = ~rule.passes(parse_codes(df[code_col]))
+    if not fail.any():
+        return 0
+
+    values = pd.to_numeric(df[value_col], errors='coerce')
+    masked = int((fail & values.notna().to_numpy()).sum())
+
+    df[value_col] = values.mask(fail)
+    return masked
@@ -0,0 +1,173 @@
+
+import numpy as np
+import pandas as pd
+
+__author__ = 'Parker Norton (pnorton@usgs.gov)'
+
+
+class RaggedSeries:
+    """Compact site-by-time container for timeseries with ragged records.
+
+    The values for all sites are stored in one contiguous array. Site i occupies
+    values[offsets[i]:offsets[i+1]] and covers consecutive periods starting at
+    start[i]; missing periods inside a site's record are NaN. Periods are integer
+    counts of freq units ('D', 'M', or 'Y') since 1970 (numpy datetime64 units).
+    """
+
+    def __init__(self, sites, values, offsets, start, freq='D'):
+        self.sites = np.asarray(sites)
+        self.values = np.asarray(values)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.start = np.asarray(start, dtype=np.int64)
+        self.freq = freq
+
+    @classmethod
+    def from_frame(cls, df, value_col, site_col='site_no', date_col=None, freq='D', dtype=np.float64):
+        """Build from a long dataframe of (site, date, value) rows.
+
+        Dates are taken from date_col, or from the index when date_col is None.
+        Rows with missing values are dropped before building the record spans.
+        """
+        if date_col is None:
+            dates = df.index.to_numpy()
+        else:
+            dates = df[date_col].to_numpy()
+
+        periods = to_periods(dates, freq)
+        return cls.from_periods(df[site_col].to_numpy(), periods, df[value_col].to_numpy(),
+                                freq=freq, dtype=dtype)
+
+    @classmethod
+    def from_periods(cls, sites, periods, values, freq='D', dtype=np.float64):
+        """Build from arrays of sites, integer periods, and values.
+
+        Missing (NaN) values are dropped. Each site can have at most one value
+        per period; a ValueError is raised otherwise (e.g. when a site has
+        more than one ts_id for the same period).
+        """
+        values = np.asarray(values, dtype=dtype)
+        periods = np.asarray(periods, dtype=np.int64)
+
+        valid = ~np.isnan(values)
+        site_names, site_idx = np.unique(np.asarray(sites)[valid], return_inverse=True)
+        periods = periods[valid]
+        values = values[valid]
+
+        nsites = len(site_names)
+        start = np.full(nsites, np.iinfo(np.int64).max, dtype=np.int64)
+        end = np.full(nsites, np.iinfo(np.int64).min, dtype=np.int64)
+        np.minimum.at(start, site_idx, periods)
+        np.maximum.at(end, site_idx, periods)
+
+        lengths = end - start + 1
+        offsets = np.zeros(nsites + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        pos = offsets[site_idx] + periods - start[site_idx]
+        dups = np.flatnonzero(np.bincount(pos, minlength=offsets[-1]) > 1)
+        if len(dups) > 0:
+            jj = np.flatnonzero(pos == dups[0])[0]
+            period = periods[jj:jj+1].astype(f'datetime64[{freq}]')[0]
+            raise ValueError(f'{len(dups)} duplicate (site, period) values, e.g. site {site_names[site_idx[jj]]} '
+                             f'period {period}')
+
+        data = np.full(offsets[-1], np.nan, dtype=dtype)
+        data[pos] = values
+
+        return cls(site_names, data, offsets, start, freq=freq)
+
+    def __len__(self):
+        return len(self.sites)
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    @property
+    def end(self):
+        # Last period of each site's record
+        return self.start + self.lengths - 1
+
+    def site_index(self, site_no):
+        idx = np.flatnonzero(self.sites == site_no)
+        if len(idx) == 0:
+            raise KeyError(site_no)
+        return idx[0]
+
+    def site(self, idx):
+        # View of the values for a single site
+        return self.values[self.offsets[idx]:self.offsets[idx+1]]
+
+    def periods(self, idx):
+        return np.arange(self.start[idx], self.start[idx] + self.offsets[idx+1] - self.offsets[idx])
+
+    def dates(self, idx):
+        return self.periods(idx).astype(f'datetime64[{self.freq}]')
+
+    def segment_ids(self):
+        # Site index for every element of values
+        return np.repeat(np.arange(len(self)), self.lengths)
+
+    def _reduce(self, ufunc, values, identity):
+        result = np.full(len(self), identity, dtype=np.result_type(values, type(identity)))
+        nonempty = self.lengths > 0
+
+        if nonempty.any():
+            result[nonempty] = ufunc.reduceat(values, self.offsets[:-1][nonempty])
+        return result
+
+    def count(self):
+        return self._reduce(np.add, (~np.isnan(self.values)).astype(np.int64), 0)
+
+    def sum(self):
+        return self._reduce(np.add, np.nan_to_num(self.values, nan=0.0), 0.0)
+
+    def mean(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.sum() / self.count()
+
+    def min(self):
+        return self._reduce(np.fmin, self.values, np.nan)
+
+    def max(self):
+        return self._reduce(np.fmax, self.values, np.nan)
+
+    def window_mean(self, first, last):
+        """Mean of each site's values for periods first thru last (inclusive).
+
+        first and last may be scalars or per-site arrays.
+        """
+        csum = np.zeros(len(self.values) + 1, dtype=np.float64)
+        np.cumsum(np.nan_to_num(self.values, nan=0.0), out=csum[1:])
+        ccnt = np.zeros(len(self.values) + 1, dtype=np.int64)
+        np.cumsum(~np.isnan(self.values), out=ccnt[1:])
+
+        lengths = self.lengths
+        lo = self.offsets[:-1] + np.clip(first - self.start, 0, lengths)
+        hi = self.offsets[:-1] + np.clip(last - self.start + 1, 0, lengths)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (csum[hi] - csum[lo]) / (ccnt[hi] - ccnt[lo])
+
+    def apply(self, func):
+        # Call func(periods, values) for each site and return a list of the results
+        return [func(self.periods(ii).astype(np.float64), self.site(ii)) for ii in range(len(self))]
+
+    def to_series(self, values, name=None):
+        # Wrap a per-site array in a pandas series indexed by site_no
+        return pd.Series(values, index=pd.Index(self.sites, name='site_no'), name=name)
+
+    def to_frame(self):
+        # Return the non-missing values as a long dataframe
+        valid = ~np.isnan(self.values)
+        sid = self.segment_ids()
+        periods = self.start[sid] + np.arange(len(self.values)) - self.offsets[:-1][sid]
+
+        return pd.DataFrame({'site_no': self.sites[sid[valid]],
+                             'date': periods[valid].astype(f'datetime64[{self.freq}]'),
+                             'value': self.values[valid]})
+
+
+def to_periods(dates, freq):
+    # Convert datetime-like values to integer periods since 1970
+    return np.asarray(dates, dtype='datetime64[ns]').astype(f'datetime64[{freq}]').astype(np.int64)
@@ -0,0 +1,134 @@
+
+import os
+import struct
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows; the limiter is then only shared within a process
+    fcntl = None
+
+__author__ = 'Parker Norton (pnorton@usgs.gov)'
+
+# Bucket state: request tokens, byte tokens, and time of the last update
+STATE_FORMAT = 'ddd'
+
+
+class RateLimiter:
+    """Token-bucket limits on requests per second and bytes per second.
+
+    Either rate can be None for no limit. Buckets hold at most one second of
+    tokens so short bursts are allowed. Bytes are charged after a response
+    has been read, so a large response puts the byte bucket into debt and
+    later requests wait until it is paid back.
+
+    When lockfile is given the bucket state is kept in that file and
+    guarded with an exclusive lock, so every process using the same file
+    shares one budget. Without a lockfile (or on platforms without fcntl)
+    the budget is shared by the threads of this process only.
+    """
+
+    def __init__(self, requests_per_sec=None, bytes_per_sec=None, lockfile=None):
+        self.requests_per_sec = requests_per_sec
+        self.bytes_per_sec = bytes_per_sec
+        self.lockfile = lockfile if fcntl is not None else None
+
+        self._lock = threading.Lock()
+        self._state = self._full()
+
+    def _full(self):
+        return [max(self.requests_per_sec or 0.0, 1.0), float(self.bytes_per_sec or 0.0), time.time()]
+
+    def _update(self, func):
+        # Call func(state) with exclusive access to the bucket state and save the result
+        with self._lock:
+            if self.lockfile is None:
+                return func(self._state)
+
+            with open(self.lockfile, 'a+b') as fhdl:
+                fcntl.flock(fhdl, fcntl.LOCK_EX)
+
+                fhdl.seek(0)
+                raw = fhdl.read()
+                state = list(struct.unpack(STATE_FORMAT, raw)) if len(raw) == struct.calcsize(STATE_FORMAT) \
+                    else self._full()
+
+                result = func(state)
+
+                fhdl.seek(0)
+                fhdl.truncate()
+                fhdl.write(struct.pack(STATE_FORMAT, *state))
+                fhdl.flush()
+            return result
+
+    def _refill(self, state):
+        now = time.time()
+        elapsed = max(now - state[2], 0.0)
+        state[2] = now
+
+        if self.requests_per_sec is not None:
+            state[0] = min(state[0] + elapsed * self.requests_per_sec, max(self.requests_per_sec, 1.0))
+        if self.bytes_per_sec is not None:
+            state[1] = min(state[1] + elapsed * self.bytes_per_sec, float(self.bytes_per_sec))
+
+    def _take(self, state):
+        # Take a request token; returns the time to wait when none is available
+        self._refill(state)
+
+        wait = 0.0
+        if self.requests_per_sec is not None and state[0] < 1.0:
+            wait = (1.0 - state[0]) / self.requests_per_sec
+        if self.bytes_per_sec is not None and state[1] < 0.0:
+            wait = max(wait, -state[1] / self.bytes_per_sec)
+
+        if wait == 0.0 and self.requests_per_sec is not None:
+            state[0] -= 1.0
+        return wait
+
+    def acquire(self):
+        # Block until a request may be made
+        if self.requests_per_sec is None and self.bytes_per_sec is None:
+            return
+
+        while True:
+            wait = self._update(self._take)
+            if wait <= 0.0:
+                return
+            time.sleep(wait)
+
+    def consume(self, nbytes):
+        # Charge the size of a response against the byte budget
+        if self.bytes_per_sec is None:
+            return
+
+        def charge(state):
+            self._refill(state)
+            state[1] -= nbytes
+
+        self._update(charge)
+
+
+def default_rate_limiter():
+    """Rate limiter configured from the environment.
+
+    PYNWIS_MAX_RPS and PYNWIS_MAX_BPS set the requests and bytes per second.
+    The budget is shared by all processes using the same lock file,
+    PYNWIS_RATE_FILE (default: pyNWIS_rate.lock in the temporary directory).
+    """
+    rps = os.environ.get('PYNWIS_MAX_RPS')
+    bps = os.environ.get('PYNWIS_MAX_BPS')
+
+    if rps is None and bps is None:
+        return RateLimiter()
+
+    lockfile = os.environ.get('PYNWIS_RATE_FILE', os.path.join(tempfile.gettempdir(), 'pyNWIS_rate.lock'))
+    return RateLimiter(requests_per_sec=None if rps is None else float(rps),
+                       bytes_per_sec=None if bps is None else float(bps),
+                       lockfile=lockfile)
+
+
+# Shared by all NWIS services in this process
+DEFAULT_RATE_LIMITER = default_rate_limiter()
@@ -0,0 +1,99 @@
+
+import threading
+
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+
+__author__ = 'Parker Norton (pnorton@usgs.gov)'
+
+
+class SingleFlight:
+    """Coalesce identical calls which are in flight at the same time.
+
+    The first caller for a key (the leader) makes the call; every caller
+    that arrives with the same key before it finishes waits on the same
+    concurrent.futures.Future and receives the same result or exception.
+    Once the call finishes the key is released, so later callers make a
+    new call. submit() gives each caller its own Future, which can be
+    awaited from asyncio with asyncio.wrap_future; cancelling it (e.g. on a
+    timeout) only abandons that caller's wait, not the call itself.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key):
+        # Return (future, True) for the leader or (future, False) for a waiter
+        with self._lock:
+            fut = self._calls.get(key)
+            if fut is not None:
+                return fut, False
+
+            # A running future cannot be cancelled, so no caller can cancel
+            # the call out from under the others
+            fut = Future()
+            fut.set_running_or_notify_cancel()
+            self._calls[key] = fut
+            return fut, True
+
+    def _release(self, key):
+        with self._lock:
+            del self._calls[key]
+
+    def _run(self, key, fut, func, args, kwargs):
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as err:
+            # Waiters see the error too; interrupts still stop the leader
+            self._release(key)
+            fut.set_exception(err)
+            if not isinstance(err, Exception):
+                raise
+        else:
+            self._release(key)
+            fut.set_result(result)
+
+    def do(self, key, func, *args, **kwargs):
+        # Call func (or wait for the identical call in flight) and return its result
+        fut, leader = self._join(key)
+        if leader:
+            self._run(key, fut, func, args, kwargs)
+        return fut.result()
+
+    def submit(self, key, executor, func, *args, **kwargs):
+        # Return a Future for the result; a leader's call runs on the executor
+        fut, leader = self._join(key)
+        if leader:
+            executor.submit(self._run, key, fut, func, args, kwargs)
+        return self._follow(fut)
+
+    @staticmethod
+    def _follow(shared):
+        # Return a Future, owned by one caller, which completes with the shared one
+        mine = Future()
+
+        def copy_result(src):
+            if mine.cancelled():
+                return
+            try:
+                if src.exception() is not None:
+                    mine.set_exception(src.exception())
+                else:
+                    mine.set_result(src.result())
+            except InvalidStateError:
+                # Cancelled by the caller in the meantime
+                pass
+
+        shared.add_done_callback(copy_result)
+        return mine
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+# Shared by all NWIS services so identical requests from different objects are coalesced
+DEFAULT_SINGLE_FLIGHT = SingleFlight()
+
+# Worker threads for requests made from asyncio
+ASYNC_EXECUTOR = ThreadPoolExecutor(max_workers=32, thread_name_prefix='pyNWIS')
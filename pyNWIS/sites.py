@@ -1,4 +1,5 @@
 
+import sys
 import numpy as np
 import pandas as pd
 
@@ -7,15 +8,16 @@ from io import StringIO
 from urllib.request import urlopen, Request
 from urllib.error import HTTPError
 
-from pyNWIS.nwis import NWIS, BASE_URL, RE_COMMENTS, RE_FLD_LENGTH
+from pyNWIS.nwis import NWIS, RE_COMMENTS, RE_FLD_LENGTH
 
 __author__ = 'Parker Norton (pnorton@usgs.gov)'
 
 
 class Sites(NWIS):
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, **kwargs):
+        # Keyword arguments (e.g. retry or hedge) are passed to NWIS
+        super().__init__(**kwargs)
 
     def _get_nwis_site_fields(self):
         # Retrieve a single station and pull out the field names and data types
@@ -29,7 +31,7 @@ class Sites(NWIS):
 
         url_final = '&'.join([f'{kk}={vv}' for kk, vv in url_pieces.items()])
 
-        stn_url = f'{BASE_URL}/site/?{url_final}'
+        stn_url = f'{self.base_url}/site/?{url_final}'
 
         streamgage_site_page = self.get_page(stn_url, fld_lengths=False)
 
@@ -48,6 +50,21 @@ class Sites(NWIS):
 
         return nwis_final
 
+    def get_region_sites(self, region, parameter_cd='00060', site_type='ST'):
+        # Streamgages in a region (Hydrologic Unit Code) with all of the
+        # expanded site service columns, as written to NWIS station files
+        url_pieces = OrderedDict()
+        url_pieces['format'] = 'rdb'
+        url_pieces['huc'] = f'{region}'
+        url_pieces['siteOutput'] = 'expanded'
+        url_pieces['siteStatus'] = 'all'
+        url_pieces['parameterCd'] = parameter_cd
+        url_pieces['siteType'] = site_type
+
+        url_final = '&'.join([f'{kk}={vv}' for kk, vv in url_pieces.items()])
+
+        return self.get_rdb(f'{self.base_url}/site/?{url_final}')
+
     def get_nwis_sites(self, stdate, endate, sites=None, regions=None):
         cols = self._get_nwis_site_fields()
 
@@ -55,8 +72,8 @@ class Sites(NWIS):
         include_cols = ['agency_cd', 'site_no', 'station_nm', 'dec_lat_va', 'dec_long_va', 'dec_coord_datum_cd',
                         'alt_va', 'alt_datum_cd', 'huc_cd', 'drain_area_va', 'contrib_drain_area_va']
 
-        # Start with an empty dataframe
-        nwis_sites = pd.DataFrame(columns=include_cols)
+        # Dataframes retrieved for each region or site
+        nwis_sites = [pd.DataFrame(columns=include_cols)]
 
         url_pieces = OrderedDict()
         url_pieces['format'] = 'rdb'
@@ -102,14 +119,14 @@ class Sites(NWIS):
                 url_final = '&'.join([f'{kk}={vv}' for kk, vv in url_pieces.items()])
 
                 # stn_url = f'{base_url}/site/?format=rdb&huc={region+1:02}&siteOutput=expanded&siteStatus=all&parameterCd=00060&siteType=ST'
-                stn_url = f'{base_url}/site/?{url_final}'
+                stn_url = f'{self.base_url}/site/?{url_final}'
 
-                streamgage_site_page = _retrieve_from_NWIS(stn_url)
+                streamgage_site_page = self.get_rdb_page(stn_url)
 
                 # Read the rdb file into a dataframe
                 df = pd.read_csv(StringIO(streamgage_site_page), sep='\t', dtype=cols, usecols=include_cols)
 
-                nwis_sites = nwis_sites.append(df, ignore_index=True)
+                nwis_sites.append(df)
                 sys.stdout.write('\r                      \r')
         else:
             for site in sites:
@@ -119,20 +136,24 @@ class Sites(NWIS):
                 url_pieces['sites'] = site
                 url_final = '&'.join([f'{kk}={vv}' for kk, vv in url_pieces.items()])
 
-                stn_url = f'{base_url}/site/?{url_final}'
+                stn_url = f'{self.base_url}/site/?{url_final}'
 
                 try:
-                    streamgage_site_page = _retrieve_from_NWIS(stn_url)
+                    streamgage_site_page = self.get_rdb_page(stn_url)
 
                     # Read the rdb file into a dataframe
                     df = pd.read_csv(StringIO(streamgage_site_page), sep='\t', dtype=cols, usecols=include_cols)
 
-                    nwis_sites = nwis_sites.append(df, ignore_index=True)
+                    nwis_sites.append(df)
                 except (HTTPError) as err:
                     if err.code == 404:
                         sys.stdout.write(f'HTTPError: {err.code}, site does not meet criteria - SKIPPED\n')
+                    else:
+                        raise
                 sys.stdout.write('\r                      \r')
 
+        nwis_sites = pd.concat(nwis_sites, ignore_index=True)
+
         field_map = {'agency_cd': 'poi_agency',
                      'site_no': 'poi_id',
                      'station_nm': 'poi_name',
@@ -0,0 +1,49 @@
+
+from collections import OrderedDict
+
+from pyNWIS.nwis import NWIS
+
+__author__ = 'Parker Norton (pnorton@usgs.gov)'
+
+# Annual statistics sample
+# //waterservices.usgs.gov/nwis/stat/?format=rdb&sites=01646500&startDT=2021&endDT=2021&statReportType=annual&statTypeCd=all&missingData=off&parameterCd=00060
+
+
+class Statistics(NWIS):
+    """Retrieve annual, monthly, or daily statistics from the NWIS stat service."""
+
+    def __init__(self, stdate, endate, report_type='annual', stat='mean', wateryears=False,
+                 parameter_cd='00060', show_restricted=False, **kwargs):
+        # Additional keyword arguments (e.g. retry or hedge) are passed to NWIS
+        super().__init__(**kwargs)
+
+        # Non-changing parts of the REST URL for pulling statistics
+        self.url_pieces = OrderedDict()
+        self.url_pieces['format'] = 'rdb'
+
+        if report_type == 'monthly':
+            self.url_pieces['startDT'] = stdate[0:7]
+            self.url_pieces['endDT'] = endate[0:7]
+        else:
+            self.url_pieces['startDT'] = stdate
+            self.url_pieces['endDT'] = endate
+
+        self.url_pieces['parameterCd'] = parameter_cd
+        self.url_pieces['statReportType'] = report_type
+        self.url_pieces['statType'] = stat
+
+        # Specifying statistics by water year is only legal for annual report types
+        if report_type == 'annual' and wateryears:
+            self.url_pieces['statYearType'] = 'water'
+
+        if show_restricted:
+            self.url_pieces['access'] = 3
+
+    def site_url(self, site):
+        # URL of the statistics for a single site
+        url_final = '&'.join([f'{kk}={vv}' for kk, vv in self.url_pieces.items()])
+        return f'{self.base_url}/stat/?{url_final}&site={site}'
+
+    def get_site_stats(self, site):
+        # Statistics for a single site as a dataframe
+        return self.get_rdb(self.site_url(site))
@@ -0,0 +1,68 @@
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from pyNWIS.dedup import dedup_obs
+from pyNWIS.obsfiles import DATE_COLUMNS, obs_layout, obs_periods
+
+__author__ = 'Parker Norton (pnorton@usgs.gov)'
+
+
+def last_periods(obsfile):
+    """Return (freq, last) for an existing observation file.
+
+    last maps each site_no to the period (integer count since 1970 in numpy
+    datetime64 units of freq) of the site's most recent observation. Only
+    the site and date columns are read.
+    """
+    freq, _ = obs_layout(obsfile)
+
+    df = pd.read_csv(obsfile, sep='\t', usecols=['site_no'] + DATE_COLUMNS[freq], dtype={'site_no': str})
+    if len(df) == 0:
+        return freq, {}
+
+    last = pd.Series(obs_periods(df, freq)).groupby(df['site_no'].to_numpy(), sort=False).max()
+    return freq, last.to_dict()
+
+
+def sync_start(last, freq, stdate, endate, overlap=0):
+    """Start date for downloading the observations after period last.
+
+    overlap periods before the last stored one are requested again to pick
+    up revised (e.g. provisional) values. The start is never before stdate.
+    Returns None when the site is already up to date with endate; otherwise
+    the start formatted for the period units ('YYYY', 'YYYY-MM' or 'YYYY-MM-DD').
+    """
+    start = np.datetime64(int(last) + 1 - overlap, freq)
+
+    if start > np.datetime64(endate).astype(f'datetime64[{freq}]'):
+        return None
+    return str(max(start, np.datetime64(stdate).astype(f'datetime64[{freq}]')))
+
+
+def merge_obs(obsfile, deltafile):
+    """Merge the observations in deltafile into obsfile.
+
+    Rows are matched as in pyNWIS.dedup.dedup_obs and a row from deltafile
+    replaces the stored one. The merged file is sorted by series and date
+    and replaces obsfile when complete. Returns (added, replaced) row counts.
+    """
+    freq, _ = obs_layout(obsfile)
+
+    # Read everything as text so values are written back unchanged
+    old = pd.read_csv(obsfile, sep='\t', dtype=str, keep_default_na=False)
+    if os.path.getsize(deltafile) > 0:
+        new = pd.read_csv(deltafile, sep='\t', dtype=str, keep_default_na=False)
+    else:
+        new = old.iloc[0:0]
+
+    merged, _ = dedup_obs([old, new], freq, precedence=['latest'])
+
+    tmpfile = f'{obsfile}.tmp'
+    merged.to_csv(tmpfile, sep='\t', index=False)
+    os.replace(tmpfile, obsfile)
+
+    added = len(merged) - len(old)
+    return added, len(new) - added
@@ -0,0 +1,40 @@
+
+import numpy as np
+import pandas as pd
+
+__author__ = 'Parker Norton (pnorton@usgs.gov)'
+__version__ = '0.1'   # trend engine version; cached results are keyed on it
+
+
+def trend_codes(tau, pval, max_pval):
+    """Classify Kendall results into trend codes.
+
+    Significant trends are -1 (down) or 1 (up). Non-significant trends are
+    marked -2 or 2 so GIS can handle the symbology easier; no trend is 0.
+    """
+    tau = np.asarray(tau)
+    sig = np.asarray(pval) <= max_pval
+
+    return np.select([sig & (tau < 0), sig & (tau > 0), ~sig & (tau < 0), ~sig & (tau > 0)],
+                     [-1, 1, -2, 2], default=0)
+
+
+def kendall_trends(series, max_pval, kendall=None):
+    """Compute the Kendall tau for each site in a RaggedSeries.
+
+    kendall is a function taking (time, values) and returning (tau, svar, z, pval);
+    by default kendall_cy.kendall_numpy is used. Returns a dataframe indexed by
+    site_no with pval, tau, and trend columns.
+    """
+    if kendall is None:
+        import kendall_cy
+        kendall = kendall_cy.kendall_numpy
+
+    # result indices: tau,0; svar,1; z,2; pval,3
+    results = np.array(series.apply(kendall), dtype=np.float64).reshape(-1, 4)
+
+    df = pd.DataFrame({'pval': results[:, 3],
+                       'tau': results[:, 0],
+                       'trend': trend_codes(results[:, 0], results[:, 3], max_pval)},
+                      index=pd.Index(series.sites, name='site_no'))
+    return df
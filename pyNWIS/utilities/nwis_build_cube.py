@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""This script converts a file of downloaded NWIS observations into a
+memory-mapped (date x site) float32 cube. The site index and date axis
+are written to a JSON sidecar file next to the cube."""
+
+#      Author: Parker Norton (pnorton@usgs.gov)
+#        Date: 2026-10-19
+# Description: Builds an observation cube from the _obs file written by
+#              nwis_daily_rest.py or nwis_download_rest.py so repeated
+#              analyses can load the data with pyNWIS.cube.ObsCube instead
+#              of re-parsing the text file.
+
+import os
+import argparse
+
+import numpy as np
+
+from pyNWIS.cube import ObsCube, build_cube
+
+__version__ = '0.1'
+__author__ = 'Parker Norton (pnorton@usgs.gov)'
+
+
+def main():
+    # Command line arguments
+    parser = argparse.ArgumentParser(description='Build a memory-mapped observation cube from an NWIS obs file.')
+    parser.add_argument('obsfile', help='NWIS observation filename')
+    parser.add_argument('cubefile', help='Output cube filename (e.g. nwis_obs.npy)')
+    parser.add_argument('-v', '--value_col', help='Observation column to store (default is detected from the file)',
+                        default=None)
+    parser.add_argument('-O', '--overwrite', help='Overwrite existing output file', action='store_true')
+
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.obsfile):
+        print(f'The streamflow observation file, {args.obsfile}, does not exist')
+        exit(1)
+
+    if not args.overwrite and os.path.isfile(args.cubefile):
+        print(f'The cube file, {args.cubefile}, already exists.\nTo force overwrite specify -O on command line')
+        exit(1)
+
+    build_cube(args.obsfile, args.cubefile, value_col=args.value_col)
+
+    cube = ObsCube(args.cubefile)
+    print(f'Cube written to {args.cubefile}')
+    print(f'  Sites: {len(np.unique(cube.sites))}')
+    if cube.ts_ids is not None:
+        print(f'  Series (site_no, ts_id): {len(cube)}')
+    if len(cube.dates) > 0:
+        print(f'  Dates: {cube.dates[0]} to {cube.dates[-1]} ({len(cube.dates)} {cube.freq})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""This script computes per-site statistics and, optionally, Kendall
+trends from a large NWIS observation file without loading the whole
+file into memory. Results are written to a tab-delimited file indexed
+by site_no."""
+
+#      Author: Parker Norton (pnorton@usgs.gov)
+#        Date: 2026-10-19
+# Description: Streams the _obs file written by nwis_daily_rest.py or
+#              nwis_download_rest.py in site-aligned chunks sized from a
+#              memory budget, then merges the per-chunk results.
+
+import os
+import platform
+import sys
+import datetime
+import argparse
+from time import strftime
+
+import numpy as np
+
+from pyNWIS.chunked import chunked_statistics
+from pyNWIS.obsfiles import obs_layout, read_header, read_stn
+from pyNWIS.qualifiers import QUALIFIER_CODES, QualifierRule, code_column
+
+__version__ = '0.1'
+__author__ = 'Parker Norton (pnorton@usgs.gov)'
+
+
+def main():
+    # Command line arguments
+    parser = argparse.ArgumentParser(description='Compute per-site statistics from a large NWIS observation file')
+    parser.add_argument('obsfile', help='NWIS observation filename')
+    parser.add_argument('outfile', help='Output filename prefix')
+    parser.add_argument('-s', '--stnfile', help='NWIS streamgage information filename', default=None)
+    parser.add_argument('-d', '--daterange',
+                        help='Starting and ending calendar date (YYYY-MM-DD YYYY-MM-DD)',
+                        nargs=2, metavar=('startDate', 'endDate'), default=None)
+    parser.add_argument('-p', '--pval', help='Maximum p-value; when given Kendall trends are computed',
+                        type=float, default=None)
+    parser.add_argument('-m', '--memory', help='Memory budget in MB', type=int, default=256)
+    parser.add_argument('--include-codes', help='Only use values with one of these qualification codes (e.g. A)',
+                        nargs='+', choices=list(QUALIFIER_CODES), default=None)
+    parser.add_argument('--exclude-codes', help='Do not use values with any of these qualification codes '
+                                                '(e.g. P e Ice)', nargs='+', choices=list(QUALIFIER_CODES), default=None)
+    parser.add_argument('-O', '--overwrite', help='Overwrite existing output file', action='store_true')
+
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.obsfile):
+        print(f'The streamflow observation file, {args.obsfile}, does not exist')
+        exit(1)
+
+    statsfile = f'{args.outfile}_stats.tab'
+    if not args.overwrite and os.path.isfile(statsfile):
+        print('Output filename exists. To force overwrite specify -O on command line')
+        exit(1)
+
+    log_list = []
+    log_list.append('='*70)
+    log_list.append(f'Program executed {strftime("%Y-%m-%d %H:%M:%S %z")}')
+    log_list.append('-'*70)
+    log_list.append(' '.join(sys.argv))
+    log_list.append('-'*70)
+    log_list.append(f'Script version: {__version__}')
+    log_list.append(f'Python: {platform.python_implementation()} ({platform.python_version()})')
+    log_list.append(f'Host: {platform.node()}')
+    log_list.append(f' Observation file: {args.obsfile}')
+    log_list.append(f'      Output file: {statsfile}')
+    log_list.append(f'    Memory budget: {args.memory} MB')
+
+    freq, value_col = obs_layout(args.obsfile)
+
+    # Values which fail the qualification-code rule are treated as missing
+    rule = QualifierRule(include=args.include_codes, exclude=args.exclude_codes)
+    if rule.active() and code_column(value_col) not in read_header(args.obsfile):
+        print(f'The observation file, {args.obsfile}, has no {code_column(value_col)} column')
+        exit(1)
+    log_list.append(f'Qualification-code rule: {rule}')
+
+    first_period = None
+    last_period = None
+    if args.daterange is not None:
+        st = datetime.datetime(*(map(int, args.daterange[0].split('-'))))
+        en = datetime.datetime(*(map(int, args.daterange[1].split('-'))))
+        first_period = np.datetime64(st, freq).astype(np.int64)
+        last_period = np.datetime64(en, freq).astype(np.int64)
+
+    result = chunked_statistics(args.obsfile, memory_budget=args.memory * 2**20, value_col=value_col,
+                                first_period=first_period, last_period=last_period, max_pval=args.pval,
+                                rule=rule if rule.active() else None)
+    masked = result.attrs.get('masked', 0)
+
+    # Report the record span as dates instead of integer periods
+    for cc in ['first_period', 'last_period']:
+        if cc in result.columns:
+            result[cc] = result[cc].to_numpy(np.int64).astype(f'datetime64[{freq}]')
+
+    if args.stnfile is not None:
+        stations = read_stn(args.stnfile)
+        stations.set_index('site_no', inplace=True)
+        result = stations.join(result, how='right')
+
+    result.to_csv(statsfile, sep='\t', float_format='%1.5f', header=True, index=True)
+
+    log_list.append('-'*70)
+    log_list.append(f'Sites: {len(result)}')
+    log_list.append(f'Values masked by qualification code: {masked}')
+    if 'trend' in result.columns:
+        log_list.append(f'Trends summary (total/up/down): {args.outfile},{len(result)},'
+                        f'{(result["trend"] == 1).sum()},{(result["trend"] == -1).sum()}')
+    log_list.append('='*70)
+
+    logfile = f'{args.outfile}.log'
+    with open(logfile, 'w') as loghdl:
+        for xx in log_list:
+            print(xx)
+            loghdl.write(xx + '\n')
+    print(f'Summary written to {logfile}')
+
+
+if __name__ == '__main__':
+    main()
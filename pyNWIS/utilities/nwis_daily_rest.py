@@ -15,14 +15,18 @@ from __future__ import (absolute_import, division, print_function)
 import os
 import platform
 import sys
-import re
 from time import strftime
 import argparse
 import logging
 
 from collections import OrderedDict
-from urllib.request import urlopen   # , Request
-# from urllib.error import HTTPError
+
+from pyNWIS.hedging import HedgePolicy
+from pyNWIS.metrics import json_lines_hook
+from pyNWIS.nwis import BASE_URL, NWIS
+from pyNWIS.obsfiles import DVColumnMap, dv_columns
+from pyNWIS.pipeline import stream_sites
+from pyNWIS.sync import last_periods, merge_obs, sync_start
 
 __version__ = '0.3'
 
@@ -45,6 +49,16 @@ def main():
     parser.add_argument('-s', '--stat', help='List of statistics', nargs='+', default=['00003'])
     parser.add_argument('-S', '--sites', help='Space separated list of streamgages', nargs='+',
                         default=None, type=str)
+    parser.add_argument('-j', '--jobs', help='Maximum number of concurrent downloads (default is the limit of the '
+                                             'adaptive concurrency control)', type=int, default=None)
+    parser.add_argument('--hedge', help='Duplicate requests whose response is slower to start than the p95',
+                        action='store_true')
+    parser.add_argument('--base-url', help='Root URL of the NWIS web services', default=BASE_URL)
+    parser.add_argument('--metrics', help='Write a JSON line for every request to this file', default=None)
+    parser.add_argument('--sync', help='Only download observations newer than those in the existing output file',
+                        action='store_true')
+    parser.add_argument('--overlap', help='With --sync, number of days before the last stored day to download again',
+                        type=int, default=0)
     parser.add_argument('--show_restricted', help='Retrieved parameters/values that have access restrictions',
                         action='store_true')
 
@@ -69,11 +83,15 @@ def main():
     print(f'Streamgage information file: {stnfile}')
     print(f'Session log file: {logfile}')
 
-    if not args.overwrite and os.path.isfile(stnfile):
+    # When syncing, new observations are downloaded to a separate file and
+    # then merged into the existing observation file
+    syncing = args.sync and os.path.isfile(obsfile)
+
+    if not args.overwrite and not syncing and os.path.isfile(stnfile):
         print(f'The streamflow information file, {stnfile}, already exists.\nTo force overwrite specify -O on command line')
         exit(1)
 
-    if not args.overwrite and os.path.isfile(obsfile):
+    if not args.overwrite and not syncing and os.path.isfile(obsfile):
         print(f'The streamflow observation file, {obsfile}, already exists.\nTo force overwrite specify -O on command line')
         exit(1)
 
@@ -94,7 +112,7 @@ def main():
     logging.info(f'         Log file: {logfile}')
 
     # URLs can be generated/tested at: http://waterservices.usgs.gov/rest/Site-Test-Tool.html
-    base_url = 'https://waterservices.usgs.gov/nwis'
+    base_url = args.base_url.rstrip('/')
 
     stn_pieces = OrderedDict()
     stn_pieces['format'] = 'rdb'
@@ -121,21 +139,27 @@ def main():
     logging.info(f'Base URL: {base_url}')
     logging.info(f'Station URL: {stn_url}')
 
+    # Last stored day for each site
+    last_obs = {}
+    if syncing:
+        sync_freq, last_obs = last_periods(obsfile)
+        logging.info(f'Sync: {len(last_obs)} sites in {obsfile}; overlap {args.overlap} days')
+
     # Open station and observation files
     stn_hdl = open(stnfile, "w")
-    obs_hdl = open(obsfile, "w")
-
-    t1 = re.compile('^#.*$\n?', re.MULTILINE)   # remove comment lines
-    t2 = re.compile('^5s.*$\n?', re.MULTILINE)  # remove field length lines
+    deltafile = f'{obsfile}.delta' if syncing else obsfile
+    obs_hdl = open(deltafile, "w")
 
-    # Retrieve stations from NWIS site service
-    response = urlopen(stn_url)
-    encoding = response.info().get_param('charset', failobj='utf8')
-    streamgage_site_page = response.read().decode(encoding)
+    # Requests retry transient errors (5xx, 429, resets, and timeouts)
+    nwis = NWIS(hedge=HedgePolicy() if args.hedge else None)
+    metrics_hdl = None
+    if args.metrics is not None:
+        metrics_hdl = open(args.metrics, 'w')
+        nwis.metrics.add_hook(json_lines_hook(metrics_hdl))
 
-    # Strip the comment lines and field length lines from the result
-    streamgage_site_page = t1.sub('', streamgage_site_page, 0)
-    streamgage_site_page = t2.sub('', streamgage_site_page, 0)
+    # Retrieve stations from NWIS site service; comment lines and field length
+    # lines are stripped from the result
+    streamgage_site_page = nwis.get_rdb_page(stn_url)
 
     # Build the non-changing parts of the REST URL for pulling streamflow values
     url_pieces = OrderedDict()
@@ -152,12 +176,8 @@ def main():
         url_pieces['access'] = 3
 
     fld = {}
+    site_lines = OrderedDict()   # site information line for each streamgage
 
-    # Each request gives a new header; we only want one
-    header_written = False
-
-    logging.info('========== Streamgage observation URLs ==========')
-    # Loop through each site and download the observations
     for cStreamgage in streamgage_site_page.split('\n'):
         if len(cStreamgage) > 0:
             ff = cStreamgage.split('\t')
@@ -171,57 +191,78 @@ def main():
                 stn_hdl.write(cStreamgage + '\n')
                 continue
 
-            url_pieces['site'] = ff[fld['site_no']]
-
-            url_final = '&'.join([f'{kk}={vv}' for kk, vv in url_pieces.items()])
-
-            obs_url = f'{base_url}/dv/?{url_final}'
-
-            logging.info(obs_url)
-            sys.stdout.write(f'\rDownloading observations for streamgage: {ff[fld["site_no"]]}')
-            sys.stdout.flush()
-
-            # Read site data
-            response = urlopen(obs_url)
-            encoding = response.info().get_param('charset', failobj='utf8')
-            streamgage_obs_page = response.read().decode(encoding)
-
-            # Strip the comment lines and field length lines from the result using regex
-            streamgage_obs_page = t1.sub('', streamgage_obs_page, 0)
-            streamgage_obs_page = t2.sub('', streamgage_obs_page, 0)
-
-            # Write the streamgage observations to the output file
-            for obs in streamgage_obs_page.split('\n'):
-                if obs.split('\t')[0] == 'agency_cd':
-                    # We only want a single header in the output file
-                    if header_written:
-                        continue
-                    else:
-                        header_written = True
-                        obs_fld = obs.split('\t')
-
-                        # Rename certain fields to remove TS_ID portion
-                        for ii, xx in enumerate(obs_fld):
-                            if xx not in ['agency_cd', 'site_no', 'datetime']:
-                                for pp in args.parameters:
-                                    for ss in args.stat:
-                                        if f'{pp}_{ss}_cd' in xx:
-                                            obs_fld[ii] = f'{pp}_{ss}_cd'
-                                        elif f'{pp}_{ss}' in xx:
-                                            obs_fld[ii] = f'{pp}_{ss}'
-                        obs = '\t'.join(obs_fld)
-
-                if len(obs) > 0:
-                    if obs[0] != '\t':
-                        # Empty data returns can have all tabs
-                        obs_hdl.write(obs + '\n')
-
-            # Write the streamgage information file
-            stn_hdl.write(cStreamgage + '\n')
-            sys.stdout.write('\r' + ' '*60 + '\r')
+            site_lines[ff[fld['site_no']]] = cStreamgage
+
+    def get_site_obs(site):
+        # Download the observations for a single site
+        site_pieces = OrderedDict(url_pieces)
+        site_pieces['site'] = site
+
+        if site in last_obs:
+            # Only request the days after the last stored one
+            start = sync_start(last_obs[site], sync_freq, args.daterange[0], args.daterange[1], args.overlap)
+            if start is None:
+                return ''
+            site_pieces['startDT'] = start
+
+        url_final = '&'.join([f'{kk}={vv}' for kk, vv in site_pieces.items()])
+
+        obs_url = f'{base_url}/dv/?{url_final}'
+
+        logging.info(obs_url)
+        return nwis.get_rdb_page(obs_url)
+
+    # Every site's rows are written in the same column order; the header of
+    # each page (which includes the TS_IDs) is mapped onto it
+    colmap = DVColumnMap(dv_columns(args.parameters, args.stat))
+    obs_hdl.write(colmap.header() + '\n')
+
+    logging.info('========== Streamgage observation URLs ==========')
+    # Download the sites concurrently; the number of requests in flight
+    # adapts to the server's latency and error rate
+    for site, streamgage_obs_page in stream_sites(site_lines, get_site_obs, max_workers=args.jobs):
+        if streamgage_obs_page is None:
+            if site not in last_obs:
+                logging.warning(f'HTTPError: 404, no data for site {site} - SKIPPED')
+                continue
+            # No new observations for a site already in the output file
+            streamgage_obs_page = ''
+
+        sys.stdout.write(f'\rDownloaded observations for streamgage: {site}')
+        sys.stdout.flush()
+
+        # Write the streamgage observations to the output file
+        remap = None
+        for obs in streamgage_obs_page.split('\n'):
+            if obs.startswith('agency_cd\t'):
+                remap, dropped = colmap.mapper(obs)
+                if len(dropped) > 0:
+                    logging.warning(f'Site {site}: columns not in the output layout {", ".join(dropped)} - SKIPPED')
+                continue
+
+            if len(obs) > 0 and remap is not None:
+                if obs[0] != '\t':
+                    # Empty data returns can have all tabs
+                    obs_hdl.write(remap(obs) + '\n')
+
+        # Write the streamgage information file
+        stn_hdl.write(site_lines[site] + '\n')
+        sys.stdout.write('\r' + ' '*60 + '\r')
     stn_hdl.close()
     obs_hdl.close()
 
+    if syncing:
+        added, replaced = merge_obs(obsfile, deltafile)
+        os.remove(deltafile)
+        logging.info(f'Sync: {added} observations added, {replaced} replaced')
+
+    if nwis.hedge is not None:
+        logging.info(nwis.hedge.summary())
+    for line in nwis.metrics.summary():
+        logging.info(line)
+    if metrics_hdl is not None:
+        metrics_hdl.close()
+
     print(f'Summary written to {logfile}')
 
 
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""This script derives monthly, annual, water-year or water-quarter mean
+streamflow from a file of daily values downloaded with nwis_daily_rest.py.
+The output uses the same layout as the files written by
+nwis_download_rest.py so it can be used directly by the kendall scripts."""
+
+#      Author: Parker Norton (pnorton@usgs.gov)
+#        Date: 2026-10-19
+# Description: Aggregates daily streamflow observations locally instead of
+#              pulling the same gages again from the NWIS stat service.
+
+import os
+import platform
+import sys
+from time import strftime
+import argparse
+import logging
+
+from pyNWIS.aggregate import PERIODS, aggregate_daily, to_stat_layout
+from pyNWIS.obsfiles import obs_layout, read_header, read_obs
+from pyNWIS.qualifiers import QUALIFIER_CODES, QualifierRule, code_column, mask_values
+
+__version__ = '0.1'
+__author__ = 'Parker Norton (pnorton@usgs.gov)'
+
+
+def main():
+    # Command line arguments
+    parser = argparse.ArgumentParser(description='Aggregate NWIS daily streamflow to monthly or annual means.')
+    parser.add_argument('obsfile', help='NWIS daily streamflow observation filename')
+    parser.add_argument('outfile', help='Output observation filename')
+    parser.add_argument('-t', '--statRepType', help='Statistic report type', choices=PERIODS, default='annual')
+    parser.add_argument('-v', '--value_col', help='Daily value column (default is the first one in the file)',
+                        default=None)
+    parser.add_argument('--missing_data', help='Compute means for periods with missing days',
+                        action='store_true')
+    parser.add_argument('--include-codes', help='Only use values with one of these qualification codes (e.g. A)',
+                        nargs='+', choices=list(QUALIFIER_CODES), default=None)
+    parser.add_argument('--exclude-codes', help='Do not use values with any of these qualification codes '
+                                                '(e.g. P e Ice)', nargs='+', choices=list(QUALIFIER_CODES), default=None)
+    parser.add_argument('-O', '--overwrite', help='Overwrite existing output file', action='store_true')
+
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.obsfile):
+        print(f'The streamflow observation file, {args.obsfile}, does not exist')
+        exit(1)
+
+    if not args.overwrite and os.path.isfile(args.outfile):
+        print(f'The streamflow observation file, {args.outfile}, already exists.\nTo force overwrite specify -O on command line')
+        exit(1)
+
+    logfile = f'{os.path.splitext(args.outfile)[0]}.log'
+    logging.basicConfig(filename=logfile, level=logging.INFO,
+                        format='%(levelname)s:%(asctime)s:%(message)s')
+
+    logging.info(f'Program executed {strftime("%Y-%m-%d %H:%M:%S %z")}')
+    logging.info(' '.join(sys.argv))
+    logging.info(f'Script version: {__version__}')
+    logging.info(f'Python: {platform.python_implementation()} ({platform.python_version()})')
+    logging.info(f'Host: {platform.node()}')
+    logging.info('-'*70)
+    logging.info(f' Observation file: {args.obsfile}')
+    logging.info(f'      Output file: {args.outfile}')
+
+    freq, value_col = obs_layout(args.obsfile)
+    if freq != 'D':
+        print(f'The observation file, {args.obsfile}, does not contain daily values')
+        exit(1)
+
+    if args.value_col is not None:
+        value_col = args.value_col
+
+    # Values which fail the qualification-code rule are treated as missing days
+    rule = QualifierRule(include=args.include_codes, exclude=args.exclude_codes)
+    usecols = ['agency_cd', 'site_no', 'datetime', value_col]
+    if rule.active():
+        if code_column(value_col) not in read_header(args.obsfile):
+            print(f'The observation file, {args.obsfile}, has no {code_column(value_col)} column')
+            exit(1)
+        usecols.append(code_column(value_col))
+
+    thedata = read_obs(args.obsfile, usecols=usecols)
+    masked = mask_values(thedata, value_col, rule) if rule.active() else 0
+
+    result = aggregate_daily(thedata, value_col, period=args.statRepType, missing_data=args.missing_data)
+
+    # Value columns are named <parameter>_<statistic> (e.g. 00060_00003)
+    parameter_cd = value_col.split('_')[-2]
+    agency_cd = thedata['agency_cd'].iloc[0] if len(thedata) > 0 else 'USGS'
+
+    out = to_stat_layout(result, agency_cd=agency_cd, parameter_cd=parameter_cd)
+    out.to_csv(args.outfile, sep='\t', index=False, float_format='%.3f')
+
+    logging.info(f'Report type: {args.statRepType}')
+    logging.info(f'Value column: {value_col}')
+    logging.info(f'Missing data allowed: {args.missing_data}')
+    logging.info(f'Qualification-code rule: {rule}')
+    logging.info(f'Values masked by qualification code: {masked}')
+    logging.info(f'Sites: {out["site_no"].nunique()}')
+    logging.info(f'Periods written: {len(out)}')
+
+    print(f'Summary written to {logfile}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""This script combines one or more NWIS observation files (e.g. several
+pulls of the same region) into a single file with one row per observation.
+Overlapping rows are resolved by precedence rules and sites with more than
+one time series (ts_id) can be reported, reduced to the longest series, or
+merged into it."""
+
+#      Author: Parker Norton (pnorton@usgs.gov)
+#        Date: 2026-10-19
+# Description: Replaces the line-by-line duplicate ts_id check in the
+#              'Find duplicate entries' notebook with a vectorized
+#              deduplicating merge.
+
+import os
+import platform
+import sys
+from time import strftime
+import argparse
+import logging
+import pandas as pd
+
+from pyNWIS.dedup import PRECEDENCE, TS_POLICIES, dedup_obs, read_pulls, series_summary
+
+__version__ = '0.1'
+__author__ = 'Parker Norton (pnorton@usgs.gov)'
+
+
+def main():
+    # Command line arguments
+    parser = argparse.ArgumentParser(description='Deduplicate and merge NWIS observation files.')
+    parser.add_argument('obsfiles', help='NWIS observation filenames, oldest pull first', nargs='+')
+    parser.add_argument('-o', '--outfile', help='Output observation filename', required=True)
+    parser.add_argument('-p', '--precedence', help='Rules for choosing between rows for the same observation, '
+                                                   'in order', nargs='+', choices=PRECEDENCE, default=PRECEDENCE)
+    parser.add_argument('--ts-policy', help='Handling of sites with more than one time series',
+                        choices=TS_POLICIES, default='keep')
+    parser.add_argument('--ts-report', help='Write the sites with more than one time series to this file',
+                        default=None)
+    parser.add_argument('-O', '--overwrite', help='Overwrite existing output file', action='store_true')
+
+    args = parser.parse_args()
+
+    for ff in args.obsfiles:
+        if not os.path.isfile(ff):
+            print(f'The streamflow observation file, {ff}, does not exist')
+            exit(1)
+
+    if not args.overwrite and os.path.isfile(args.outfile):
+        print(f'The streamflow observation file, {args.outfile}, already exists.\nTo force overwrite specify -O on command line')
+        exit(1)
+
+    logfile = f'{os.path.splitext(args.outfile)[0]}.log'
+    logging.basicConfig(filename=logfile, level=logging.INFO,
+                        format='%(levelname)s:%(asctime)s:%(message)s')
+
+    logging.info(f'Program executed {strftime("%Y-%m-%d %H:%M:%S %z")}')
+    logging.info(' '.join(sys.argv))
+    logging.info(f'Script version: {__version__}')
+    logging.info(f'Python: {platform.python_implementation()} ({platform.python_version()})')
+    logging.info(f'Host: {platform.node()}')
+    logging.info('-'*70)
+    for ff in args.obsfiles:
+        logging.info(f' Observation file: {ff}')
+    logging.info(f'      Output file: {args.outfile}')
+    logging.info(f'       Precedence: {", ".join(args.precedence)}')
+    logging.info(f'   ts_id handling: {args.ts_policy}')
+
+    freq, frames = read_pulls(args.obsfiles)
+
+    if 'ts_id' in frames[-1].columns:
+        multi = series_summary(pd.concat(frames, ignore_index=True), freq)
+        logging.info(f'Sites with more than one time series: {multi["site_no"].nunique()}')
+
+        if args.ts_report is not None:
+            multi.to_csv(args.ts_report, sep='\t', index=False)
+            logging.info(f'Time series report: {args.ts_report}')
+
+    df, counts = dedup_obs(frames, freq, precedence=args.precedence, ts_policy=args.ts_policy)
+    df.to_csv(args.outfile, sep='\t', index=False)
+
+    logging.info(f'Rows read: {counts["rows"]}')
+    logging.info(f'Rows dropped by the time series policy: {counts["ts_dropped"]}')
+    logging.info(f'Duplicate rows removed: {counts["rows"] - counts["ts_dropped"] - counts["kept"]}')
+    logging.info(f'Rows written: {counts["kept"]}')
+
+    print(f'Summary written to {logfile}')
+
+
+if __name__ == '__main__':
+    main()
@@ -13,14 +13,16 @@ Two data files are output
 import os
 import platform
 import sys
-import re
 from time import strftime
 import argparse
 import logging
 
 from collections import OrderedDict
-from urllib.request import urlopen   # , Request
-# from urllib.error import HTTPError
+
+from pyNWIS.hedging import HedgePolicy
+from pyNWIS.metrics import json_lines_hook
+from pyNWIS.nwis import BASE_URL, NWIS
+from pyNWIS.pipeline import stream_sites
 
 __version__ = '0.2'
 __author__ = 'Parker Norton (pnorton@usgs.gov)'
@@ -30,6 +32,14 @@ parser = argparse.ArgumentParser(description='Download streamflow observations f
 parser.add_argument('outfile', help='Output filename base (e.g. nwis.tab)')
 parser.add_argument('-O', '--overwrite', help='Overwrite existing output file', action='store_true')
 parser.add_argument('-R', '--region', help='Hydrologic Unit Code for stations to select')
+parser.add_argument('-j', '--jobs', help='Maximum number of concurrent downloads (default is the limit of the '
+                                         'adaptive concurrency control)', type=int, default=None)
+parser.add_argument('--hedge', help='Duplicate requests whose response is slower to start than the p95',
+                    action='store_true')
+parser.add_argument('--base-url', help='Root URL of the NWIS web services', default=BASE_URL)
+parser.add_argument('--metrics', help='Write a JSON line for every request to this file', default=None)
+parser.add_argument('--waterdata-url', help='Root URL of the NWIS Water Data service',
+                    default='https://nwis.waterdata.usgs.gov/usa/nwis')
 
 args = parser.parse_args()
 
@@ -76,10 +86,10 @@ logging.info(f'         Log file: {logfile}')
 # TODO: sometimes the URLs can change and a redirect is returned when trying to download
 #       data. We need to intercept this, print a warning and then use the new url for
 #       downloads.
-base_url = 'https://waterservices.usgs.gov/nwis'
+base_url = args.base_url.rstrip('/')
 
 # Peak values are currently only available through waterdata
-base_waterdata_url = 'https://nwis.waterdata.usgs.gov/usa/nwis'
+base_waterdata_url = args.waterdata_url.rstrip('/')
 
 # NOTE: Cannot use siteOutput=expanded for peakflow sites
 stn_pieces = OrderedDict()
@@ -105,25 +115,20 @@ logging.info(f'Station URL: {stn_url}')
 stn_hdl = open(stnfile, "w")
 obs_hdl = open(obsfile, "w")
 
-t1 = re.compile('^#.*$\n?', re.MULTILINE)   # remove comment lines
-t2 = re.compile('^5s.*$\n?', re.MULTILINE)  # remove field length lines
-
-# Retrieve stations from NWIS site service
-response = urlopen(stn_url)
-encoding = response.info().get_param('charset', failobj='utf8')
-streamgage_site_page = response.read().decode(encoding)
+# Requests retry transient errors (5xx, 429, resets, and timeouts)
+nwis = NWIS(hedge=HedgePolicy() if args.hedge else None)
+metrics_hdl = None
+if args.metrics is not None:
+    metrics_hdl = open(args.metrics, 'w')
+    nwis.metrics.add_hook(json_lines_hook(metrics_hdl))
 
-# Strip the comment lines and field length lines from the result
-streamgage_site_page = t1.sub('', streamgage_site_page, 0)
-streamgage_site_page = t2.sub('', streamgage_site_page, 0)
+# Retrieve stations from NWIS site service; comment lines and field length
+# lines are stripped from the result
+streamgage_site_page = nwis.get_rdb_page(stn_url)
 
 fld = {}
+site_lines = OrderedDict()   # site information line for each streamgage
 
-# Each request gives a new header; we only want one
-header_written = False
-
-logging.info('========== Streamgage observation URLs ==========')
-# Loop through each site and download the observations
 for cStreamgage in streamgage_site_page.split('\n'):
     if len(cStreamgage) > 0:
         ff = cStreamgage.split('\t')
@@ -137,37 +142,54 @@ for cStreamgage in streamgage_site_page.split('\n'):
             stn_hdl.write(cStreamgage + '\n')
             continue
 
-        obs_url = f'{base_waterdata_url}/peak/?format=rdb&site_no={ff[fld["site_no"]]}&'
-        # obs_url = '{0:s}/peak/?format=rdb&site_no={1:s}&'.format(base_waterdata_url, ff[fld['site_no']])
-        logging.info(obs_url)
-        sys.stdout.write(f'\rDownloading observations for streamgage: {ff[fld["site_no"]]}')
-        sys.stdout.flush()
-
-        # Read site data
-        response = urlopen(obs_url)
-        encoding = response.info().get_param('charset', failobj='utf8')
-        streamgage_obs_page = response.read().decode(encoding)
-
-        # Strip the comment lines and field length lines from the result using regex
-        streamgage_obs_page = t1.sub('', streamgage_obs_page, 0)
-        streamgage_obs_page = t2.sub('', streamgage_obs_page, 0)
-
-        # Write the streamgage observations to the output file
-        for obs in streamgage_obs_page.split('\n'):
-            if obs.split('\t')[0] == 'agency_cd':
-                # We only want a single header in the output file
-                if header_written:
-                    continue
-                else:
-                    header_written = True
-            if len(obs) > 0:
-                # waterdata site returns stupid dos line endings - strip them out
-                obs_hdl.write(obs.strip('\r') + '\n')
-
-        # Write the streamgage information file
-        stn_hdl.write(cStreamgage + '\n')
-        sys.stdout.write('\r' + ' '*60 + '\r')
+        site_lines[ff[fld['site_no']]] = cStreamgage
+
+
+def get_site_obs(site):
+    # Download the peak flows for a single site
+    obs_url = f'{base_waterdata_url}/peak/?format=rdb&site_no={site}&'
+    # obs_url = '{0:s}/peak/?format=rdb&site_no={1:s}&'.format(base_waterdata_url, ff[fld['site_no']])
+    logging.info(obs_url)
+    return nwis.get_rdb_page(obs_url)
+
+
+# Each request gives a new header; we only want one
+header_written = False
+
+logging.info('========== Streamgage observation URLs ==========')
+# Download the sites concurrently; the number of requests in flight
+# adapts to the server's latency and error rate
+for site, streamgage_obs_page in stream_sites(site_lines, get_site_obs, max_workers=args.jobs):
+    if streamgage_obs_page is None:
+        logging.warning(f'HTTPError: 404, no data for site {site} - SKIPPED')
+        continue
+
+    sys.stdout.write(f'\rDownloaded observations for streamgage: {site}')
+    sys.stdout.flush()
+
+    # Write the streamgage observations to the output file
+    for obs in streamgage_obs_page.split('\n'):
+        if obs.split('\t')[0] == 'agency_cd':
+            # We only want a single header in the output file
+            if header_written:
+                continue
+            else:
+                header_written = True
+        if len(obs) > 0:
+            # waterdata site returns stupid dos line endings - strip them out
+            obs_hdl.write(obs.strip('\r') + '\n')
+
+    # Write the streamgage information file
+    stn_hdl.write(site_lines[site] + '\n')
+    sys.stdout.write('\r' + ' '*60 + '\r')
 stn_hdl.close()
 obs_hdl.close()
 
+if nwis.hedge is not None:
+    logging.info(nwis.hedge.summary())
+for line in nwis.metrics.summary():
+    logging.info(line)
+if metrics_hdl is not None:
+    metrics_hdl.close()
+
 print(f'Summary written to {logfile}')
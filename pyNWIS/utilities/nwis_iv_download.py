@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""This script downloads instantaneous (e.g. 15-minute) streamflow values
+from the NWIS REST service for a set of streamgages. The values are stored
+in a directory of compressed numpy archives, one per streamgage and month,
+and the streamgage information is written to a tab-delimited file."""
+
+#      Author: Parker Norton (pnorton@usgs.gov)
+#        Date: 2026-10-19
+# Description: Downloads instantaneous values in month-sized chunks which
+#              are requested in parallel and written to the store as they
+#              arrive, so long records do not have to fit in memory.
+
+import os
+import platform
+import sys
+from time import perf_counter, strftime
+import argparse
+import logging
+
+from collections import OrderedDict
+
+from pyNWIS.hedging import HedgePolicy
+from pyNWIS.iv import InstantaneousValues, IVStore
+from pyNWIS.metrics import json_lines_hook
+from pyNWIS.nwis import BASE_URL
+
+__version__ = '0.1'
+__author__ = 'Parker Norton (pnorton@usgs.gov)'
+
+
+def main():
+    # Command line arguments
+    parser = argparse.ArgumentParser(description='Download instantaneous streamflow values from NWIS REST service.')
+    parser.add_argument('outdir', help='Output directory for the instantaneous-value store')
+    parser.add_argument('-d', '--daterange',
+                        help='Starting and ending date (YYYY-MM-DD YYYY-MM-DD)',
+                        nargs=2, metavar=('startDate', 'endDate'), required=True)
+    parser.add_argument('-O', '--overwrite', help='Overwrite an existing store', action='store_true')
+    parser.add_argument('-P', '--parameters', help='Space separated list of parameter codes', nargs='+',
+                        default=['00060'], type=str)
+    parser.add_argument('-R', '--region', help='Hydrologic Unit Code for stations to select',
+                        default=None, type=str)
+    parser.add_argument('-S', '--sites', help='Space separated list of streamgages', nargs='+',
+                        default=None, type=str)
+    parser.add_argument('-m', '--months', help='Number of months requested at a time for each streamgage',
+                        type=int, default=1)
+    parser.add_argument('-j', '--jobs', help='Maximum number of concurrent downloads (default is the limit of the '
+                                             'adaptive concurrency control)', type=int, default=None)
+    parser.add_argument('--resume', help='Skip months which are already in the store', action='store_true')
+    parser.add_argument('--hedge', help='Duplicate requests whose response is slower to start than the p95',
+                        action='store_true')
+    parser.add_argument('--base-url', help='Root URL of the NWIS web services', default=BASE_URL)
+    parser.add_argument('--metrics', help='Write a JSON line for every request to this file', default=None)
+    parser.add_argument('--show_restricted', help='Retrieved parameters/values that have access restrictions',
+                        action='store_true')
+
+    args = parser.parse_args()
+
+    if args.region is not None:
+        args.sites = None
+    elif args.sites is None:
+        print('Either a region (-R) or a list of streamgages (-S) is required')
+        exit(1)
+
+    stnfile = os.path.join(args.outdir, 'nwis_iv_stn.tab')
+    logfile = os.path.join(args.outdir, 'nwis_iv.log')
+
+    if not args.overwrite and not args.resume and os.path.isfile(stnfile):
+        print(f'The instantaneous-value store, {args.outdir}, already exists.\n'
+              f'To force overwrite specify -O on command line or use --resume')
+        exit(1)
+
+    store = IVStore(args.outdir)
+
+    print(f'Instantaneous-value store: {args.outdir}')
+    print(f'Streamgage information file: {stnfile}')
+    print(f'Session log file: {logfile}')
+
+    # Open logfile and start collecting basic information to write out later
+    logging.basicConfig(filename=logfile, level=logging.INFO,
+                        format='%(levelname)s:%(asctime)s:%(message)s')
+
+    logging.info(f'Program executed {strftime("%Y-%m-%d %H:%M:%S %z")}')
+    logging.info(" ".join(sys.argv))
+    logging.info(f'Script version: {__version__}')
+    logging.info(f'Script directory: {os.path.dirname(os.path.abspath(__file__))}')
+    logging.info(f'Python: {platform.python_implementation()} ({platform.python_version()})')
+    logging.info(f'Host: {platform.node()}')
+    logging.info('-'*70)
+    logging.info(f'Current directory: {os.getcwd()}')
+    logging.info(f'Instantaneous-value store: {args.outdir}')
+    logging.info(f'Station info file: {stnfile}')
+    logging.info(f'         Log file: {logfile}')
+
+    # URLs can be generated/tested at: http://waterservices.usgs.gov/rest/Site-Test-Tool.html
+    base_url = args.base_url.rstrip('/')
+
+    stn_pieces = OrderedDict()
+    stn_pieces['format'] = 'rdb'
+
+    if args.region is not None:
+        stn_pieces['huc'] = args.region
+    else:
+        stn_pieces['sites'] = ','.join([ii for ii in args.sites])
+
+    stn_pieces['siteOutput'] = 'expanded'
+    stn_pieces['siteStatus'] = 'all'
+    stn_pieces['parameterCd'] = ','.join([ii for ii in args.parameters])
+    stn_pieces['siteType'] = 'ST'
+    stn_pieces['hasDataTypeCd'] = 'iv'
+    stn_final = '&'.join([f'{kk}={vv}' for kk, vv in stn_pieces.items()])
+
+    stn_url = f'{base_url}/site/?{stn_final}'
+
+    logging.info(f'Region: {args.region}')
+    logging.info(f'Sites: {args.sites}')
+    logging.info(f'Parameters: {args.parameters}')
+    logging.info(f'Date range: {args.daterange[0]} to {args.daterange[1]}')
+    logging.info(f'Months per request: {args.months}')
+    logging.info('-'*70)
+    logging.info(f'Base URL: {base_url}')
+    logging.info(f'Station URL: {stn_url}')
+
+    # Requests retry transient errors (5xx, 429, resets, and timeouts)
+    nwis = InstantaneousValues(parameters=args.parameters, months=args.months, show_restricted=args.show_restricted,
+                               hedge=HedgePolicy() if args.hedge else None, base_url=base_url)
+    metrics_hdl = None
+    if args.metrics is not None:
+        metrics_hdl = open(args.metrics, 'w')
+        nwis.metrics.add_hook(json_lines_hook(metrics_hdl))
+
+    # Retrieve stations from NWIS site service; comment lines and field length
+    # lines are stripped from the result
+    streamgage_site_page = nwis.get_rdb_page(stn_url)
+
+    fld = {}
+    site_lines = OrderedDict()   # site information line for each streamgage
+
+    with open(stnfile, 'w') as stn_hdl:
+        for cStreamgage in streamgage_site_page.split('\n'):
+            if len(cStreamgage) > 0:
+                ff = cStreamgage.split('\t')
+                if ff[0] == 'agency_cd':
+                    # Get the fieldnames for the site information
+                    fld = {sf: cc for cc, sf in enumerate(ff)}
+                    stn_hdl.write(cStreamgage + '\n')
+                    continue
+
+                site_lines[ff[fld['site_no']]] = cStreamgage
+                stn_hdl.write(cStreamgage + '\n')
+
+    logging.info(f'Streamgages: {len(site_lines)}')
+    logging.info('========== Instantaneous-value chunks ==========')
+
+    # Each site's date range is requested in chunks; the chunks for all the
+    # sites are downloaded concurrently and stored in order
+    counts = {'chunks': 0, 'skipped': 0, 'empty': 0, 'values': 0}
+    start_time = perf_counter()
+
+    for site, start, end, nrows in nwis.download(site_lines, args.daterange[0], args.daterange[1], store,
+                                                 max_workers=args.jobs, resume=args.resume):
+        if nrows is None:
+            counts['skipped'] += 1
+            continue
+
+        counts['chunks'] += 1
+        counts['values'] += nrows
+        if nrows == 0:
+            counts['empty'] += 1
+            logging.warning(f'No values for site {site} from {start} to {end}')
+
+        sys.stdout.write(f'\rStored {site} {start} to {end} ({counts["values"]} values)')
+        sys.stdout.flush()
+    sys.stdout.write('\r' + ' '*70 + '\r')
+
+    elapsed = perf_counter() - start_time
+    store_bytes = sum(os.path.getsize(store.path(ss, mm)) for ss in store.sites() for mm in store.months(ss))
+
+    logging.info('-'*70)
+    logging.info(f'Chunks downloaded: {counts["chunks"]} ({counts["empty"]} without values)')
+    logging.info(f'Chunks already stored: {counts["skipped"]}')
+    logging.info(f'Values stored: {counts["values"]} in {elapsed:.1f} s')
+    logging.info(f'Store size: {store_bytes / 2**20:.1f} MB')
+
+    if nwis.hedge is not None:
+        logging.info(nwis.hedge.summary())
+    for line in nwis.metrics.summary():
+        logging.info(line)
+    if metrics_hdl is not None:
+        metrics_hdl.close()
+
+    print(f'Summary written to {logfile}')
+
+
+if __name__ == '__main__':
+    main()
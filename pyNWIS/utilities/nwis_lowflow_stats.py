@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""This script computes low-flow (e.g. 7Q10) and flow-duration statistics
+for every streamgage in a file of daily values downloaded with
+nwis_daily_rest.py. Results and associated station information are
+written to a tab-delimited output file."""
+
+#      Author: Parker Norton (pnorton@usgs.gov)
+#        Date: 2026-10-19
+# Description: Computes N-day rolling minimums, the annual minimum series,
+#              the N-day, T-year low flow and flow-duration percentiles for
+#              all sites in one pass over the daily values.
+
+import os
+import platform
+import sys
+import argparse
+from time import strftime
+
+from pyNWIS.lowflow import DURATION_PCTS, daily_series, lowflow_statistics
+from pyNWIS.obsfiles import STN_COLUMNS, obs_layout, read_header, read_obs, read_stn
+from pyNWIS.qualifiers import QUALIFIER_CODES, QualifierRule, code_column, mask_values
+
+__version__ = '0.1'
+__author__ = 'Parker Norton (pnorton@usgs.gov)'
+
+
+def main():
+    # Command line arguments
+    parser = argparse.ArgumentParser(description='Compute low-flow statistics from NWIS daily streamflow')
+    parser.add_argument('obsfile', help='NWIS daily streamflow filename')
+    parser.add_argument('stnfile', help='NWIS streamgage information filename')
+    parser.add_argument('outfile', help='Output filename prefix for statistics')
+    parser.add_argument('-n', '--ndays', help='Number of days in the low-flow averaging period',
+                        type=int, default=7)
+    parser.add_argument('-r', '--recurrence', help='Recurrence interval (years) for the low-flow statistic',
+                        type=int, default=10)
+    parser.add_argument('-m', '--start_month', help='First month of the climatic year', type=int, default=4)
+    parser.add_argument('--include-codes', help='Only use values with one of these qualification codes (e.g. A)',
+                        nargs='+', choices=list(QUALIFIER_CODES), default=None)
+    parser.add_argument('--exclude-codes', help='Do not use values with any of these qualification codes '
+                                                '(e.g. P e Ice)', nargs='+', choices=list(QUALIFIER_CODES), default=None)
+    parser.add_argument('-O', '--overwrite', help='Overwrite existing output file', action='store_true')
+
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.obsfile):
+        print(f'The streamflow observation file, {args.obsfile}, does not exist')
+        exit(1)
+
+    if not os.path.isfile(args.stnfile):
+        print(f'The streamgage information file, {args.stnfile}, does not exist')
+        exit(1)
+
+    statsfile = f'{args.outfile}_lowflow.tab'
+    if not args.overwrite and os.path.isfile(statsfile):
+        print('Output filename exists. To force overwrite specify -O on command line')
+        exit(1)
+
+    log_list = []
+    log_list.append('='*70)
+    log_list.append(f'Program executed {strftime("%Y-%m-%d %H:%M:%S %z")}')
+    log_list.append('-'*70)
+    log_list.append(' '.join(sys.argv))
+    log_list.append('-'*70)
+    log_list.append(f'Script version: {__version__}')
+    log_list.append(f'Python: {platform.python_implementation()} ({platform.python_version()})')
+    log_list.append(f'Host: {platform.node()}')
+    log_list.append('-'*70)
+    log_list.append(f' Observation file: {args.obsfile}')
+    log_list.append(f'Station info file: {args.stnfile}')
+    log_list.append(f'      Output file: {statsfile}')
+    log_list.append(f'Low-flow statistic: {args.ndays}Q{args.recurrence}')
+    log_list.append(f'Climatic year starts in month: {args.start_month}')
+
+    freq, value_col = obs_layout(args.obsfile)
+    if freq != 'D':
+        print(f'The observation file, {args.obsfile}, does not contain daily values')
+        exit(1)
+
+    stations = read_stn(args.stnfile, usecols=STN_COLUMNS)
+    stations.set_index('site_no', inplace=True)
+
+    # Values which fail the qualification-code rule are treated as missing days
+    rule = QualifierRule(include=args.include_codes, exclude=args.exclude_codes)
+    usecols = ['site_no', 'datetime', value_col]
+    if rule.active():
+        if code_column(value_col) not in read_header(args.obsfile):
+            print(f'The observation file, {args.obsfile}, has no {code_column(value_col)} column')
+            exit(1)
+        usecols.append(code_column(value_col))
+
+    thedata = read_obs(args.obsfile, usecols=usecols)
+    masked = mask_values(thedata, value_col, rule) if rule.active() else 0
+    log_list.append(f'Qualification-code rule: {rule}')
+    log_list.append(f'Values masked by qualification code: {masked}')
+
+    sitedata = daily_series(thedata, value_col)
+
+    stats = lowflow_statistics(sitedata, ndays=args.ndays, recurrence=args.recurrence,
+                               year_start_month=args.start_month, pcts=DURATION_PCTS)
+
+    # Merge the site information with the statistics
+    merged_df = stations.join(stats, how='right')
+    merged_df.to_csv(statsfile, sep='\t', float_format='%1.5f', header=True, index=True)
+
+    log_list.append('-'*70)
+    log_list.append(f'Sites: {len(stats)}')
+    log_list.append(f'Sites with {args.ndays}Q{args.recurrence}: {stats[f"{args.ndays}Q{args.recurrence}"].notna().sum()}')
+    log_list.append('='*70)
+
+    logfile = f'{args.outfile}.log'
+    with open(logfile, 'w') as loghdl:
+        for xx in log_list:
+            print(xx)
+            loghdl.write(xx + '\n')
+    print(f'Summary written to {logfile}')
+
+
+if __name__ == '__main__':
+    main()
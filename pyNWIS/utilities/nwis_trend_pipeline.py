@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""This script downloads annual streamflow statistics from the NWIS REST
+service for a given Hydrologic Unit Code and computes the Kendall tau for
+each streamgage as its data arrives. Results and associated station
+information are written to a tab-delimited output file; the downloaded
+observations are only written when requested."""
+
+#      Author: Parker Norton (pnorton@usgs.gov)
+#        Date: 2026-10-19
+# Description: Streams per-site annual statistics from the NWIS stat service
+#              into the trend engine so computation overlaps with downloading
+#              and no intermediate text files are needed.
+
+import os
+import platform
+import sys
+import argparse
+from collections import Counter
+from time import strftime
+
+from pyNWIS.completeness import CompletenessRule, write_report
+from pyNWIS.hedging import HedgePolicy
+from pyNWIS.metrics import DEFAULT_METRICS, json_lines_hook
+from pyNWIS.nwis import BASE_URL
+from pyNWIS.obsfiles import STN_COLUMNS, stn_types
+from pyNWIS.pipeline import annual_window, trend_pipeline
+from pyNWIS.profiling import PROFILERS, RunProfiler, StageTimer
+from pyNWIS.sites import Sites
+from pyNWIS.stats import Statistics
+
+__version__ = '0.1'
+__author__ = 'Parker Norton (pnorton@usgs.gov)'
+
+
+def main():
+    # Command line arguments
+    parser = argparse.ArgumentParser(description='Download NWIS annual streamflow and compute Kendall tau')
+    parser.add_argument('outfile', help='Output filename prefix for stats')
+    parser.add_argument('-R', '--region', help='Hydrologic Unit Code for stations to select', required=True)
+    parser.add_argument('-w', '--wateryears', help='Observations are stored by water years', action='store_true')
+    parser.add_argument('-d', '--daterange',
+                        help='Starting and ending calendar date (YYYY-MM-DD YYYY-MM-DD)',
+                        nargs=2, metavar=('startDate', 'endDate'), required=True)
+    parser.add_argument('-p', '--pval', help='Maximum p-value', type=float, required=True)
+    parser.add_argument('-j', '--jobs', help='Maximum number of concurrent downloads (default is the limit of the '
+                                             'adaptive concurrency control)', type=int, default=None)
+    parser.add_argument('--hedge', help='Duplicate requests whose response is slower to start than the p95',
+                        action='store_true')
+    parser.add_argument('--base-url', help='Root URL of the NWIS web services', default=BASE_URL)
+    parser.add_argument('--metrics', help='Write a JSON line for every request to this file', default=None)
+    parser.add_argument('-O', '--overwrite', help='Overwrite existing output file', action='store_true')
+    parser.add_argument('--min-count', help='Minimum number of years with observations (default is period of record)',
+                        type=int, default=None)
+    parser.add_argument('--min-pct', help='Minimum percentage of years with observations', type=float, default=None)
+    parser.add_argument('--max-gap', help='Maximum number of consecutive missing years', type=int, default=None)
+    parser.add_argument('--keep-files', help='Also write the downloaded observation and station files',
+                        action='store_true')
+    parser.add_argument('--show_restricted', help='Retrieved parameters/values that have access restrictions',
+                        action='store_true')
+    parser.add_argument('--trace-memory', help='Log the peak memory of each stage (slower)', action='store_true')
+    parser.add_argument('--profile', help='Write a profile of the whole run to this file', default=None)
+    parser.add_argument('--profiler', help='Profiler used for --profile', choices=PROFILERS, default='cprofile')
+
+    args = parser.parse_args()
+
+    kendallfile = f'{args.outfile}_kendall.tab'
+    if not args.overwrite and os.path.isfile(kendallfile):
+        print('Output filename exists. To force overwrite specify -O on command line')
+        exit(1)
+
+    profiler = None
+    if args.profile is not None:
+        profiler = RunProfiler(args.profile, args.profiler).start()
+    timer = StageTimer(memory=args.trace_memory)
+
+    log_list = []
+    log_list.append('='*70)
+    log_list.append(f'Program executed {strftime("%Y-%m-%d %H:%M:%S %z")}')
+    log_list.append('-'*70)
+    log_list.append(' '.join(sys.argv))
+    log_list.append('-'*70)
+    log_list.append(f'Script version: {__version__}')
+    log_list.append(f'Python: {platform.python_implementation()} ({platform.python_version()})')
+    log_list.append(f'Host: {platform.node()}')
+    log_list.append('-'*70)
+    log_list.append(f'Region: {args.region}')
+    log_list.append(f'Water years: {args.wateryears}')
+    log_list.append(f'      Output file: {kendallfile}')
+
+    win_years = annual_window(args.daterange[0], args.daterange[1], wateryears=args.wateryears)
+    if len(win_years) == 0:
+        print('The date range does not contain a complete year')
+        exit(1)
+
+    # Compute the period of record for this date range
+    por = int(args.daterange[1][0:4]) - int(args.daterange[0][0:4])
+    min_count = por if args.min_count is None else args.min_count
+    rule = CompletenessRule(min_count=min_count, min_pct=args.min_pct, max_gap=args.max_gap)
+
+    metrics_hdl = None
+    if args.metrics is not None:
+        metrics_hdl = open(args.metrics, 'w')
+        DEFAULT_METRICS.add_hook(json_lines_hook(metrics_hdl))
+
+    # Retrieve stations from NWIS site service
+    with timer.stage('sites'):
+        stations = Sites(base_url=args.base_url).get_region_sites(args.region)
+    log_list.append(f'Streamgages in region: {len(stations)}')
+
+    stat_service = Statistics(args.daterange[0], args.daterange[1], report_type='annual',
+                              wateryears=args.wateryears, show_restricted=args.show_restricted,
+                              hedge=HedgePolicy() if args.hedge else None, base_url=args.base_url)
+
+    obs_hdl = None
+    if args.keep_files:
+        stations.to_csv(f'{args.outfile}_stn.tab', sep='\t', index=False)
+        obs_hdl = open(f'{args.outfile}_obs.tab', 'w')
+
+    # Downloads overlap the trend computations so they are timed as one stage
+    with timer.stage('download_trends'):
+        testdf, report = trend_pipeline(stations['site_no'].astype(str), stat_service.get_site_stats,
+                                        win_years, rule, args.pval, wateryears=args.wateryears,
+                                        max_workers=args.jobs, obs_hdl=obs_hdl)
+
+    if obs_hdl is not None:
+        obs_hdl.close()
+
+    if stat_service.hedge is not None:
+        log_list.append(stat_service.hedge.summary())
+    log_list.extend(DEFAULT_METRICS.summary())
+    if metrics_hdl is not None:
+        metrics_hdl.close()
+
+    if len(report) > 0:
+        write_report(report, f'{args.outfile}_completeness.tab')
+        log_list.append(f'Completeness rule: {rule}')
+        log_list.append(f'Complete timeseries: {report["complete"].sum()} of {len(report)}')
+
+    rescount = Counter()    # counters for summary of results
+    rescount['total'] = len(testdf)
+    if len(testdf) > 0:
+        rescount['up'] = int((testdf['trend'] == 1).sum())
+        rescount['down'] = int((testdf['trend'] == -1).sum())
+
+    log_list.append('-'*70)
+    log_list.append(f'Trends summary (total/up/down): {args.outfile},{rescount["total"]},{rescount["up"]},{rescount["down"]}')
+
+    with timer.stage('write_results'):
+        # Merge the site information with the trend results
+        stations = stn_types(stations[[cc for cc in STN_COLUMNS if cc in stations.columns]].astype(str))
+        stations.set_index('site_no', inplace=True)
+
+        merged_df = stations.merge(testdf, left_index=True, right_index=True, how='right')
+        merged_df.to_csv(kendallfile, sep='\t', float_format='%1.5f', header=True, index=True)
+
+    log_list.append('-'*70)
+    log_list.extend(timer.summary())
+    if profiler is not None:
+        profiler.stop()
+        log_list.extend(profiler.summary())
+    log_list.append('='*70)
+
+    logfile = f'{args.outfile}.log'
+    with open(logfile, 'w') as loghdl:
+        for xx in log_list:
+            print(xx)
+            loghdl.write(xx + '\n')
+    print(f'Summary written to {logfile}')
+
+
+if __name__ == '__main__':
+    main()
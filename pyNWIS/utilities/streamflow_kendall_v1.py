@@ -27,51 +27,42 @@ import kendall_cy as nr3
 from dateutil.relativedelta import relativedelta
 from time import strftime
 import argparse
-import calendar
 from collections import Counter
 
+from pyNWIS.cache import ResultCache, source_digest
+from pyNWIS.calendars import year_end
+from pyNWIS.obsfiles import STN_COLUMNS, read_obs, read_stn
+from pyNWIS.completeness import CompletenessRule, completeness_report, filter_complete, write_report
+from pyNWIS.profiling import PROFILERS, RunProfiler, StageTimer
+from pyNWIS.ragged import RaggedSeries
+from pyNWIS.trends import kendall_trends
+from pyNWIS.trends import __version__ as trends_version
+from pyNWIS.windows import window_statistics
+
 __author__ = 'Parker Norton (pnorton@usgs.gov)'
 __version__ = '0.2'
 
-# 2015-10-14 PAN: Until I figure out how to properly deal with 
-#                 computing dates for both water years and
-#                 calender years I'll have to have two versions
-#                 of the dparse routine.
-
-
-def dparse_wy(*dstr):
-    # The water year version of dparse is only intended for working
-    # with annual data. The monthly and daily dates are always
-    # based on a calender year.
-    dint = [int(x) for x in dstr]
-
-    if len(dint) == 1:
-        # For annual we want the last day of the year
-        dint.append(9)
-        dint.append(calendar.monthrange(*dint)[1])
-
-    return datetime.datetime(*dint)
+# Modules whose code affects the results; cached results are keyed on their source
+CACHE_MODULES = ['pyNWIS.calendars', 'pyNWIS.completeness', 'pyNWIS.obsfiles', 'pyNWIS.ragged',
+                 'pyNWIS.trends', 'pyNWIS.windows', 'kendall_cy']
 
 
-def dparse(*dstr):
-    dint = [int(x) for x in dstr]
-
-    if len(dint) == 2:
-        # For months we want the last day of each month
-        dint.append(calendar.monthrange(*dint)[1])
-    if len(dint) == 1:
-        # For annual we want the last day of the year
-        dint.append(12)
-        dint.append(calendar.monthrange(*dint)[1])
-
-    return datetime.datetime(*dint)
-
+def write_log(log_list, loghdl, logfile, timer=None, profiler=None):
+    # Write the log file, with the stage timings and profile summary when given
+    if timer is not None and len(timer.times) > 0:
+        log_list.append('-'*70)
+        log_list.extend(timer.summary())
+    if profiler is not None:
+        profiler.stop()
+        log_list.append('-'*70)
+        log_list.extend(profiler.summary())
+    log_list.append('='*70)
 
-def wyr_to_datetime(yr):
-    """This function takes a water year and returns a datetime object
-     of the last day of that water year"""
-    dt = datetime.datetime(yr, 9, 30)
-    return dt
+    for xx in log_list:
+        print(xx)
+        loghdl.write(xx + '\n')
+    loghdl.close()
+    print("Summary written to %s" % logfile)
 
 
 def main():
@@ -86,9 +77,23 @@ def main():
                         nargs=2, metavar=('startDate', 'endDate'), required=True)
     parser.add_argument('-p', '--pval', help='Maximum p-value', type=float, required=True)
     parser.add_argument('-O', '--overwrite', help='Overwrite existing output file', action='store_true')
+    parser.add_argument('--min-count', help='Minimum number of years with observations (default is period of record)',
+                        type=int, default=None)
+    parser.add_argument('--min-pct', help='Minimum percentage of years with observations', type=float, default=None)
+    parser.add_argument('--max-gap', help='Maximum number of consecutive missing years', type=int, default=None)
+    parser.add_argument('--cache-dir', help='Directory for cached results (default is ~/.cache/pyNWIS)', default=None)
+    parser.add_argument('--no-cache', help='Do not use or update cached results', action='store_true')
+    parser.add_argument('--trace-memory', help='Log the peak memory of each stage (slower)', action='store_true')
+    parser.add_argument('--profile', help='Write a profile of the whole run to this file', default=None)
+    parser.add_argument('--profiler', help='Profiler used for --profile', choices=PROFILERS, default='cprofile')
 
     args = parser.parse_args()
 
+    profiler = None
+    if args.profile is not None:
+        profiler = RunProfiler(args.profile, args.profiler).start()
+    timer = StageTimer(memory=args.trace_memory)
+
     if not os.path.isfile(args.obsfile):
         print("The streamflow observation file, %s, does not exist" % args.obsfile)
         exit(1)
@@ -123,114 +128,108 @@ def main():
     st = datetime.datetime(*(map(int, args.daterange[0].split('-'))))
     en = datetime.datetime(*(map(int, args.daterange[1].split('-'))))
 
+    # Years (as period-end dates) which fall within the period of interest
+    win_years = np.arange(st.year, en.year + 1)
+    win_ends = year_end(win_years, wateryears=args.wateryears)
+    win_years = win_years[(win_ends >= np.datetime64(st, 'D')) & (win_ends <= np.datetime64(en, 'D'))]
+
+    if len(win_years) == 0:
+        print('The date range does not contain a complete year')
+        log_list.append('The date range does not contain a complete year')
+        write_log(log_list, loghdl, logfile, timer, profiler)
+        exit(1)
+
     # Compute the period of record for this date range
     por = en.year - st.year
     # if not args.wateryears:
     #    por += 1    # For calendar years we need to add one year
 
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-    # Read in the streamgage information
-    stn_col_names = ['site_no', 'station_nm', 'dec_lat_va', 'dec_long_va',
-                     'drain_area_va', 'contrib_drain_area_va']
-    stn_col_types = [np.str_, np.str_, np.float_, np.float_, np.float_, np.float_]
-    stn_cols = dict(zip(stn_col_names, stn_col_types))
-
-    stations = pd.read_csv(args.stnfile, sep='\t', usecols=stn_col_names,
-                           dtype=stn_cols)
-
-    stations.set_index('site_no', inplace=True)
+    # Reuse the results from a previous run when the input files and parameters
+    # are unchanged.
+    outputs = {sfx: '%s%s' % (args.outfile, sfx) for sfx in ['_kendall.tab', '_obs.tab', '_completeness.tab']}
+    cache_params = {'script': os.path.basename(__file__),
+                    'version': __version__,
+                    'engine_version': trends_version,
+                    'kendall_version': getattr(nr3, '__version__', None),
+                    'source': source_digest(CACHE_MODULES, files=[__file__]),
+                    'daterange': args.daterange,
+                    'wateryears': args.wateryears,
+                    'pval': args.pval,
+                    'min_count': args.min_count,
+                    'min_pct': args.min_pct,
+                    'max_gap': args.max_gap}
+
+    if not args.no_cache:
+        cache = ResultCache(args.cache_dir)
+        with timer.stage('cache_key'):
+            cache_key = cache.key([args.obsfile, args.stnfile], cache_params)
+
+        if cache.fetch(cache_key, outputs):
+            log_list.append('-'*70)
+            log_list.append('Results restored from cache: %s' % cache_key)
+            write_log(log_list, loghdl, logfile, timer, profiler)
+            return
 
-    # Have to force numeric conversion after the fact when there are
-    # null values in a column
-    for dd in stations.columns:
-        if stn_cols[dd] == np.float_:
-            stations[dd] = pd.to_numeric(stations[dd], errors='coerce')
-            # stations[dd] = stations[dd].convert_objects(convert_numeric='force')
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    # Read in the streamgage information
+    # Numeric columns are converted in a single step by read_stn; null values become NaN
+    with timer.stage('read_stn'):
+        stations = read_stn(args.stnfile, usecols=STN_COLUMNS)
+        stations.set_index('site_no', inplace=True)
 
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-    # Import the streamflow data. Use a custom date parser to create datetime values
-    # at the end of each water year.
-    # The usecols parameter is assuming that site_no, dd_nu, year_nu, and mean_va
-    # are in columns 1,3,4,5, respectively (assuming zero-based indexing).
+    # Import the streamflow data using compact dtypes (categorical site_no,
+    # int16 year_nu, float32 mean_va) and create datetime values at the end of
+    # each year (or water year, ending September 30).
     # agency_cd	site_no	parameter_cd	ts_id	loc_web_ds	year_nu	mean_va
     obs_col_names = ['site_no', 'ts_id', 'year_nu', 'mean_va']
-    obs_col_types = [np.str_, np.int16, np.int16, np.float64]
-    obs_cols = dict(zip(obs_col_names, obs_col_types))
-
-    # thedata = pd.read_csv(args.obsfile, sep='\t', usecols=obs_col_names, dtype=obs_cols)
-    if args.wateryears:
-        # We use a different version of the dparse routine when
-        # working with observation dates (years) given in water years.
-        thedata = pd.read_csv(args.obsfile, sep='\t', usecols=obs_col_names, dtype=obs_cols,
-                              date_parser=dparse_wy, parse_dates={'wyear': ['year_nu']},
-                              index_col='wyear', keep_date_col=True)
-    else:
-        thedata = pd.read_csv(args.obsfile, sep='\t', usecols=obs_col_names, dtype=obs_cols,
-                              date_parser=dparse, parse_dates={'wyear': ['year_nu']},
-                              index_col='wyear', keep_date_col=True)
-
-    # Have to force numeric conversion after the fact when there are
-    # null values in a column
-    # for dd in thedata.columns:
-    #    print dd, thedata[dd].dtype
-
-    # Select only the observations that are within our period of interest
-    thedata = thedata[(thedata.index >= st) & (thedata.index <= en)]
-
-    # Group by site_no and dd_nu. Filter by sites that don't have enough observations
-    # in the period of interest
-    thedata = thedata.groupby(['site_no', 'ts_id']).filter(lambda x: len(x) >= por)
+    with timer.stage('read_obs'):
+        thedata = read_obs(args.obsfile, usecols=obs_col_names)
+
+    with timer.stage('dates'):
+        thedata['wyear'] = pd.to_datetime(year_end(thedata['year_nu'], wateryears=args.wateryears))
+        thedata.set_index('wyear', inplace=True)
+
+        # Select only the observations that are within our period of interest
+        thedata = thedata[(thedata.index >= st) & (thedata.index <= en)]
+
+    # Filter out the timeseries (site_no, ts_id) that don't have a complete enough
+    # record in the period of interest
+    min_count = por if args.min_count is None else args.min_count
+    rule = CompletenessRule(min_count=min_count, min_pct=args.min_pct, max_gap=args.max_gap)
+
+    with timer.stage('completeness'):
+        thedata['period'] = thedata.index.year
+        report = completeness_report(thedata, 'period', min(win_years), max(win_years))
+        thedata, report = filter_complete(thedata, report, rule)
+
+        write_report(report, '%s_completeness.tab' % args.outfile)
+    log_list.append('Completeness rule: %s' % rule)
+    log_list.append('Complete timeseries: %d of %d' % (report['complete'].sum(), len(report)))
 
     # ------------------------------------------------------------------------
     # Write out the annual observations
-    thedata.reset_index().to_csv('%s_obs.tab' % args.outfile, sep='\t', index=False,
-                                 header=['siteno', 'date', 'waterYr', 'avgQ'],
-                                 float_format='%.3f',
-                                 columns=['site_no', 'wyear', 'year_nu', 'mean_va'])
+    with timer.stage('write_obs'):
+        thedata.reset_index().to_csv('%s_obs.tab' % args.outfile, sep='\t', index=False,
+                                     header=['siteno', 'date', 'waterYr', 'avgQ'],
+                                     float_format='%.3f',
+                                     columns=['site_no', 'wyear', 'year_nu', 'mean_va'])
 
-    # Pivot the table so waterYr is the row index and each site is a column
-    sitedataByCol = thedata.reset_index().pivot(index='wyear', columns='site_no', values='mean_va')
+    # Store each site's record as a ragged array indexed by year instead of
+    # pivoting to a dense (year x site) table
+    with timer.stage('ragged'):
+        sitedata = RaggedSeries.from_frame(thedata, 'mean_va', freq='Y')
 
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-    # Create a sequence of numbers same total size as npdata
-    thetime = sitedataByCol.index.to_julian_date().values
+    # Compute Kendall tau for each site
+    with timer.stage('kendall'):
+        testdf = kendall_trends(sitedata, args.pval, kendall=nr3.kendall_numpy)
 
-    # Create a dictionary for the results
-    outdata = {'site_no': [], 'pval': [], 'tau': [], 'trend': []}
     rescount = Counter()    # counters for summary of results
-    # rescount = {'total':0, 'up':0, 'down':0}    # counters for summary of results
-
-    # Loop through each column and compute Kendall Tau
-    for tt in sitedataByCol.columns:
-        rescount['total'] += 1
-        npdata = sitedataByCol[tt].values
-
-        # Compute Kendall tau for this site
-        # result indices: tau,0; svar,1; z,2; pval,3
-        result = nr3.kendall_numpy(thetime, npdata)
-
-        # Add results to the outdata dictionary
-        outdata['site_no'].append(tt)
-        outdata['pval'].append(result[3])
-        outdata['tau'].append(result[0])
-
-        if result[3] <= args.pval:
-            if result[0] < 0:
-                outdata['trend'].append(-1)
-                rescount['down'] += 1
-            elif result[0] > 0:
-                outdata['trend'].append(1)
-                rescount['up'] += 1
-            else:
-                outdata['trend'].append(0)
-        else:
-            # Mark non-significant trends so GIS can handle the symbology easier
-            if result[0] < 0:
-                outdata['trend'].append(-2)
-            elif result[0] > 0:
-                outdata['trend'].append(2)
-            else:
-                outdata['trend'].append(0)
+    rescount['total'] = len(testdf)
+    rescount['up'] = int((testdf['trend'] == 1).sum())
+    rescount['down'] = int((testdf['trend'] == -1).sum())
 
     log_list.append('-'*70)
 
@@ -238,32 +237,25 @@ def main():
     # log_list.append(' Total stations: %d' % rescount['total'])
     # log_list.append('  Upward trends: %d' % rescount['up'])
     # log_list.append('Downward trends: %d' % rescount['down'])
-    log_list.append('='*70)
-
-    # Convert dictionary to a dataframe
-    testdf = pd.DataFrame(outdata, columns=['site_no', 'pval', 'tau', 'trend'])
-    testdf.set_index('site_no', inplace=True)
 
     # Merge the site information with the trend results
     # merged_df = pd.merge(testdf, stations, on='site_no', how='left')
     merged_df = pd.merge(stations, testdf, left_index=True, right_index=True, how='right')
 
-    # Compute a few statistics
-    lastten = sitedataByCol.last('10Y').mean().rename('last_ten_yr')
-    firstten = sitedataByCol.first('10Y').mean().rename('first_ten_yr')
-    pct_chg = ((lastten - firstten) / firstten).rename('pct_chg')
-    df_stats = pd.concat([firstten, lastten, pct_chg], axis=1)
+    # Compute a few statistics from the first and last ten years of each site's record
+    with timer.stage('window_stats'):
+        df_stats = window_statistics(sitedata, 10, first_name='first_ten_yr', last_name='last_ten_yr')
 
-    merged_df = pd.merge(merged_df, df_stats, left_index=True, right_index=True, how='left')
-    # Write the dataframe out to a csv file
-    merged_df.to_csv('%s_kendall.tab' % args.outfile, sep='\t', float_format='%1.5f', header=True, index=True)
+    with timer.stage('write_results'):
+        merged_df = pd.merge(merged_df, df_stats, left_index=True, right_index=True, how='left')
+        # Write the dataframe out to a csv file
+        merged_df.to_csv('%s_kendall.tab' % args.outfile, sep='\t', float_format='%1.5f', header=True, index=True)
 
-    # Write the log file
-    for xx in log_list:
-        print(xx)
-        loghdl.write(xx + '\n')
-    loghdl.close()
-    print("Summary written to %s" % logfile)
+    if not args.no_cache:
+        with timer.stage('cache_store'):
+            cache.store(cache_key, outputs, params=cache_params)
+
+    write_log(log_list, loghdl, logfile, timer, profiler)
 
 
 if __name__ == '__main__':
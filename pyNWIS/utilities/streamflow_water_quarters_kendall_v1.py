@@ -24,30 +24,47 @@ import kendall_cy as nr3
 # from dateutil.relativedelta import relativedelta
 from time import strftime
 import argparse
-import calendar
 from collections import OrderedDict
 from collections import Counter
 
+from pyNWIS.cache import ResultCache, source_digest
+from pyNWIS.calendars import month_end, water_quarter, water_year
+from pyNWIS.obsfiles import STN_COLUMNS, read_obs, read_stn
+from pyNWIS.completeness import CompletenessRule, completeness_report, filter_complete, write_report
+from pyNWIS.profiling import PROFILERS, RunProfiler, StageTimer
+from pyNWIS.ragged import RaggedSeries
+from pyNWIS.trends import kendall_trends
+from pyNWIS.trends import __version__ as trends_version
+
 print('kendal_version: ' + str(nr3.__version__))
 __author__ = 'Parker Norton (pnorton@usgs.gov)'
 __version__ = '0.2'
 
-# TODO: This code needs some work. The wateryears argument really isn't used, but the for the quarters is hardcoded
-#       with the assumption that these are quarters in water years. There needs to be better flexibility.
+# Modules whose code affects the results; cached results are keyed on their source
+CACHE_MODULES = ['pyNWIS.calendars', 'pyNWIS.completeness', 'pyNWIS.obsfiles', 'pyNWIS.ragged',
+                 'pyNWIS.trends', 'kendall_cy']
 
 
-def dparse(*dstr):
-    dint = [int(x) for x in dstr]
+def write_log(log_list, loghdl, logfile, timer=None, profiler=None):
+    # Write the log file, with the stage timings and profile summary when given
+    if timer is not None and len(timer.times) > 0:
+        log_list.append('-'*70)
+        log_list.extend(timer.summary())
+    if profiler is not None:
+        profiler.stop()
+        log_list.append('-'*70)
+        log_list.extend(profiler.summary())
+    log_list.append('='*70)
 
-    if len(dint) == 2:
-        # For months we want the last day of each month
-        dint.append(calendar.monthrange(*dint)[1])
-    if len(dint) == 1:
-        # For annual we want the last day of the year
-        dint.append(12)
-        dint.append(calendar.monthrange(*dint)[1])
+    for xx in log_list:
+        print(xx)
+        loghdl.write(xx + '\n')
+    loghdl.close()
+    print("Summary written to %s" % logfile)
 
-    return datetime.datetime(*dint)
+
+# TODO: This code needs some work. The wateryears argument really isn't used, but the for the quarters is hardcoded
+#       with the assumption that these are quarters in water years. There needs to be better flexibility.
 
 
 # Command line arguments
@@ -61,9 +78,23 @@ parser.add_argument('-d', '--daterange',
                     nargs=2, metavar=('startDate', 'endDate'), required=True)
 parser.add_argument('-p', '--pval', help='Maximum p-value', type=float, required=True)
 parser.add_argument('-O', '--overwrite', help='Overwrite existing output file', action='store_true')
+parser.add_argument('--min-count', help='Minimum number of months with observations (default is period of record)',
+                    type=int, default=None)
+parser.add_argument('--min-pct', help='Minimum percentage of months with observations', type=float, default=None)
+parser.add_argument('--max-gap', help='Maximum number of consecutive missing months', type=int, default=None)
+parser.add_argument('--cache-dir', help='Directory for cached results (default is ~/.cache/pyNWIS)', default=None)
+parser.add_argument('--no-cache', help='Do not use or update cached results', action='store_true')
+parser.add_argument('--trace-memory', help='Log the peak memory of each stage (slower)', action='store_true')
+parser.add_argument('--profile', help='Write a profile of the whole run to this file', default=None)
+parser.add_argument('--profiler', help='Profiler used for --profile', choices=PROFILERS, default='cprofile')
 
 args = parser.parse_args()
 
+profiler = None
+if args.profile is not None:
+    profiler = RunProfiler(args.profile, args.profiler).start()
+timer = StageTimer(memory=args.trace_memory)
+
 if not os.path.isfile(args.obsfile):
     print("The streamflow observation file, %s, does not exist" % args.obsfile)
     exit(1)
@@ -100,6 +131,17 @@ log_list.append('      Output file: %s' % args.outfile)
 st = datetime.datetime(*(map(int, args.daterange[0].split('-'))))
 en = datetime.datetime(*(map(int, args.daterange[1].split('-'))))
 
+# Months (counted from year zero) which fall within the period of interest
+win_months = np.arange(st.year * 12, en.year * 12 + 12)
+win_ends = month_end(win_months // 12, win_months % 12 + 1)
+win_months = win_months[(win_ends >= np.datetime64(st, 'D')) & (win_ends <= np.datetime64(en, 'D'))]
+
+if len(win_months) == 0:
+    print('The date range does not contain a complete month')
+    log_list.append('The date range does not contain a complete month')
+    write_log(log_list, loghdl, logfile, timer, profiler)
+    exit(1)
+
 # Compute the period of record for this date range
 por = (en.year - st.year) * 12
 
@@ -110,150 +152,130 @@ log_list.append('Water years: %s' % args.wateryears)
 log_list.append('Period of record: %d' % por)
 log_list.append('Max p-value: %0.2f' % args.pval)
 
-
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-# Read in the streamgage information
-# stn_col_names = ['site_no', 'station_nm', 'PROV_TERR_STATE_LOC', 'dec_lat_va', 'dec_long_va',
-stn_col_names = ['site_no', 'station_nm', 'dec_lat_va', 'dec_long_va',
-                 'drain_area_va', 'contrib_drain_area_va']
-stn_col_types = [np.str_, np.str_, np.float_, np.float_, np.float_, np.float_]
-stn_cols = dict(zip(stn_col_names, stn_col_types))
+# Reuse the results from a previous run when the input files and parameters
+# are unchanged.
+outputs = {sfx: '%s%s' % (args.outfile, sfx) for sfx in ['_kendall.tab', '_obs.tab', '_completeness.tab']}
+cache_params = {'script': os.path.basename(__file__),
+                'version': __version__,
+                'engine_version': trends_version,
+                'kendall_version': getattr(nr3, '__version__', None),
+                'source': source_digest(CACHE_MODULES, files=[__file__]),
+                'daterange': args.daterange,
+                'wateryears': args.wateryears,
+                'pval': args.pval,
+                'min_count': args.min_count,
+                'min_pct': args.min_pct,
+                'max_gap': args.max_gap}
+
+if not args.no_cache:
+    cache = ResultCache(args.cache_dir)
+    with timer.stage('cache_key'):
+        cache_key = cache.key([args.obsfile, args.stnfile], cache_params)
+
+    if cache.fetch(cache_key, outputs):
+        log_list.append('-'*70)
+        log_list.append('Results restored from cache: %s' % cache_key)
+        write_log(log_list, loghdl, logfile, timer, profiler)
+        exit(0)
 
-stations = pd.read_csv(args.stnfile, sep='\t', usecols=stn_col_names, dtype=np.str_)
 
-# Have to force numeric conversion after the fact when there are
-# null values in a column
-for dd in stations.columns:
-    if stn_cols[dd] == np.float_:
-        stations[dd] = pd.to_numeric(stations[dd], errors='coerce', downcast='float')
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Read in the streamgage information
+# Numeric columns are converted in a single step by read_stn; null values become NaN
+with timer.stage('read_stn'):
+    stations = read_stn(args.stnfile, usecols=STN_COLUMNS)
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-# Import the streamflow data. Use a custom date parser to create datetime values
-# at the end of each water year.
-# The usecols parameter is assuming that site_no, dd_nu, year_nu, and mean_va
-# are in columns 1,3,4,5, respectively (assuming zero-based indexing).
+# Import the streamflow data using compact dtypes (categorical site_no,
+# int16 year_nu/month_nu, float32 mean_va) and create datetime values at
+# the end of each month.
 obs_col_names = ['site_no', 'ts_id', 'year_nu', 'month_nu', 'mean_va']
-obs_col_types = [np.str_, np.int16, np.int16, np.int16, np.float64]
-obs_cols = dict(zip(obs_col_names, obs_col_types))
-
-thedata = pd.read_csv(args.obsfile, sep='\t', usecols=obs_col_names, dtype=obs_cols,
-                      date_parser=dparse, parse_dates={'thedate': ['year_nu', 'month_nu']},
-                      index_col='thedate')
+with timer.stage('read_obs'):
+    thedata = read_obs(args.obsfile, usecols=obs_col_names)
 
-# Select only the observations that are within our period of interest
-thedata = thedata[(thedata.index >= st) & (thedata.index <= en)]
+with timer.stage('dates'):
+    thedata['thedate'] = pd.to_datetime(month_end(thedata['year_nu'], thedata['month_nu']))
+    thedata.set_index('thedate', inplace=True)
 
-# Group by site_no and dd_nu. Filter by sites that don't have enough observations
-# in the period of interest
-thedata = thedata.groupby(['site_no', 'ts_id']).filter(lambda x: len(x) >= por)
+    # Select only the observations that are within our period of interest
+    thedata = thedata[(thedata.index >= st) & (thedata.index <= en)]
 
-# Pivot the table so thedate is the row index and each site is a column
-sitedataByCol = thedata.reset_index().pivot(index='thedate', columns='site_no', values='mean_va')
+# Filter out the timeseries (site_no, ts_id) that don't have a complete enough
+# record in the period of interest
+min_count = por if args.min_count is None else args.min_count
+rule = CompletenessRule(min_count=min_count, min_pct=args.min_pct, max_gap=args.max_gap)
 
-sitedata_wq1 = sitedataByCol.resample('Q-SEP').mean()
+with timer.stage('completeness'):
+    thedata['period'] = thedata.index.year * 12 + thedata.index.month - 1
+    report = completeness_report(thedata, 'period', win_months.min(), win_months.max())
+    thedata, report = filter_complete(thedata, report, rule)
 
+    write_report(report, '%s_completeness.tab' % args.outfile)
+log_list.append('Completeness rule: %s' % rule)
+log_list.append('Complete timeseries: %d of %d' % (report['complete'].sum(), len(report)))
 
-# ------------------------------------------------------------------------
-# First, create copy of dataframe for outputting the observations to a csv
-sitedata_wq_obs = pd.DataFrame(sitedata_wq1.unstack().reset_index().copy())
+with timer.stage('quarters'):
+    # Water year and water quarter (1-4) of each monthly observation
+    thedata['waterYr'] = water_year(thedata.index.to_numpy())
+    thedata['wQtr'] = water_quarter(thedata.index.to_numpy())
 
-# Adjust the column names and add name for last column (avgQ)
-sitedata_wq_obs.rename(columns={'site_no': 'siteno', 'thedate': 'thedate', 0: 'avgQ'}, inplace=True)
+    # Average the months in each water quarter
+    sitedata_wq = thedata.groupby(['site_no', 'waterYr', 'wQtr'], sort=True, observed=True)['mean_va'].mean()
+    sitedata_wq = sitedata_wq.reset_index()
 
-# Add fields for water year and water quarter
-aa = pd.DatetimeIndex(pd.to_datetime(sitedata_wq_obs['thedate']))
-sitedata_wq_obs['waterYr'] = aa.year
-sitedata_wq_obs['wQtr'] = aa.quarter
 
-sitedata_wq_obs['waterYr'] = np.where(sitedata_wq_obs['wQtr'] == 4,
-                                      sitedata_wq_obs['waterYr']+1, sitedata_wq_obs['waterYr'])
-sitedata_wq_obs['wQtr'] = np.where(sitedata_wq_obs['wQtr'] < 4,
-                                   sitedata_wq_obs['wQtr']+1, 1)
+# ------------------------------------------------------------------------
+# First, create copy of dataframe for outputting the observations to a csv
+sitedata_wq_obs = sitedata_wq.rename(columns={'site_no': 'siteno', 'mean_va': 'avgQ'})
 
 # Add informational period field
-sitedata_wq_obs['period'] = 'WY%d to WY%d; p-val = %.2f' % (sitedata_wq_obs['waterYr'].min(), 
+sitedata_wq_obs['period'] = 'WY%d to WY%d; p-val = %.2f' % (sitedata_wq_obs['waterYr'].min(),
                                                             sitedata_wq_obs['waterYr'].max(),
                                                             args.pval)
 
-sitedata_wq_obs.to_csv('%s_obs.tab' % args.outfile, sep='\t', header=True, index=False,
-                       # float_format='%.3f',
-                       columns=['siteno', 'waterYr', 'wQtr', 'avgQ', 'period'])
+with timer.stage('write_obs'):
+    sitedata_wq_obs.to_csv('%s_obs.tab' % args.outfile, sep='\t', header=True, index=False,
+                           # float_format='%.3f',
+                           columns=['siteno', 'waterYr', 'wQtr', 'avgQ', 'period'])
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 
 # ------------------------------------------------------------------------
-# Now create fields for water quarter year and water quarter number (1-4)
-# for sitedata_wq1 used to compute statistics
-sitedata_wq1['qyear'] = sitedata_wq1.index.year
-sitedata_wq1['qtr'] = sitedata_wq1.index.quarter
-
-sitedata_wq1['qyear'] = np.where(sitedata_wq1['qtr'] == 4,
-                                 sitedata_wq1['qyear']+1, sitedata_wq1['qyear'])
-sitedata_wq1['qtr'] = np.where(sitedata_wq1['qtr'] < 4,
-                               sitedata_wq1['qtr']+1, 1)
+# Compute Kendall tau for each quarter using each site's series of water years
+qtr_results = []
+qrescount = OrderedDict()
 
-outresult = {}
 for qq in [1, 2, 3, 4]:
-    tmp1 = sitedata_wq1[sitedata_wq1['qtr'] == qq]
-    thetime = tmp1.index.to_julian_date().values
+    with timer.stage('ragged'):
+        tmp1 = sitedata_wq[sitedata_wq['wQtr'] == qq]
+        sitedata = RaggedSeries.from_periods(tmp1['site_no'].to_numpy(), tmp1['waterYr'].to_numpy() - 1970,
+                                             tmp1['mean_va'].to_numpy(), freq='Y')
 
-    for ss in sitedataByCol.columns:
-        tmp2 = tmp1[ss].values
+    with timer.stage('kendall'):
+        result = kendall_trends(sitedata, args.pval, kendall=nr3.kendall_numpy)
+    result['wQtr'] = qq
+    qtr_results.append(result.reset_index())
 
-        result = nr3.kendall_numpy(thetime, tmp2)
+    cntkey = '%d' % qq
+    qrescount[cntkey] = Counter()
+    qrescount[cntkey]['total'] = len(result)
+    qrescount[cntkey]['up'] = int((result['trend'] == 1).sum())
+    qrescount[cntkey]['down'] = int((result['trend'] == -1).sum())
 
-        if ss not in outresult:
-            outresult[ss] = []
-        outresult[ss].append(result)
+testdf = pd.concat(qtr_results, ignore_index=True).sort_values(['site_no', 'wQtr'], kind='stable')
+testdf = testdf[['site_no', 'wQtr', 'pval', 'tau', 'trend']]
 
-# Create a dictionary for the results
-outdata = {'site_no': [], 'wQtr': [], 'pval': [], 'tau': [], 'trend': []}
-qrescount = OrderedDict()
+with timer.stage('write_results'):
+    # Merge the site information with the trend results
+    merged_df = pd.merge(testdf, stations, on='site_no', how='left')
+
+    # Write the dataframe out to a csv file
+    merged_df.to_csv('%s_kendall.tab' % args.outfile, sep='\t', float_format='%1.5f', header=True, index=False)
 
-for ss, kk in iteritems(outresult):
-    for ii, qq in enumerate(kk):
-
-        # result indices: tau,0; svar,1; z,2; pval,3
-
-        # Add results to the outdata dictionary
-        outdata['site_no'].append(ss)
-        outdata['wQtr'].append(ii+1)
-        outdata['pval'].append(qq[3])
-        outdata['tau'].append(qq[0])
-
-        cntkey = '%d' % (ii+1)
-
-        if cntkey not in qrescount:
-            qrescount[cntkey] = Counter()
-        
-        qrescount[cntkey]['total'] += 1
-
-        if qq[3] <= args.pval:
-            if qq[0] < 0:
-                outdata['trend'].append(-1)
-                qrescount[cntkey]['down'] += 1
-            elif qq[0] > 0:
-                outdata['trend'].append(1)
-                qrescount[cntkey]['up'] += 1
-            else:
-                outdata['trend'].append(0)
-        else:
-            # Mark non-significant trends so GIS can handle the symbology easier
-            if qq[0] < 0:
-                outdata['trend'].append(-2)
-            elif qq[0] > 0:
-                outdata['trend'].append(2)
-            else:
-                outdata['trend'].append(0)
-
-# Convert dictionary to a dataframe
-testdf = pd.DataFrame(outdata, columns=['site_no', 'wQtr', 'pval', 'tau', 'trend'])
-
-# Merge the site information with the trend results
-merged_df = pd.merge(testdf, stations, on='site_no', how='left')
-
-# Write the dataframe out to a csv file
-merged_df.to_csv('%s_kendall.tab' % args.outfile, sep='\t', float_format='%1.5f', header=True, index=False)
+if not args.no_cache:
+    with timer.stage('cache_store'):
+        cache.store(cache_key, outputs, params=cache_params)
 
 log_list.append('\n======= Summary =======')
 for kk, vv in iteritems(qrescount):
@@ -262,11 +284,4 @@ for kk, vv in iteritems(qrescount):
     # log_list.append(' Total stations: %d' % vv['total'])
     # log_list.append('  Upward trends: %d' % vv['up'])
     # log_list.append('Downward trends: %d' % vv['down'])
-log_list.append('='*30)
-
-# Write the log file
-for xx in log_list:
-    print(xx)
-    loghdl.write(xx + '\n')
-loghdl.close()
-print("Summary written to %s" % logfile)
+write_log(log_list, loghdl, logfile, timer, profiler)
@@ -0,0 +1,106 @@
+
+import numpy as np
+import pandas as pd
+
+from pyNWIS.calendars import calendar_year
+
+__author__ = 'Parker Norton (pnorton@usgs.gov)'
+
+
+def _cumulative(series):
+    # Cumulative sums of values and of valid-value counts, with a leading zero
+    valid = ~np.isnan(series.values)
+
+    csum = np.zeros(len(series.values) + 1, dtype=np.float64)
+    np.cumsum(np.where(valid, series.values, 0.0), out=csum[1:])
+    ccnt = np.zeros(len(series.values) + 1, dtype=np.int64)
+    np.cumsum(valid, out=ccnt[1:])
+    return csum, ccnt
+
+
+def first_n_mean(series, nn):
+    # Mean of the first nn periods of each site's own record
+    return series.window_mean(series.start, series.start + nn - 1)
+
+
+def last_n_mean(series, nn):
+    # Mean of the last nn periods of each site's own record
+    return series.window_mean(series.end - nn + 1, series.end)
+
+
+def rolling_mean(series, window, min_count=None):
+    """Trailing moving average over window periods for every site of a RaggedSeries.
+
+    A window must lie inside a single site's record and have at least
+    min_count values (default: the full window). Returns an array aligned
+    with series.values.
+    """
+    if min_count is None:
+        min_count = window
+
+    csum, ccnt = _cumulative(series)
+
+    pos = np.arange(len(series.values))
+    lo = pos - window + 1
+
+    result = np.full(len(series.values), np.nan, dtype=np.float64)
+
+    inside = lo >= series.offsets[:-1][series.segment_ids()]
+    hi = pos[inside] + 1
+    lo = lo[inside]
+
+    count = ccnt[hi] - ccnt[lo]
+    enough = count >= max(min_count, 1)
+    result[np.flatnonzero(inside)[enough]] = (csum[hi] - csum[lo])[enough] / count[enough]
+    return result
+
+
+def decadal_means(series, min_count=1):
+    """Mean of each site's values by calendar decade (e.g. 1990-1999).
+
+    Returns a dataframe with site_no, decade, mean_va and count_nu; decades
+    with fewer than min_count values are dropped.
+    """
+    sid = series.segment_ids()
+    periods = series.start[sid] + np.arange(len(series.values)) - series.offsets[:-1][sid]
+    years = calendar_year(periods.astype(f'datetime64[{series.freq}]'))
+    decade = years - years % 10
+
+    # Values are sorted by site and time so each (site, decade) is contiguous
+    new_seg = np.ones(len(sid), dtype=bool)
+    new_seg[1:] = (sid[1:] != sid[:-1]) | (decade[1:] != decade[:-1])
+    seg = np.flatnonzero(new_seg)
+
+    if len(seg) == 0:
+        return pd.DataFrame(columns=['site_no', 'decade', 'mean_va', 'count_nu'])
+
+    valid = ~np.isnan(series.values)
+    total = np.add.reduceat(np.where(valid, series.values, 0.0), seg)
+    count = np.add.reduceat(valid.astype(np.int64), seg)
+
+    keep = count >= min_count
+    return pd.DataFrame({'site_no': series.sites[sid[seg][keep]],
+                         'decade': decade[seg][keep],
+                         'mean_va': total[keep] / count[keep],
+                         'count_nu': count[keep]})
+
+
+def pct_change(first, last):
+    # Fractional change from first to last
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (np.asarray(last) - np.asarray(first)) / np.asarray(first)
+
+
+def window_statistics(series, nn, first_name='first_mean', last_name='last_mean'):
+    """First-nn and last-nn period means and their percent change for every site.
+
+    Windows are taken from each site's own record rather than the date range
+    of all sites. Returns a dataframe indexed by site_no.
+    """
+    first = first_n_mean(series, nn)
+    last = last_n_mean(series, nn)
+
+    return pd.DataFrame({first_name: first,
+                         last_name: last,
+                         'pct_chg': pct_change(first, last)},
+                        index=pd.Index(series.sites, name='site_no'))
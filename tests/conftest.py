@@ -0,0 +1,5 @@
+import os
+import sys
+
+# pyNWIS is not installed as a package; make it importable from the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
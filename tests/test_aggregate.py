@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pyNWIS.aggregate import aggregate_daily, to_stat_layout
+
+
+def _daily(site, start, end, value=1.0):
+    dates = pd.date_range(start, end, freq='D')
+    return pd.DataFrame({'site_no': site, 'datetime': dates, 'q': value})
+
+
+def test_monthly_requires_complete_months():
+    df = pd.concat([_daily('01', '2000-01-01', '2000-02-29', 2.0),
+                    _daily('01', '2000-03-01', '2000-03-30', 3.0)], ignore_index=True)
+    df.loc[0, 'q'] = 33.0
+
+    result = aggregate_daily(df, 'q', 'monthly')
+    assert result[['year_nu', 'month_nu']].values.tolist() == [[2000, 1], [2000, 2]]
+    np.testing.assert_allclose(result['mean_va'], [(33.0 + 30 * 2.0) / 31, 2.0])
+    np.testing.assert_array_equal(result['count_nu'], [31, 29])
+
+    # March is missing a day
+    result = aggregate_daily(df, 'q', 'monthly', missing_data=True)
+    assert result['month_nu'].tolist() == [1, 2, 3]
+    np.testing.assert_array_equal(result['count_nu'], [31, 29, 30])
+
+
+def test_missing_values_make_a_period_incomplete():
+    df = _daily('01', '2001-01-01', '2001-12-31', 5.0)
+    df.loc[100, 'q'] = np.nan
+
+    assert len(aggregate_daily(df, 'q', 'annual')) == 0
+    result = aggregate_daily(df, 'q', 'annual', missing_data=True)
+    np.testing.assert_array_equal(result['count_nu'], [364])
+    np.testing.assert_allclose(result['mean_va'], [5.0])
+
+
+def test_water_year_and_quarters():
+    df = pd.concat([_daily('02', '1999-10-01', '2000-09-30', 1.0),
+                    _daily('01', '1999-10-01', '1999-12-31', 4.0)], ignore_index=True)
+
+    result = aggregate_daily(df, 'q', 'wateryear')
+    assert result[['site_no', 'year_nu']].values.tolist() == [['02', 2000]]
+    np.testing.assert_array_equal(result['count_nu'], [366])
+
+    result = aggregate_daily(df, 'q', 'waterquarter')
+    assert result[['site_no', 'year_nu', 'qtr_nu']].values.tolist() == [['01', 2000, 1],
+                                                                        ['02', 2000, 1], ['02', 2000, 2],
+                                                                        ['02', 2000, 3], ['02', 2000, 4]]
+    np.testing.assert_array_equal(result['count_nu'], [92, 92, 91, 91, 92])
+
+
+def test_matches_pandas_groupby():
+    rng = np.random.default_rng(0)
+    df = pd.concat([_daily('01', '1998-01-01', '2001-12-31'), _daily('02', '1999-06-01', '2002-05-31')],
+                   ignore_index=True)
+    df['q'] = rng.random(len(df))
+
+    result = aggregate_daily(df, 'q', 'annual', missing_data=True)
+    expected = df.groupby(['site_no', df['datetime'].dt.year])['q'].mean()
+    np.testing.assert_allclose(result['mean_va'], expected.to_numpy())
+
+
+def test_unknown_period():
+    with pytest.raises(ValueError):
+        aggregate_daily(_daily('01', '2000-01-01', '2000-01-31'), 'q', 'weekly')
+
+
+def test_to_stat_layout():
+    result = aggregate_daily(_daily('01', '2000-01-01', '2000-01-31'), 'q', 'monthly')
+    out = to_stat_layout(result)
+
+    assert list(out.columns) == ['agency_cd', 'site_no', 'parameter_cd', 'ts_id', 'loc_web_ds',
+                                 'year_nu', 'month_nu', 'mean_va', 'count_nu']
+    assert out.iloc[0]['ts_id'] == 0
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from pyNWIS.calendars import (month_end, period_bounds, season_id, shifted_year, water_quarter, water_year,
+                              water_year_day, year_end)
+
+BOUNDARY = ['1999-09-30', '1999-10-01', '1999-12-31', '2000-01-01', '2000-03-31', '2000-04-01',
+            '2000-06-30', '2000-07-01', '2000-09-30', '2000-10-01']
+
+
+def test_water_year_at_sep_oct_boundary():
+    np.testing.assert_array_equal(water_year(BOUNDARY),
+                                  [1999, 2000, 2000, 2000, 2000, 2000, 2000, 2000, 2000, 2001])
+
+
+def test_water_quarter_boundaries():
+    np.testing.assert_array_equal(water_quarter(BOUNDARY), [4, 1, 1, 2, 2, 3, 3, 4, 4, 1])
+
+
+def test_water_year_before_1970():
+    np.testing.assert_array_equal(water_year(['1950-09-30', '1950-10-01']), [1950, 1951])
+    np.testing.assert_array_equal(water_quarter(['1950-09-30', '1950-10-01']), [4, 1])
+
+
+def test_water_year_day():
+    np.testing.assert_array_equal(water_year_day(['1999-10-01', '1999-09-30', '2000-09-30']), [1, 365, 366])
+
+
+def test_shifted_year_climatic_year():
+    # Climatic years begin April 1
+    np.testing.assert_array_equal(shifted_year(['2000-03-31', '2000-04-01'], 4), [2000, 2001])
+    np.testing.assert_array_equal(shifted_year(['2000-12-31', '2001-01-01'], 1), [2000, 2001])
+
+
+def test_season_id():
+    # DJF, MAM, JJA, SON; January belongs to the season that began in December
+    ids = season_id(['2000-01-15', '2000-04-15', '2000-07-15', '2000-10-15', '2000-12-15'], [12, 3, 6, 9])
+    np.testing.assert_array_equal(ids, [0, 1, 2, 3, 0])
+
+
+def test_period_ends():
+    np.testing.assert_array_equal(month_end([2000, 2001], [2, 2]),
+                                  np.array(['2000-02-29', '2001-02-28'], dtype='datetime64[D]'))
+    np.testing.assert_array_equal(year_end(2000, wateryears=True), np.datetime64('2000-09-30'))
+    np.testing.assert_array_equal(year_end(2000), np.datetime64('2000-12-31'))
+
+
+@pytest.mark.parametrize('period, start, nxt', [('monthly', '1999-09-01', '1999-10-01'),
+                                                ('annual', '1999-01-01', '2000-01-01'),
+                                                ('wateryear', '1998-10-01', '1999-10-01'),
+                                                ('waterquarter', '1999-07-01', '1999-10-01')])
+def test_period_bounds(period, start, nxt):
+    st, nx = period_bounds(['1999-09-30'], period)
+    assert st[0] == np.datetime64(start)
+    assert nx[0] == np.datetime64(nxt)
+
+
+def test_period_bounds_unknown_period():
+    with pytest.raises(ValueError):
+        period_bounds(['1999-09-30'], 'weekly')
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+from pyNWIS.completeness import CompletenessRule, completeness_report, filter_complete
+
+
+def _frame(records):
+    # records: {(site_no, ts_id): [periods]}
+    rows = [(site, ts, pp) for (site, ts), periods in records.items() for pp in periods]
+    return pd.DataFrame(rows, columns=['site_no', 'ts_id', 'period'])
+
+
+def test_report_counts_and_max_gap():
+    df = _frame({('01', 1): [2000, 2001, 2002, 2003, 2004],
+                 ('01', 2): [2000, 2001, 2004],
+                 ('02', 1): [2000, 2001, 2002]})
+    report = completeness_report(df, 'period', 2000, 2004)
+
+    assert list(report.index) == [('01', 1), ('01', 2), ('02', 1)]
+    np.testing.assert_array_equal(report['n_obs'], [5, 3, 3])
+    np.testing.assert_array_equal(report['n_expected'], [5, 5, 5])
+    np.testing.assert_allclose(report['pct_missing'], [0.0, 40.0, 40.0])
+
+    # Interior gap of two years; trailing gap of two years
+    np.testing.assert_array_equal(report['max_gap'], [0, 2, 2])
+
+
+def test_max_gap_counts_missing_window_start_and_end():
+    df = _frame({('01', 1): [2003, 2004],
+                 ('02', 1): [2000],
+                 ('03', 1): [2000, 2002, 2004]})
+    report = completeness_report(df, 'period', 2000, 2004)
+
+    np.testing.assert_array_equal(report['max_gap'], [3, 4, 1])
+    np.testing.assert_array_equal(report['first_period'], [2003, 2000, 2000])
+    np.testing.assert_array_equal(report['last_period'], [2004, 2000, 2004])
+
+
+def test_report_ignores_duplicates_and_periods_outside_window():
+    df = _frame({('01', 1): [1999, 2000, 2000, 2001, 2002, 2003]})
+    report = completeness_report(df, 'period', 2000, 2002)
+
+    np.testing.assert_array_equal(report['n_obs'], [3])
+    np.testing.assert_array_equal(report['max_gap'], [0])
+
+
+def test_filter_complete_keeps_passing_series():
+    df = _frame({('01', 1): [2000, 2001, 2002, 2003, 2004],
+                 ('01', 2): [2000, 2001, 2004],
+                 ('02', 1): [2000, 2002, 2004]})
+    report = completeness_report(df, 'period', 2000, 2004)
+
+    kept, report = filter_complete(df, report, CompletenessRule(max_gap=1))
+    assert report['complete'].tolist() == [True, False, True]
+    assert sorted(set(zip(kept['site_no'], kept['ts_id']))) == [('01', 1), ('02', 1)]
+
+    kept, report = filter_complete(df, report, CompletenessRule(min_count=4, min_pct=80))
+    assert report['complete'].tolist() == [True, False, False]
+    assert len(kept) == 5
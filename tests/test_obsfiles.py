@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pyNWIS.obsfiles import obs_dtypes, obs_layout, obs_periods, read_obs, read_stn
+
+
+def _write(path, lines):
+    path.write_text('\n'.join(lines) + '\n')
+    return str(path)
+
+
+def test_read_obs_daily_values(tmp_path):
+    obsfile = _write(tmp_path / 'dv_obs.tab',
+                     ['agency_cd\tsite_no\tdatetime\t00060_00003\t00060_00003_cd',
+                      'USGS\t01013500\t2000-01-01\t12.5\tA',
+                      'USGS\t01013500\t2000-01-02\t\tP:e',
+                      'USGS\t01013500\t2000-01-03\tIce\tP'])
+    assert obs_layout(obsfile) == ('D', '00060_00003')
+
+    df = read_obs(obsfile, usecols=['site_no', 'datetime', '00060_00003_cd'])
+    assert df['site_no'].dtype == 'category'
+    assert df['site_no'].iloc[0] == '01013500'
+    assert df['00060_00003_cd'].tolist() == ['A', 'P:e', 'P']
+    np.testing.assert_array_equal(df['datetime'].to_numpy(),
+                                  np.array(['2000-01-01', '2000-01-02', '2000-01-03'], dtype='datetime64[ns]'))
+    np.testing.assert_array_equal(obs_periods(df, 'D'), [10957, 10958, 10959])
+
+
+def test_read_obs_stat_layout(tmp_path):
+    obsfile = _write(tmp_path / 'mon_obs.tab',
+                     ['agency_cd\tsite_no\tparameter_cd\tts_id\tloc_web_ds\tyear_nu\tmonth_nu\tmean_va',
+                      'USGS\t01013500\t00060\t1234\t\t1969\t12\t3.25',
+                      'USGS\t01013500\t00060\t1234\t\t1970\t1\t4.5'])
+    assert obs_layout(obsfile) == ('M', 'mean_va')
+
+    df = read_obs(obsfile)
+    assert df['ts_id'].dtype == np.int32
+    assert df['year_nu'].dtype == np.int16
+    assert df['mean_va'].dtype == np.float32
+    np.testing.assert_array_equal(obs_periods(df, 'M'), [-1, 0])
+    np.testing.assert_array_equal(obs_periods(df, 'Y'), [-1, 0])
+
+
+def test_obs_layout_unrecognized(tmp_path):
+    with pytest.raises(ValueError):
+        obs_layout(_write(tmp_path / 'bad.tab', ['site_no\tvalue']))
+
+
+def test_obs_dtypes_for_ts_id_prefixed_columns():
+    dtypes = obs_dtypes(['site_no', '12345_00060_00003', '12345_00060_00003_cd', 'station_nm'])
+    assert dtypes == {'site_no': 'category', '12345_00060_00003': np.float32,
+                      '12345_00060_00003_cd': 'category', 'station_nm': str}
+
+
+def test_read_stn(tmp_path):
+    stnfile = _write(tmp_path / 'stn.tab',
+                     ['site_no\tstation_nm\tdec_lat_va\tdec_long_va\tdrain_area_va\tcontrib_drain_area_va',
+                      '01013500\tFish River\t47.2375\t-68.5828\t873\t',
+                      '01014000\tSt. John River\t47.0694\t-68.9572\tbad\t5690'])
+    df = read_stn(stnfile)
+
+    assert df['site_no'].tolist() == ['01013500', '01014000']
+    assert df['drain_area_va'].dtype == np.float32
+    np.testing.assert_allclose(df['dec_lat_va'], [47.2375, 47.0694], rtol=1e-6)
+    assert pd.isna(df['drain_area_va'].iloc[1])
+    assert pd.isna(df['contrib_drain_area_va'].iloc[0])
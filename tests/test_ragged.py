@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pyNWIS.ragged import RaggedSeries
+
+
+def test_from_periods_spans_and_gaps():
+    rs = RaggedSeries.from_periods(['b', 'a', 'a', 'b', 'a'], [11, 3, 1, 10, 2], [5.0, 3.0, 1.0, 4.0, 2.0], freq='Y')
+
+    np.testing.assert_array_equal(rs.sites, ['a', 'b'])
+    np.testing.assert_array_equal(rs.start, [1, 10])
+    np.testing.assert_array_equal(rs.offsets, [0, 3, 5])
+    np.testing.assert_array_equal(rs.site(0), [1.0, 2.0, 3.0])
+    np.testing.assert_array_equal(rs.site(1), [4.0, 5.0])
+
+
+def test_from_periods_drops_nan_values():
+    # Missing values do not extend a site's record; interior ones become gaps
+    rs = RaggedSeries.from_periods(['a', 'a', 'a', 'a', 'b'], [0, 1, 2, 3, 5], [np.nan, 1.0, np.nan, 3.0, np.nan])
+
+    np.testing.assert_array_equal(rs.sites, ['a'])
+    np.testing.assert_array_equal(rs.start, [1])
+    np.testing.assert_array_equal(rs.site(0), [1.0, np.nan, 3.0])
+    np.testing.assert_array_equal(rs.count(), [2])
+    np.testing.assert_array_equal(rs.mean(), [2.0])
+
+
+def test_from_periods_nan_duplicate_is_not_a_conflict():
+    rs = RaggedSeries.from_periods(['a', 'a'], [4, 4], [np.nan, 7.0])
+    np.testing.assert_array_equal(rs.site(0), [7.0])
+
+
+def test_from_periods_rejects_duplicate_periods():
+    # e.g. two ts_id series for the same site
+    with pytest.raises(ValueError, match='site a'):
+        RaggedSeries.from_periods(['a', 'a', 'b'], [30, 30, 30], [1.0, 2.0, 3.0], freq='Y')
+
+
+def test_from_frame_matches_pivot():
+    df = pd.DataFrame({'site_no': ['01', '01', '02', '02', '02'],
+                       'date': pd.to_datetime(['2000-01-01', '2002-01-01', '2001-01-01', '2002-01-01',
+                                               '2003-01-01']),
+                       'value': [1.0, 3.0, 4.0, 5.0, 6.0]})
+    rs = RaggedSeries.from_frame(df, 'value', date_col='date', freq='Y')
+
+    pivot = df.pivot(index='date', columns='site_no', values='value')
+    np.testing.assert_allclose(rs.mean(), pivot.mean().to_numpy())
+    np.testing.assert_array_equal(rs.count(), pivot.count().to_numpy())
+    np.testing.assert_array_equal(rs.min(), pivot.min().to_numpy())
+    np.testing.assert_array_equal(rs.max(), pivot.max().to_numpy())
+
+    back = rs.to_frame()
+    np.testing.assert_array_equal(back['value'], [1.0, 3.0, 4.0, 5.0, 6.0])
+
+
+def test_window_mean_clips_to_record():
+    rs = RaggedSeries.from_periods(['a'] * 4, [0, 1, 2, 3], [1.0, np.nan, 3.0, 5.0])
+
+    np.testing.assert_allclose(rs.window_mean(0, 2), [2.0])
+    np.testing.assert_allclose(rs.window_mean(2, 10), [4.0])
+    assert np.isnan(rs.window_mean(5, 8)[0])
@@ -0,0 +1,63 @@
+import numpy as np
+
+from pyNWIS.ragged import RaggedSeries
+from pyNWIS.windows import decadal_means, first_n_mean, last_n_mean, rolling_mean, window_statistics
+
+
+def _series():
+    # Site a: 1995-2002 with 1997 missing; site b: 2000-2003
+    periods = [yy - 1970 for yy in range(1995, 2003) if yy != 1997] + [yy - 1970 for yy in range(2000, 2004)]
+    values = [1.0, 2.0, 4.0, 5.0, 6.0, 7.0, 8.0] + [10.0, 20.0, 30.0, 40.0]
+    sites = ['a'] * 7 + ['b'] * 4
+    return RaggedSeries.from_periods(sites, periods, values, freq='Y')
+
+
+def test_first_and_last_n_mean_use_each_sites_record():
+    rs = _series()
+
+    # 1995-1997 for a (1997 missing), 2000-2002 for b
+    np.testing.assert_allclose(first_n_mean(rs, 3), [1.5, 20.0])
+    np.testing.assert_allclose(last_n_mean(rs, 3), [7.0, 30.0])
+
+
+def test_window_statistics():
+    stats = window_statistics(_series(), 2)
+
+    assert list(stats.index) == ['a', 'b']
+    np.testing.assert_allclose(stats['first_mean'], [1.5, 15.0])
+    np.testing.assert_allclose(stats['last_mean'], [7.5, 35.0])
+    np.testing.assert_allclose(stats['pct_chg'], [4.0, 4.0 / 3.0])
+
+
+def test_rolling_mean_windows_inside_record():
+    rs = _series()
+    result = rolling_mean(rs, 3, min_count=2)
+
+    # Windows must lie inside the record (no partial windows at the start)
+    # and have at least min_count values
+    np.testing.assert_allclose(result[:rs.offsets[1]], [np.nan, np.nan, 1.5, 3.0, 4.5, 5.0, 6.0, 7.0])
+    np.testing.assert_allclose(result[rs.offsets[1]:], [np.nan, np.nan, 20.0, 30.0])
+
+    # By default every period of the window needs a value
+    result = rolling_mean(rs, 3)
+    np.testing.assert_allclose(result[:rs.offsets[1]], [np.nan] * 5 + [5.0, 6.0, 7.0])
+
+
+def test_rolling_mean_does_not_cross_sites():
+    rs = _series()
+    result = rolling_mean(rs, 3)
+
+    # The first two values of site b would need values from site a
+    assert np.isnan(result[rs.offsets[1]:rs.offsets[1] + 2]).all()
+    np.testing.assert_allclose(result[rs.offsets[1] + 2], 20.0)
+
+
+def test_decadal_means():
+    df = decadal_means(_series())
+
+    assert list(zip(df['site_no'], df['decade'])) == [('a', 1990), ('a', 2000), ('b', 2000)]
+    np.testing.assert_allclose(df['mean_va'], [3.0, 7.0, 25.0])
+    np.testing.assert_array_equal(df['count_nu'], [4, 3, 4])
+
+    df = decadal_means(_series(), min_count=4)
+    assert list(zip(df['site_no'], df['decade'])) == [('a', 1990), ('b', 2000)]